@@ -50,6 +50,8 @@ INSTALLED_APPS = [
     'sales',
     'pos',
     'payments',
+    'reports',
+    'outbox',
 ]
 
 MIDDLEWARE = [
@@ -97,6 +99,26 @@ if DATABASE_URL:
         )
     }
 
+# Cache
+# Catalog responses are cached per catalog version (see inventory/cache.py).
+# Point REDIS_URL at a shared Redis so all workers see the same version;
+# without it each process keeps its own in-memory cache.
+REDIS_URL = config("REDIS_URL", default=None)
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -159,8 +181,11 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 DARAJA_CONSUMER_KEY = config('DARAJA_CONSUMER_KEY')
 DARAJA_CONSUMER_SECRET = config('DARAJA_CONSUMER_SECRET')
 DARAJA_SHORTCODE = config('DARAJA_SHORTCODE')
-# DARAJA_PASSKEY = config('DARAJA_PASSKEY')
+DARAJA_PASSKEY = config('DARAJA_PASSKEY', default='')
 HOOK_BASE_URL = config('HOOK_BASE_URL')
+# Secret path segment in the STK CallBackURL; the webhook rejects callbacks without it.
+# Left empty, every callback is rejected and payments settle through reconcile_payments.
+DARAJA_WEBHOOK_TOKEN = config('DARAJA_WEBHOOK_TOKEN', default='')
 DARAJA_BASE_URL = config('DARAJA_BASE_URL', default='https://sandbox.safaricom.co.ke')
 
 
@@ -30,7 +30,8 @@ urlpatterns = [
     
     path('api/staff/', include('staff.urls')),
     path('api/inventory/', include('inventory.urls')),
-    # path('api/sales/', include('sales.urls')),
+    path('api/sales/', include('sales.urls')),
     path('api/pos/', include('pos.urls')),
     path('api/payments/', include('payments.urls')),
+    path('api/reports/', include('reports.urls')),
 ]
\ No newline at end of file
@@ -1,21 +1,53 @@
 from django.contrib import admin
-from .models import Category, Product, InventoryLog  # Fixed name here
+from django.utils import timezone
+from .models import Category, Product, InventoryLog, StockValuation, ProductSalesVelocity, StockReservation, ProductCode  # Fixed name here
+from .reorder import refresh
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'slug')
     prepopulated_fields = {'slug': ('name',)}
 
+class ProductCodeInline(admin.TabularInline):
+    model = ProductCode
+    extra = 1
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     # Added stock_qty to display to help you monitor inventory
     list_display = ('product_name', 'brand_name', 'category', 'selling_price', 'stock_qty', 'is_active')
     list_filter = ('category', 'is_active', 'brand_name')
-    search_fields = ('product_name', 'brand_name')
-    readonly_fields = ('stock_qty',) # Keep this read-only to let InventoryLog handle updates
+    readonly_fields = ('stock_qty', 'reserved_qty', 'average_cost') # Keep this read-only to let InventoryLog handle updates
+    search_fields = ('product_name', 'brand_name', 'codes__code')
+    inlines = [ProductCodeInline]
 
 @admin.register(InventoryLog)  # Fixed name here
 class InventoryLogAdmin(admin.ModelAdmin):
     list_display = ('product', 'supplier', 'quantity_bought', 'cost_price_per_unit', 'total_cost', 'delivery_date')
     list_filter = ('supplier', 'delivery_date')
-    readonly_fields = ('total_cost', 'delivery_date')
\ No newline at end of file
+    readonly_fields = ('total_cost', 'delivery_date')
+
+@admin.register(StockValuation)
+class StockValuationAdmin(admin.ModelAdmin):
+    list_display = ('scope', 'total_units', 'retail_value', 'cost_value', 'updated_at')
+    # Maintained by deltas; use `manage.py rebuild_stock_valuation` to fix drift
+    readonly_fields = ('scope', 'category', 'total_units', 'retail_value', 'cost_value', 'updated_at')
+
+@admin.register(ProductSalesVelocity)
+class ProductSalesVelocityAdmin(admin.ModelAdmin):
+    list_display = ('product', 'daily_rate', 'reorder_point', 'lead_time_days', 'safety_days', 'last_sale_at')
+    search_fields = ('product__product_name', 'product__brand_name')
+    # Only the lead time and safety buffer are meant to be edited by hand
+    readonly_fields = ('product', 'daily_rate', 'rate_as_of', 'last_sale_at', 'units_sold', 'reorder_point')
+
+    def save_model(self, request, obj, form, change):
+        # Recompute the reorder point with the new lead time / safety days
+        refresh(obj, max(timezone.now(), obj.rate_as_of))
+        super().save_model(request, obj, form, change)
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('reference', 'product', 'quantity', 'expires_at')
+    search_fields = ('reference',)
+    # Held and released by inventory.services together with Product.reserved_qty
+    readonly_fields = ('reference', 'product', 'quantity', 'expires_at', 'created_at')
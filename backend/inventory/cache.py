@@ -0,0 +1,111 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.utils.http import parse_etags, urlencode
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+CATALOG_VERSION_KEY = 'catalog:version'
+CATALOG_CACHE_TIMEOUT = 60 * 60
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Seed from the clock so an evicted counter never restarts at a
+        # value that old cache entries were stored under.
+        cache.add(CATALOG_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """
+    Invalidate every cached catalog response at once. Old entries are
+    never read again and simply expire.
+    """
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        get_catalog_version()
+
+
+def product_version_key(product_id):
+    return f"product:{product_id}:version"
+
+
+def get_product_version(product_id):
+    """
+    Per-product counter, bumped whenever anything a till shows for the
+    product changes (price, name, stock, codes). Seeded like the catalog
+    version.
+    """
+    key = product_version_key(product_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_product_versions(product_ids):
+    for product_id in product_ids:
+        try:
+            cache.incr(product_version_key(product_id))
+        except ValueError:
+            get_product_version(product_id)
+
+
+def invalidate_products(product_ids):
+    """Drop cached catalog pages and scan records for these products."""
+    bump_catalog_version()
+    bump_product_versions(product_ids)
+
+
+def catalog_cache_key(request, version):
+    # Scheme and host too: bodies can carry absolute URLs (product images)
+    params = urlencode(sorted(request.query_params.lists()), doseq=True)
+    url = f"{request.scheme}://{request.get_host()}{request.path}?{params}"
+    digest = hashlib.md5(url.encode()).hexdigest()
+    return f"catalog:{version}:{digest}"
+
+
+def etag_matches(request, etag):
+    """If-None-Match check, using the weak comparison RFC 9110 asks for."""
+    etags = parse_etags(request.headers.get('If-None-Match', ''))
+    if etags == ['*']:
+        return True
+    return etag in {tag.removeprefix('W/') for tag in etags}
+
+
+def cache_catalog_response(view_method):
+    """
+    Read-through cache for public catalog GETs.
+
+    Responses are keyed by URL, query params and the catalog version and
+    carry a strong ETag computed from the JSON body, so a client sending
+    If-None-Match gets a 304 without the view touching the database.
+    """
+    @wraps(view_method)
+    def wrapper(view, request, *args, **kwargs):
+        key = catalog_cache_key(request, get_catalog_version())
+        cached = cache.get(key)
+        if cached is None:
+            response = view_method(view, request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            etag = '"%s"' % hashlib.sha256(JSONRenderer().render(response.data)).hexdigest()
+            cached = (response.data, etag)
+            cache.set(key, cached, CATALOG_CACHE_TIMEOUT)
+
+        data, etag = cached
+        if etag_matches(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        return response
+    return wrapper
@@ -0,0 +1,78 @@
+"""
+Delta sync of the till catalog.
+
+A terminal keeps a local copy of what it needs to ring up sales and asks
+for the changes since the watermark it got last time. Changed products
+are found through Product.updated_at, which the stock services set on
+every UPDATE; deleted ones through ProductTombstone. The reply is
+columnar (one array per field), so a refresh with a handful of changes
+is a few hundred bytes.
+
+A transaction can commit after rows with later timestamps were already
+synced, so the returned watermark trails the server clock by SETTLE and
+recent changes may be sent twice. Applying them is idempotent.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import Product, ProductCode, ProductTombstone
+
+SETTLE = timedelta(seconds=30)
+TOMBSTONE_RETENTION = timedelta(days=30)
+
+COLUMNS = ('id', 'brand_name', 'product_name', 'category', 'price_cents', 'available_qty', 'is_active', 'codes')
+
+
+def record_tombstone(product_id, now=None):
+    now = now or timezone.now()
+    ProductTombstone.objects.create(product_id=product_id)
+    ProductTombstone.objects.filter(deleted_at__lt=now - TOMBSTONE_RETENTION).delete()
+
+
+def catalog_changes(since=None, now=None):
+    """
+    The products changed since `since` (all active products when it is
+    None or older than the tombstones reach), the ids deleted since then,
+    and the watermark to send next time.
+    """
+    now = now or timezone.now()
+    full = since is None or since < now - TOMBSTONE_RETENTION
+    if full:
+        products = Product.objects.filter(is_active=True)
+        codes = ProductCode.objects.filter(product__is_active=True)
+        deleted = []
+    else:
+        products = Product.objects.filter(updated_at__gte=since)
+        codes = ProductCode.objects.filter(product__updated_at__gte=since)
+        deleted = list(
+            ProductTombstone.objects.filter(deleted_at__gte=since)
+            .order_by('product_id').values_list('product_id', flat=True).distinct()
+        )
+
+    codes_by_product = defaultdict(list)
+    for product_id, code in codes.order_by('product_id', 'code').values_list('product_id', 'code'):
+        codes_by_product[product_id].append(code)
+
+    columns = {name: [] for name in COLUMNS}
+    rows = products.order_by('id').values_list(
+        'id', 'brand_name', 'product_name', 'category_id', 'selling_price',
+        'stock_qty', 'reserved_qty', 'is_active',
+    )
+    for pk, brand, name, category, price, stock, reserved, active in rows:
+        columns['id'].append(pk)
+        columns['brand_name'].append(brand)
+        columns['product_name'].append(name)
+        columns['category'].append(category)
+        columns['price_cents'].append(int(price * 100))
+        columns['available_qty'].append(stock - reserved)
+        columns['is_active'].append(active)
+        columns['codes'].append(codes_by_product.get(pk, []))
+
+    return {
+        'watermark': (now - SETTLE).isoformat(),
+        'full': full,
+        'products': columns,
+        'deleted': deleted,
+    }
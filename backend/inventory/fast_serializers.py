@@ -0,0 +1,101 @@
+"""
+Read-only fast paths for high-volume list endpoints.
+
+These build response rows straight from `.values()` querysets, with the
+foreign-key names joined in SQL, instead of running a DRF serializer per
+object. The output must stay byte-identical to the matching serializer
+(same keys, same order, same formatting); `manage.py benchmark_list_serializers`
+checks that and times both paths.
+"""
+from django.core.files.storage import default_storage
+from rest_framework import serializers
+
+from .models import Product
+from .serializers import InventoryLogSerializer, ProductSerializer, build_srcset
+
+# Reuse DRF's own field formatting so decimals and datetimes come out
+# exactly as the serializers render them.
+money = serializers.DecimalField(max_digits=12, decimal_places=2).to_representation
+money_15 = serializers.DecimalField(max_digits=15, decimal_places=2).to_representation
+timestamp = serializers.DateTimeField().to_representation
+
+IMAGE_STORAGE = Product._meta.get_field('image').storage or default_storage
+
+# Returned by a builder to leave the key out, which is what DRF does for a
+# dotted `source` that runs into a null foreign key (e.g. category.name).
+SKIP = object()
+
+
+def image_url(name):
+    return IMAGE_STORAGE.url(name) if name else None
+
+
+# Serializer field -> (values() columns it needs, row -> output value)
+PRODUCT_FIELDS = {
+    'id': (('id',), lambda r: r['id']),
+    'category': (('category_id',), lambda r: r['category_id']),
+    'category_name': (('category_id', 'category__name'), lambda r: SKIP if r['category_id'] is None else r['category__name']),
+    'brand_name': (('brand_name',), lambda r: r['brand_name']),
+    'product_name': (('product_name',), lambda r: r['product_name']),
+    'description': (('description',), lambda r: r['description']),
+    'selling_price': (('selling_price',), lambda r: money(r['selling_price'])),
+    'image': (('image',), lambda r: image_url(r['image'])),
+    'image_srcset': (('image_variants',), lambda r: build_srcset(r['image_variants'], IMAGE_STORAGE)),
+    'stock_qty': (('stock_qty',), lambda r: r['stock_qty']),
+    'available_qty': (('stock_qty', 'reserved_qty'), lambda r: r['stock_qty'] - r['reserved_qty']),
+    'is_active': (('is_active',), lambda r: r['is_active']),
+}
+
+INVENTORY_LOG_FIELDS = {
+    'id': (('id',), lambda r: r['id']),
+    'product': (('product_id',), lambda r: r['product_id']),
+    'product_details': (('product__product_name',), lambda r: r['product__product_name']),
+    'supplier': (('supplier_id',), lambda r: r['supplier_id']),
+    'supplier_name': (('supplier__name',), lambda r: r['supplier__name']),
+    'quantity_bought': (('quantity_bought',), lambda r: r['quantity_bought']),
+    'cost_price_per_unit': (('cost_price_per_unit',), lambda r: money(r['cost_price_per_unit'])),
+    'total_cost': (('total_cost',), lambda r: money_15(r['total_cost'])),
+    'delivery_date': (('delivery_date',), lambda r: timestamp(r['delivery_date'])),
+}
+
+
+class FastRows:
+    """
+    Describes one fast path: which serializer fields to emit, in the
+    serializer's order, and which columns `.values()` must fetch for them.
+    """
+    def __init__(self, spec, serializer_fields, fields=None, extra_columns=()):
+        self.fields = [
+            name for name in serializer_fields
+            if fields is None or name in fields
+        ]
+        self.builders = [(name, spec[name][1]) for name in self.fields]
+        columns = list(extra_columns)
+        for name in self.fields:
+            for column in spec[name][0]:
+                if column not in columns:
+                    columns.append(column)
+        self.columns = columns
+
+    def values(self, queryset):
+        return queryset.values(*self.columns)
+
+    def render(self, rows):
+        builders = self.builders
+        rendered = []
+        for row in rows:
+            item = {}
+            for name, build in builders:
+                value = build(row)
+                if value is not SKIP:
+                    item[name] = value
+            rendered.append(item)
+        return rendered
+
+
+def product_rows(fields=None, extra_columns=()):
+    return FastRows(PRODUCT_FIELDS, ProductSerializer.Meta.fields, fields, extra_columns)
+
+
+def inventory_log_rows(extra_columns=()):
+    return FastRows(INVENTORY_LOG_FIELDS, InventoryLogSerializer.Meta.fields, extra_columns=extra_columns)
@@ -0,0 +1,30 @@
+from datetime import datetime, time, timedelta
+
+import django_filters
+from django.utils import timezone
+
+from .models import InventoryLog
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class InventoryLogFilter(django_filters.FilterSet):
+    """
+    Stock-in history filters. Date bounds are turned into plain range
+    comparisons on delivery_date (no __date transform) so the composite
+    indexes on InventoryLog can be used.
+    """
+    date_from = django_filters.DateFilter(method='filter_date_from', label="Delivered on or after (YYYY-MM-DD)")
+    date_to = django_filters.DateFilter(method='filter_date_to', label="Delivered on or before (YYYY-MM-DD)")
+
+    class Meta:
+        model = InventoryLog
+        fields = ['supplier', 'product']
+
+    def filter_date_from(self, queryset, name, value):
+        return queryset.filter(delivery_date__gte=_start_of_day(value))
+
+    def filter_date_to(self, queryset, name, value):
+        return queryset.filter(delivery_date__lt=_start_of_day(value + timedelta(days=1)))
@@ -0,0 +1,15 @@
+from outbox.events import handler
+from .images import refresh_variants
+from .reorder import record_units_sold
+
+
+@handler('sale.completed')
+def update_sales_velocity(event):
+    quantities = {int(pk): units for pk, units in event.payload['quantities'].items()}
+    record_units_sold(quantities, event.created_at)
+
+
+@handler('product.image_changed')
+def render_image_variants(event):
+    # Storage writes are not transactional; a retry just renders again
+    refresh_variants(int(event.aggregate_id), event.payload['image'], event.payload['stale'])
@@ -0,0 +1,114 @@
+"""
+Responsive image derivatives for Product.image.
+
+Saving a new image records a `product.image_changed` outbox event in the
+same transaction; the relay (`relay_outbox`) resizes the image to
+VARIANT_WIDTHS in JPEG and WebP, so the request that saved the product
+never waits for Pillow, and a crash or restart only delays the work
+instead of losing it. The files are stored next to the original
+(images/products/shoe.jpg -> images/products/shoe_320w.webp) and their
+names are recorded in Product.image_variants. The previous image's
+variants are deleted once the new ones are in place.
+"""
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from outbox.events import publish
+from .cache import bump_catalog_version
+from .models import Product
+
+VARIANT_WIDTHS = (160, 320, 640, 1024)
+FORMATS = {
+    # format key: (Pillow format, extension, save options)
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def variant_name(original, width, extension):
+    stem, _ = os.path.splitext(original)
+    return f"{stem}_{width}w.{extension}"
+
+
+def render_variants(image):
+    """
+    Yield (width, format key, bytes) for every derivative of a Pillow
+    image. Images are never upscaled; widths larger than the original are
+    skipped, and the original width is used if it is below the smallest.
+    """
+    image = ImageOps.exif_transpose(image)
+    widths = [w for w in VARIANT_WIDTHS if w <= image.width] or [image.width]
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS)
+        for key, (pil_format, _, options) in FORMATS.items():
+            frame = resized
+            if pil_format == 'JPEG' and frame.mode not in ('RGB', 'L'):
+                frame = frame.convert('RGB')
+            buffer = BytesIO()
+            frame.save(buffer, pil_format, **options)
+            yield width, key, buffer.getvalue()
+
+
+def variant_files(variants):
+    """Every file name in an image_variants map."""
+    return {name for formats in (variants or {}).values() for name in formats.values()}
+
+
+def generate_variants(product):
+    """
+    Build and store every derivative of `product.image`, then record them
+    on the product. Returns the variants map, e.g.
+    {"320": {"webp": "images/products/x_320w.webp", "jpeg": "..."}}.
+    """
+    if not product.image:
+        return {}
+
+    original = product.image.name
+    storage = product.image.storage
+    variants = {}
+    with storage.open(original, 'rb') as handle:
+        with Image.open(handle) as image:
+            image.load()
+            for width, key, content in render_variants(image):
+                name = variant_name(original, width, FORMATS[key][1])
+                if storage.exists(name):
+                    storage.delete(name)
+                stored = storage.save(name, ContentFile(content))
+                variants.setdefault(str(width), {})[key] = stored
+
+    # Only record the variants if the image was not replaced meanwhile
+    Product.objects.filter(pk=product.pk, image=original).update(image_variants=variants)
+    transaction.on_commit(bump_catalog_version)
+    return variants
+
+
+def schedule_variants(product, stale=()):
+    """
+    Queue derivative generation for `product`'s current image, and the
+    removal of `stale`, the variant files of the image it replaced. Call
+    inside the transaction that saved the product.
+    """
+    publish('product.image_changed', 'product', product.pk, {
+        'image': product.image.name or '',
+        'stale': sorted(stale),
+    })
+
+
+def refresh_variants(product_id, image_name, stale=()):
+    """
+    Outbox work for one image change. Skips generation if the product is
+    gone or its image has been replaced again (that change has its own
+    event), then deletes the stale files the new variants did not reuse.
+    """
+    product = Product.objects.filter(pk=product_id, image=image_name).exclude(image='').first()
+    variants = generate_variants(product) if product is not None else {}
+    storage = Product._meta.get_field('image').storage
+    for name in set(stale) - variant_files(variants):
+        if storage.exists(name):
+            storage.delete(name)
+    return variants
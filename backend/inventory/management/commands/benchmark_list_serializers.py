@@ -0,0 +1,133 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from rest_framework.renderers import JSONRenderer
+
+from inventory.fast_serializers import inventory_log_rows, product_rows
+from inventory.models import Category, InventoryLog, Product
+from inventory.serializers import InventoryLogSerializer, ProductSerializer
+from pos.fast_serializers import pos_sale_rows, render_pos_sales
+from pos.models import POSItem, POSSale
+from pos.serializers import POSSaleSerializer
+from staff.models import Supplier
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the DRF serializers against the .values() fast paths on generated "
+        "data and check both render byte-identical JSON. Runs in a transaction "
+        "that is rolled back, so nothing is left behind."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help="Rows per endpoint (default 10000).")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per path; the best time is reported.")
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        with transaction.atomic():
+            self.seed(rows)
+            cases = [
+                ('products', self.products_drf, self.products_fast),
+                ('stock-in logs', self.logs_drf, self.logs_fast),
+                ('pos sales (5 items each)', self.pos_drf, self.pos_fast),
+            ]
+            self.stdout.write(f"{'endpoint':<26}{'path':<8}{'best ms':>10}{'queries':>10}")
+            failures = []
+            for label, drf, fast in cases:
+                drf_body, drf_ms, drf_queries = self.measure(drf, repeat)
+                fast_body, fast_ms, fast_queries = self.measure(fast, repeat)
+                self.stdout.write(f"{label:<26}{'drf':<8}{drf_ms:>10.1f}{drf_queries:>10}")
+                self.stdout.write(f"{'':<26}{'fast':<8}{fast_ms:>10.1f}{fast_queries:>10}")
+                if drf_body != fast_body:
+                    failures.append(label)
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(f"Fast path output differs for: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("All fast paths render byte-identical JSON."))
+
+    def measure(self, build, repeat):
+        renderer = JSONRenderer()
+        best, body, queries = None, None, 0
+        for _ in range(repeat):
+            # Count with a wrapper rather than connection.queries, whose log
+            # is capped well below the N+1 query counts seen here.
+            executed = []
+
+            def count(execute, sql, params, many, context):
+                executed.append(sql)
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(count):
+                start = time.perf_counter()
+                body = renderer.render(build())
+                elapsed = (time.perf_counter() - start) * 1000
+            queries = len(executed)
+            best = elapsed if best is None else min(best, elapsed)
+        return body, best, queries
+
+    def seed(self, count):
+        categories = Category.objects.bulk_create(
+            Category(name=f"Bench category {i}", slug=f"bench-category-{i}") for i in range(10)
+        )
+        suppliers = Supplier.objects.bulk_create(Supplier(name=f"Bench supplier {i}") for i in range(10))
+        products = Product.objects.bulk_create(
+            Product(
+                category=categories[i % 10] if i % 7 else None,
+                brand_name=f"Brand {i % 50}",
+                product_name=f"Product {i}",
+                description="Benchmark product " * 10,
+                selling_price=Decimal(i % 500) + Decimal('0.99'),
+                image=f"images/products/bench-{i}.jpg" if i % 3 else '',
+                stock_qty=i % 40,
+            )
+            for i in range(count)
+        )
+        InventoryLog.objects.bulk_create(
+            InventoryLog(
+                product=products[i % len(products)],
+                supplier=suppliers[i % 10],
+                quantity_bought=i % 20 + 1,
+                cost_price_per_unit=Decimal('3.50'),
+                total_cost=Decimal('3.50') * (i % 20 + 1),
+            )
+            for i in range(count)
+        )
+        sales = POSSale.objects.bulk_create(
+            POSSale(total_amount=Decimal('50.00'), served_by=f"cashier-{i % 4}") for i in range(count // 5)
+        )
+        POSItem.objects.bulk_create(
+            POSItem(
+                pos_sale=sale,
+                product=products[(n * 5 + k) % len(products)],
+                quantity=k + 1,
+                unit_price=Decimal('10.00'),
+                line_total=Decimal('10.00') * (k + 1),
+            )
+            for n, sale in enumerate(sales) for k in range(5)
+        )
+
+    # The "drf" paths mirror what the views did before the fast paths
+    # existed: a serializer over a plain queryset.
+    def products_drf(self):
+        return ProductSerializer(Product.objects.order_by('-created_at', '-id'), many=True).data
+
+    def products_fast(self):
+        rows = product_rows()
+        return rows.render(rows.values(Product.objects.order_by('-created_at', '-id')))
+
+    def logs_drf(self):
+        return InventoryLogSerializer(InventoryLog.objects.order_by('-delivery_date', '-id'), many=True).data
+
+    def logs_fast(self):
+        rows = inventory_log_rows()
+        return rows.render(rows.values(InventoryLog.objects.order_by('-delivery_date', '-id')))
+
+    def pos_drf(self):
+        return POSSaleSerializer(POSSale.objects.order_by('-timestamp', '-id'), many=True).data
+
+    def pos_fast(self):
+        return render_pos_sales(pos_sale_rows().values(POSSale.objects.order_by('-timestamp', '-id')))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from inventory.images import generate_variants
+from inventory.models import Product
+
+
+class Command(BaseCommand):
+    help = "Generate responsive JPEG/WebP variants for product images that do not have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Regenerate variants for every product image.")
+        parser.add_argument('--product', type=int, help="Only process this product id.")
+
+    def handle(self, *args, **options):
+        queryset = Product.objects.exclude(image='').only('id', 'image', 'image_variants').order_by('pk')
+        if options['product']:
+            queryset = queryset.filter(pk=options['product'])
+        if not options['force']:
+            queryset = queryset.filter(image_variants={})
+
+        done = failed = 0
+        for product in queryset.iterator(chunk_size=200):
+            try:
+                generate_variants(product)
+                done += 1
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f"Product {product.pk} ({product.image.name}): {exc}")
+
+        self.stdout.write(self.style.SUCCESS(f"Generated variants for {done} product(s), {failed} failed."))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from inventory.models import StockValuation
+from inventory.valuation import compute_snapshot, rebuild_snapshot
+
+
+class Command(BaseCommand):
+    help = "Recompute the stock valuation snapshot from Product and report any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Only report drift between the snapshot and a full recomputation.",
+        )
+
+    def handle(self, *args, **options):
+        stored = {
+            row.scope: (row.total_units, row.retail_value, row.cost_value)
+            for row in StockValuation.objects.all()
+        }
+        fresh = compute_snapshot() if options['check'] else rebuild_snapshot()
+
+        drifted = 0
+        for (scope, _), values in sorted(fresh.items()):
+            current = stored.get(scope, (0, 0, 0))
+            if tuple(current) != tuple(values):
+                drifted += 1
+                self.stdout.write(
+                    f"{scope}: stored units={current[0]} retail={current[1]} cost={current[2]}, "
+                    f"actual units={values[0]} retail={values[1]} cost={values[2]}"
+                )
+
+        if options['check']:
+            if drifted:
+                self.stdout.write(self.style.WARNING(f"{drifted} scope(s) drifted. Run without --check to rebuild."))
+            else:
+                self.stdout.write(self.style.SUCCESS("Stock valuation snapshot is in sync."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Stock valuation rebuilt ({drifted} scope(s) corrected)."))
@@ -0,0 +1,86 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from inventory.models import ProductSalesVelocity
+from inventory.reorder import refresh
+from pos.models import POSItem
+from sales.models import SaleItem
+
+FIELDS = ['daily_rate', 'rate_as_of', 'reorder_point', 'units_sold', 'last_sale_at']
+
+
+class Command(BaseCommand):
+    help = (
+        "Decay every product's sales velocity to now and recompute reorder points. "
+        "With --rebuild, replay the last --days of sales history from scratch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help="Recompute velocities from raw sale lines.")
+        parser.add_argument('--days', type=int, default=90, help="History to replay with --rebuild (default 90).")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        if options['rebuild']:
+            count = self.rebuild(now, options['days'])
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt sales velocity for {count} product(s)."))
+            return
+
+        batch = []
+        count = 0
+        for velocity in ProductSalesVelocity.objects.order_by('pk').iterator(chunk_size=500):
+            refresh(velocity, max(now, velocity.rate_as_of))
+            batch.append(velocity)
+            if len(batch) == 500:
+                ProductSalesVelocity.objects.bulk_update(batch, FIELDS)
+                count += len(batch)
+                batch = []
+        ProductSalesVelocity.objects.bulk_update(batch, FIELDS)
+        count += len(batch)
+        self.stdout.write(self.style.SUCCESS(f"Refreshed sales velocity for {count} product(s)."))
+
+    def rebuild(self, now, days):
+        since = now - timedelta(days=days)
+        daily = defaultdict(lambda: defaultdict(int))
+        online = (
+            SaleItem.objects.filter(sale__status='completed', sale__sale_date__gte=since)
+            .annotate(day=TruncDate('sale__sale_date'))
+            .values('product_id', 'day').annotate(units=Sum('quantity'))
+        )
+        walk_in = (
+            POSItem.objects.filter(pos_sale__timestamp__gte=since)
+            .annotate(day=TruncDate('pos_sale__timestamp'))
+            .values('product_id', 'day').annotate(units=Sum('quantity'))
+        )
+        for row in list(online) + list(walk_in):
+            daily[row['product_id']][row['day']] += row['units']
+
+        existing = ProductSalesVelocity.objects.in_bulk()
+        rows = []
+        for product_id, days_sold in daily.items():
+            velocity = existing.pop(product_id, None) or ProductSalesVelocity(product_id=product_id)
+            velocity.daily_rate = 0
+            velocity.units_sold = 0
+            velocity.last_sale_at = None
+            velocity.rate_as_of = since
+            for day in sorted(days_sold):
+                sold_at = timezone.make_aware(datetime.combine(day, time(12)))
+                refresh(velocity, max(sold_at, velocity.rate_as_of), days_sold[day])
+            refresh(velocity, max(now, velocity.rate_as_of))
+            rows.append(velocity)
+
+        with transaction.atomic():
+            # Products with no sales in the window start over from zero
+            ProductSalesVelocity.objects.filter(pk__in=list(existing)).update(
+                daily_rate=0, rate_as_of=now, reorder_point=0
+            )
+            ProductSalesVelocity.objects.bulk_create(
+                rows, update_conflicts=True, unique_fields=['product'], update_fields=FIELDS,
+            )
+        return len(rows)
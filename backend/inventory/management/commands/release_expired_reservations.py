@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from inventory.services import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Release stock held by checkouts whose reservation has expired. Meant to run every minute or so."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Reservations released per transaction.")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            released = release_expired_reservations(limit=options['batch_size'])
+            if not released:
+                break
+            total += released
+        self.stdout.write(self.style.SUCCESS(f"Released {total} reserved unit(s)."))
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
 from staff.models import Supplier
 
@@ -22,9 +22,16 @@ class Product(models.Model):
     description = models.TextField()
     selling_price = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(0.01)])
     image = models.ImageField(upload_to='images/products/') # Saves to /media/images/products/
+    # Resized JPEG/WebP copies of `image`, filled in by inventory/images.py
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     
     # Stock level (updated automatically when inventory is added)
     stock_qty = models.PositiveIntegerField(default=0)
+    # Units held by pending online checkouts (see StockReservation); the
+    # sellable quantity is stock_qty - reserved_qty
+    reserved_qty = models.PositiveIntegerField(default=0, editable=False)
+    # Weighted-average cost of the units on hand, rolled forward on stock-in
+    average_cost = models.DecimalField(max_digits=14, decimal_places=4, default=0, editable=False)
     
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -34,8 +41,29 @@ class Product(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['brand_name', 'product_name']),
+            # Catalog delta sync: products changed since a watermark
+            models.Index(fields=['updated_at', 'id']),
         ]
 
+    # Written only through narrow UPDATEs: stock and cost by
+    # inventory.services, variants by inventory.images. The stock UPDATEs
+    # also set updated_at, which the catalog sync relies on.
+    SERVICE_MANAGED_FIELDS = ('stock_qty', 'reserved_qty', 'average_cost', 'image_variants')
+
+    def save(self, *args, **kwargs):
+        # Never write service-managed columns back from a possibly stale
+        # instance when an existing product is edited.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.SERVICE_MANAGED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def available_qty(self):
+        return self.stock_qty - self.reserved_qty
+
     def __str__(self):
         return f"{self.brand_name} - {self.product_name}"
 
@@ -52,17 +80,134 @@ class InventoryLog(models.Model):
     
     delivery_date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # History is listed newest first and paged on (delivery_date, id)
+            models.Index(fields=['delivery_date', 'id']),
+            models.Index(fields=['supplier', 'delivery_date']),
+            models.Index(fields=['product', 'delivery_date']),
+        ]
+
     def save(self, *args, **kwargs):
         # Calculate total price automatically
         self.total_cost = self.quantity_bought * self.cost_price_per_unit
         
         # Logic to update the main Product stock
         if not self.pk:  # Only on first save (creation)
-            self.product.stock_qty += self.quantity_bought
-            self.product.save()
-            
+            from .services import add_stock
+            with transaction.atomic():
+                add_stock(self.product_id, self.quantity_bought, self.cost_price_per_unit)
+                super().save(*args, **kwargs)
+            return
+
         super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Ref: {self.product.product_name} from {self.supplier.name}"
-    
+
+
+class StockValuation(models.Model):
+    """
+    Running totals of the stock on hand, kept up to date by deltas (see
+    inventory/valuation.py). There is one row for the whole warehouse
+    (scope "all") and one per category.
+    """
+    OVERALL = 'all'
+    UNCATEGORISED = 'uncategorised'
+
+    scope = models.CharField(max_length=50, unique=True)
+    category = models.OneToOneField(Category, on_delete=models.CASCADE, null=True, blank=True, related_name='valuation')
+
+    total_units = models.BigIntegerField(default=0)
+    # Exact running totals; round to cents for display (valuation.to_cents)
+    retail_value = models.DecimalField(max_digits=20, decimal_places=4, default=0)
+    cost_value = models.DecimalField(max_digits=20, decimal_places=4, default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Valuation ({self.scope})"
+
+
+class ProductSalesVelocity(models.Model):
+    """
+    Compact per-product sales rate used for reordering. `daily_rate` is an
+    exponentially weighted moving average of units sold per day, updated
+    from each completed sale (see inventory/reorder.py) instead of being
+    aggregated from raw sale lines.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='sales_velocity')
+
+    daily_rate = models.FloatField(default=0)
+    rate_as_of = models.DateTimeField()
+    last_sale_at = models.DateTimeField(null=True, blank=True)
+    units_sold = models.BigIntegerField(default=0)
+
+    # Days between placing an order and the stock arriving, plus buffer
+    lead_time_days = models.PositiveSmallIntegerField(default=7)
+    safety_days = models.PositiveSmallIntegerField(default=3)
+    reorder_point = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        verbose_name_plural = "Product sales velocities"
+        indexes = [
+            models.Index(fields=['reorder_point']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.daily_rate:.2f}/day"
+
+
+class StockReservation(models.Model):
+    """
+    Units held for a checkout that is waiting for payment. `reference`
+    names the holder (e.g. "sale:42"). Product.reserved_qty is the running
+    sum of these rows; see inventory.services for how both change together.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    reference = models.CharField(max_length=50, db_index=True)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} for {self.reference}"
+
+
+class ProductCode(models.Model):
+    """
+    A barcode or SKU that identifies a product at the till. A product can
+    have several (e.g. each pack size's EAN plus an internal SKU); a code
+    belongs to exactly one product.
+    """
+    BARCODE = 'barcode'
+    SKU = 'sku'
+    KIND_CHOICES = [
+        (BARCODE, 'Barcode'),
+        (SKU, 'SKU'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='codes')
+    code = models.CharField(max_length=64, unique=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default=BARCODE)
+
+    def save(self, *args, **kwargs):
+        # Scanners and hand-typed SKUs both tend to carry stray whitespace
+        self.code = self.code.strip()
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.code} ({self.get_kind_display()})"
+
+
+class ProductTombstone(models.Model):
+    """
+    Records a deleted product so terminals syncing the catalog since an
+    earlier watermark learn to drop it (see inventory/catalog_sync.py).
+    Kept for TOMBSTONE_RETENTION; older watermarks get a full snapshot.
+    """
+    product_id = models.PositiveBigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Product {self.product_id} deleted {self.deleted_at:%Y-%m-%d %H:%M}"
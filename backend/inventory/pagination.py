@@ -0,0 +1,175 @@
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core import signing
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination that seeks on the full ordering tuple, e.g.
+
+        WHERE created_at < %s OR (created_at = %s AND id < %s)
+
+    instead of using OFFSET, so every page costs the same no matter how
+    deep the client has scrolled. The last field of `ordering` must be
+    unique (normally the primary key) so that ties are broken exactly.
+
+    Cursors are signed, so a client can only send back one it was given;
+    a malformed, tampered or stale (other ordering) cursor is a 400.
+
+    Works with model instances and with `.values()` rows.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+    cursor_salt = 'inventory.pagination.cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        cursor = self.decode_cursor(request)
+        self.reverse = bool(cursor and cursor['reverse'])
+        ordering = self._invert(self.ordering) if self.reverse else self.ordering
+
+        queryset = queryset.order_by(*ordering)
+        if cursor:
+            queryset = queryset.filter(self._seek(queryset.model, ordering, cursor['values']))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+
+        # Coming back from a later page means there is always a next page
+        self.has_next = True if self.reverse else has_more
+        self.has_previous = has_more if self.reverse else cursor is not None
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Follow OrderingFilter when the view uses it, always appending the
+        primary key as the tie-breaker.
+        """
+        for backend in getattr(view, 'filter_backends', []):
+            if issubclass(backend, OrderingFilter):
+                requested = backend().get_ordering(request, queryset, view)
+                if requested:
+                    fields = [f for f in requested if f.lstrip('-') not in ('id', 'pk')]
+                    if fields:
+                        tie_breaker = '-id' if fields[0].startswith('-') else 'id'
+                        return tuple(fields) + (tie_breaker,)
+        return tuple(self.ordering)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def encode_cursor(self, row, reverse):
+        values = [self._dump(self._value(row, field.lstrip('-'))) for field in self.ordering]
+        token = signing.dumps({'o': list(self.ordering), 'v': values, 'r': reverse}, salt=self.cursor_salt)
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload = signing.loads(token, salt=self.cursor_salt)
+            ordering, values, reverse = tuple(payload['o']), payload['v'], bool(payload['r'])
+        except (signing.BadSignature, TypeError, ValueError, KeyError):
+            self.invalid_cursor()
+        if ordering != tuple(self.ordering) or len(values) != len(ordering):
+            self.invalid_cursor()
+        return {'values': values, 'reverse': reverse}
+
+    def invalid_cursor(self):
+        raise ValidationError({self.cursor_query_param: [self.invalid_cursor_message]})
+
+    @staticmethod
+    def _invert(ordering):
+        return tuple(f[1:] if f.startswith('-') else f'-{f}' for f in ordering)
+
+    @staticmethod
+    def _value(row, name):
+        return row[name] if isinstance(row, dict) else getattr(row, name)
+
+    @staticmethod
+    def _dump(value):
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+    def _seek(self, model, ordering, raw_values):
+        """
+        Build the row-value comparison "(a, b, id) > (x, y, z)" as an OR of
+        prefixes, which also handles mixed ASC/DESC orderings.
+        """
+        try:
+            values = [
+                model._meta.get_field(field.lstrip('-')).to_python(raw)
+                for field, raw in zip(ordering, raw_values)
+            ]
+        except Exception:
+            self.invalid_cursor()
+
+        condition = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            step = Q(**{f'{name}__{lookup}': values[index]})
+            for prev_field, prev_value in zip(ordering[:index], values[:index]):
+                step &= Q(**{prev_field.lstrip('-'): prev_value})
+            condition |= step
+        return condition
+
+
+class InventoryLogCursorPagination(KeysetPagination):
+    ordering = ('-delivery_date', '-id')
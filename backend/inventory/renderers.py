@@ -0,0 +1,24 @@
+from rest_framework.renderers import BaseRenderer
+
+try:
+    import msgpack
+except ImportError:  # optional; terminals then get JSON
+    msgpack = None
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Renders to MessagePack for clients sending `Accept: application/x-msgpack`."""
+    media_type = 'application/x-msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, use_bin_type=True)
+
+
+def with_msgpack(renderer_classes):
+    """`renderer_classes` plus MessagePackRenderer when msgpack is installed."""
+    return list(renderer_classes) + ([MessagePackRenderer] if msgpack is not None else [])
@@ -0,0 +1,89 @@
+"""
+Sales velocity and reorder points.
+
+Each product's rate is an exponentially weighted moving average of units
+sold per day with a VELOCITY_WINDOW_DAYS time constant:
+
+    rate = rate * exp(-elapsed_days / window) + units / window
+
+For a steady flow of r units/day this settles at r, and updating it needs
+only the previous value, never the sale history. The reorder point is the
+demand expected over lead time plus safety days, so the low-stock query
+is a plain comparison of stock_qty with a stored number.
+"""
+import math
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ProductSalesVelocity
+
+VELOCITY_WINDOW_DAYS = 14
+ORDER_COVER_DAYS = 30
+SECONDS_PER_DAY = 86400
+
+
+def decayed_rate(velocity, now):
+    elapsed = max((now - velocity.rate_as_of).total_seconds(), 0) / SECONDS_PER_DAY
+    return velocity.daily_rate * math.exp(-elapsed / VELOCITY_WINDOW_DAYS)
+
+
+def refresh(velocity, now, units=0):
+    """Roll `velocity` forward to `now`, adding `units` sold at `now`."""
+    velocity.daily_rate = decayed_rate(velocity, now) + units / VELOCITY_WINDOW_DAYS
+    velocity.rate_as_of = now
+    velocity.reorder_point = math.ceil(
+        velocity.daily_rate * (velocity.lead_time_days + velocity.safety_days)
+    )
+    if units:
+        velocity.units_sold += units
+        velocity.last_sale_at = now
+
+
+def record_units_sold(quantities, sold_at=None):
+    """
+    Fold one completed sale into the velocity table. `quantities` maps a
+    product pk to units sold. Rows are locked in pk order, so concurrent
+    sales of the same products queue instead of overwriting each other.
+    """
+    if not quantities:
+        return
+    now = sold_at or timezone.now()
+    with transaction.atomic():
+        ProductSalesVelocity.objects.bulk_create(
+            [ProductSalesVelocity(product_id=pk, rate_as_of=now) for pk in quantities],
+            ignore_conflicts=True,
+        )
+        rows = list(
+            ProductSalesVelocity.objects.select_for_update()
+            .filter(pk__in=list(quantities)).order_by('pk')
+        )
+        for velocity in rows:
+            refresh(velocity, max(now, velocity.rate_as_of), quantities[velocity.pk])
+        ProductSalesVelocity.objects.bulk_update(
+            rows, ['daily_rate', 'rate_as_of', 'reorder_point', 'units_sold', 'last_sale_at']
+        )
+
+
+def quantities_from_lines(lines):
+    """Sum (product_id, quantity) pairs into a {product_id: units} map."""
+    quantities = defaultdict(int)
+    for product_id, quantity in lines:
+        quantities[product_id] += quantity
+    return quantities
+
+
+def suggestion(velocity, available_qty, now):
+    """
+    The figures the low-stock screen shows for one product, given its
+    sellable stock (stock_qty - reserved_qty).
+    """
+    rate = decayed_rate(velocity, now)
+    target = math.ceil(rate * (velocity.lead_time_days + velocity.safety_days + ORDER_COVER_DAYS))
+    return {
+        'daily_rate': round(rate, 3),
+        'days_of_cover': round(available_qty / rate, 1) if rate > 0 else None,
+        'reorder_point': velocity.reorder_point,
+        'suggested_order_qty': max(target - available_qty, 0),
+    }
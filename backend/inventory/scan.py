@@ -0,0 +1,97 @@
+"""
+Barcode/SKU lookups for the till.
+
+Each worker keeps the compact records of recently scanned codes in a
+bounded LRU. An entry is stored with the product's version (see
+inventory.cache.get_product_version) and only served while that version
+is current, so a price edit, a sale or a code change anywhere is seen by
+every worker on its next scan. A warm hit costs one cache GET and no
+database query.
+"""
+import threading
+from collections import OrderedDict
+
+from .cache import get_product_version
+from .fast_serializers import money
+from .models import ProductCode
+
+SCAN_CACHE_SIZE = 4096
+
+
+class LRUCache:
+    """A small thread-safe least-recently-used map."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+scan_cache = LRUCache(SCAN_CACHE_SIZE)
+
+
+def _fetch(code):
+    row = (
+        ProductCode.objects.filter(code=code)
+        .values(
+            'product_id', 'product__brand_name', 'product__product_name', 'product__selling_price',
+            'product__stock_qty', 'product__reserved_qty', 'product__is_active',
+        )
+        .first()
+    )
+    if row is None:
+        return None
+    return {
+        'id': row['product_id'],
+        'code': code,
+        'brand_name': row['product__brand_name'],
+        'product_name': row['product__product_name'],
+        'selling_price': money(row['product__selling_price']),
+        'available_qty': row['product__stock_qty'] - row['product__reserved_qty'],
+        'is_active': row['product__is_active'],
+    }
+
+
+def lookup_code(code):
+    """The till record for a scanned code, or None if no product has it."""
+    code = code.strip()
+    product_id = version = None
+    entry = scan_cache.get(code)
+    if entry is not None:
+        cached_version, record = entry
+        product_id, version = record['id'], get_product_version(record['id'])
+        if version == cached_version:
+            return record
+
+    # The version must be read before the row: a change committed in
+    # between then leaves the entry one version behind, never stale under
+    # the current one.
+    record = _fetch(code)
+    if record is not None and record['id'] != product_id:
+        # Cold, or the code moved to another product since it was cached
+        product_id, version = record['id'], get_product_version(record['id'])
+        record = _fetch(code)
+    if record is not None and record['id'] == product_id:
+        scan_cache.set(code, (version, record))
+    return record
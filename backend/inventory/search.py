@@ -0,0 +1,148 @@
+"""
+Full-text product search.
+
+PostgreSQL keeps a generated `search_vector` tsvector column on
+inventory_product with a GIN index. SQLite keeps an external-content FTS5
+table, inventory_product_fts, synced by triggers. Both are created by
+install_search_index() after migrate, since the model does not declare
+them. Any other database falls back to icontains.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter
+
+MAX_TERMS = 8
+
+POSTGRES_DDL = [
+    """
+    ALTER TABLE inventory_product ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(product_name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(brand_name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'C')
+    ) STORED
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS inventory_product_search_idx
+    ON inventory_product USING gin (search_vector)
+    """,
+]
+
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE inventory_product_fts USING fts5(
+        product_name, brand_name, description,
+        content='inventory_product', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER inventory_product_fts_ai AFTER INSERT ON inventory_product BEGIN
+        INSERT INTO inventory_product_fts(rowid, product_name, brand_name, description)
+        VALUES (new.id, new.product_name, new.brand_name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER inventory_product_fts_ad AFTER DELETE ON inventory_product BEGIN
+        INSERT INTO inventory_product_fts(inventory_product_fts, rowid, product_name, brand_name, description)
+        VALUES ('delete', old.id, old.product_name, old.brand_name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER inventory_product_fts_au
+    AFTER UPDATE OF product_name, brand_name, description ON inventory_product BEGIN
+        INSERT INTO inventory_product_fts(inventory_product_fts, rowid, product_name, brand_name, description)
+        VALUES ('delete', old.id, old.product_name, old.brand_name, old.description);
+        INSERT INTO inventory_product_fts(rowid, product_name, brand_name, description)
+        VALUES (new.id, new.product_name, new.brand_name, new.description);
+    END
+    """,
+    # Index the rows that existed before the table was created
+    "INSERT INTO inventory_product_fts(inventory_product_fts) VALUES ('rebuild')",
+]
+
+
+def install_search_index(sender, using, **kwargs):
+    """
+    post_migrate handler that creates the search column/table. Safe to run
+    on every migrate.
+    """
+    from django.db import connections
+
+    conn = connections[using]
+    with conn.cursor() as cursor:
+        if 'inventory_product' not in conn.introspection.table_names(cursor):
+            return
+        if conn.vendor == 'postgresql':
+            for statement in POSTGRES_DDL:
+                cursor.execute(statement)
+        elif conn.vendor == 'sqlite':
+            if 'inventory_product_fts' in conn.introspection.table_names(cursor):
+                return
+            for statement in SQLITE_DDL:
+                cursor.execute(statement)
+
+
+def parse_terms(query):
+    return re.findall(r'\w+', query or '')[:MAX_TERMS]
+
+
+def search_products(queryset, query):
+    """
+    Filter `queryset` to products matching every term of `query` (prefix
+    matches, so "cok" finds "Coke") and annotate `search_rank`, where a
+    higher value is a better match. Name and brand weigh more than the
+    description.
+    """
+    terms = parse_terms(query)
+    if not terms:
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField())).none()
+
+    if connection.vendor == 'postgresql':
+        tsquery = ' & '.join(f"{term}:*" for term in terms)
+        return queryset.filter(
+            RawSQL("inventory_product.search_vector @@ to_tsquery('simple', %s)", [tsquery], output_field=BooleanField())
+        ).annotate(
+            search_rank=RawSQL(
+                "ts_rank(inventory_product.search_vector, to_tsquery('simple', %s))",
+                [tsquery], output_field=FloatField(),
+            )
+        )
+
+    if connection.vendor == 'sqlite':
+        match = ' '.join('"%s"*' % term for term in terms)
+        return queryset.filter(
+            id__in=RawSQL(
+                "SELECT rowid FROM inventory_product_fts WHERE inventory_product_fts MATCH %s", [match]
+            )
+        ).annotate(
+            # bm25() is lower-is-better, so negate it
+            search_rank=RawSQL(
+                "(SELECT -bm25(inventory_product_fts, 10.0, 10.0, 1.0) FROM inventory_product_fts"
+                " WHERE inventory_product_fts MATCH %s AND rowid = inventory_product.id)",
+                [match], output_field=FloatField(),
+            )
+        )
+
+    condition = Q()
+    for term in terms:
+        condition &= (
+            Q(product_name__icontains=term)
+            | Q(brand_name__icontains=term)
+            | Q(description__icontains=term)
+        )
+    return queryset.filter(condition).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+class FullTextSearchFilter(SearchFilter):
+    """
+    Drop-in replacement for SearchFilter on the product catalog that goes
+    through the full-text index instead of ILIKE '%term%'.
+    """
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        return search_products(queryset, query)
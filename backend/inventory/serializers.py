@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 from rest_framework import serializers
 from .models import Category, Product, InventoryLog
 from staff.models import Supplier
@@ -7,18 +9,56 @@ class CategorySerializer(serializers.ModelSerializer):
         model = Category
         fields = ['id', 'name', 'slug']
 
-class ProductSerializer(serializers.ModelSerializer):
+def build_srcset(variants, storage, request=None):
+    """
+    Turns Product.image_variants into one srcset string per format.
+    Empty until the background job has produced the variants.
+    """
+    srcset = {}
+    for width in sorted(variants or {}, key=int):
+        for key, name in variants[width].items():
+            url = storage.url(name)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            srcset.setdefault(key, []).append(f"{url} {width}w")
+    return {key: ', '.join(entries) for key, entries in srcset.items()}
+
+
+class SparseFieldsMixin:
+    """
+    Accepts an optional `fields` argument listing which fields to keep,
+    e.g. ProductSerializer(qs, many=True, fields=['id', 'product_name']).
+    """
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     category_name = serializers.ReadOnlyField(source='category.name')
     # Using ImageField handles the validation of actual image files
     image = serializers.ImageField(required=False)
+    # Responsive variants, e.g. {"webp": "/media/..._320w.webp 320w, ...", "jpeg": "..."}
+    image_srcset = serializers.SerializerMethodField()
+    # stock_qty minus units held by pending online checkouts
+    available_qty = serializers.ReadOnlyField()
 
     class Meta:
         model = Product
         fields = [
             'id', 'category', 'category_name', 'brand_name', 
             'product_name', 'description', 'selling_price', 
-            'image', 'stock_qty', 'is_active'
+            'image', 'image_srcset', 'stock_qty', 'available_qty', 'is_active'
         ]
+        # Stock only changes through stock-in and sales (inventory.services);
+        # Product.save never writes it back
+        read_only_fields = ['stock_qty']
+
+    def get_image_srcset(self, obj):
+        return build_srcset(obj.image_variants, obj.image.storage, self.context.get('request'))
 
 class InventoryLogSerializer(serializers.ModelSerializer):
     # These help display names in the dashboard instead of just IDs
@@ -37,4 +77,45 @@ class InventoryLogSerializer(serializers.ModelSerializer):
     def validate_quantity_bought(self, value):
         if value <= 0:
             raise serializers.ValidationError("Quantity must be greater than zero.")
-        return value
\ No newline at end of file
+        return value
+
+
+class StockInLineSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    quantity_bought = serializers.IntegerField(min_value=1)
+    cost_price_per_unit = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0'))
+
+
+class StockInBatchSerializer(serializers.Serializer):
+    """
+    One supplier delivery (the header) with all of its lines.
+    """
+    MAX_LINES = 500
+
+    supplier = serializers.PrimaryKeyRelatedField(queryset=Supplier.objects.all())
+    lines = StockInLineSerializer(many=True, allow_empty=False)
+
+    def validate_lines(self, lines):
+        if len(lines) > self.MAX_LINES:
+            raise serializers.ValidationError(
+                f"A delivery can have at most {self.MAX_LINES} lines."
+            )
+
+        # Resolve every product in one query instead of one per line
+        products = Product.objects.in_bulk({line['product'] for line in lines})
+        errors = []
+        for line in lines:
+            product = products.get(line['product'])
+            if product is None:
+                errors.append({'product': [f"Invalid pk \"{line['product']}\" - object does not exist."]})
+            else:
+                line['product'] = product
+                errors.append({})
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return lines
+
+
+class CatalogSyncQuerySerializer(serializers.Serializer):
+    # The `watermark` returned by the previous sync; omit for a full snapshot
+    since = serializers.DateTimeField(required=False)
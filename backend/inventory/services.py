@@ -0,0 +1,280 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import Case, F, PositiveIntegerField, When
+
+from .cache import invalidate_products
+from .models import Product, InventoryLog, StockReservation
+from .signals import stock_changed
+
+# How long a pending online checkout may hold stock
+RESERVATION_TTL = timedelta(minutes=15)
+# Precision of Product.average_cost
+COST_PLACES = Decimal('0.0001')
+
+
+class InsufficientStock(ValueError):
+    """
+    Raised when a conditional stock decrement does not match a row, i.e.
+    the product does not have enough units left (or does not exist).
+    """
+    def __init__(self, product, quantity):
+        self.product = product
+        self.quantity = quantity
+        super().__init__(f"Insufficient stock for {product}")
+
+
+def _product_pk(product):
+    return product.pk if isinstance(product, Product) else product
+
+
+def _changed(deltas, costs=None):
+    stock_changed.send(sender=Product, deltas=deltas, costs=costs or {})
+
+
+def _increment(product_id, quantity, cost=None):
+    """
+    Add `quantity` units. When they cost `cost` in total, roll the
+    weighted-average cost forward and return how much stock_qty *
+    average_cost changed (what the units add to the cost valuation,
+    after the average is rounded); otherwise return None.
+    """
+    values = {'stock_qty': F('stock_qty') + quantity, 'updated_at': timezone.now()}
+    if cost is None:
+        Product.objects.filter(pk=product_id).update(**values)
+        return None
+
+    with transaction.atomic():
+        # Stock-in is rare next to sales, so locking the row to read the
+        # old average is cheap; the new one is computed here, rounded once
+        old = (
+            Product.objects.select_for_update().filter(pk=product_id)
+            .values_list('stock_qty', 'average_cost').first()
+        )
+        if old is None:
+            return None
+        stock_qty, average_cost = old
+        values['average_cost'] = (
+            (stock_qty * average_cost + cost) / (stock_qty + quantity)
+        ).quantize(COST_PLACES)
+        Product.objects.filter(pk=product_id).update(**values)
+    return (stock_qty + quantity) * values['average_cost'] - stock_qty * average_cost
+
+
+def add_stock(product, quantity, unit_cost=None):
+    """
+    Increase stock_qty by `quantity` with a single narrow UPDATE.
+    `product` may be a Product instance or a primary key. When the units
+    were bought at `unit_cost`, average_cost is rolled forward as well.
+    """
+    product_id = _product_pk(product)
+    cost = quantity * unit_cost if unit_cost is not None else None
+    cost_change = _increment(product_id, quantity, cost)
+    _changed({product_id: quantity}, {product_id: cost_change} if cost_change is not None else None)
+
+
+def remove_stock(product, quantity):
+    """
+    Decrease stock_qty by `quantity` with a conditional UPDATE:
+
+        UPDATE ... SET stock_qty = stock_qty - n
+        WHERE id = %s AND stock_qty >= reserved_qty + n
+
+    The database evaluates the guard and the decrement together, so two
+    tills selling the last unit at the same time cannot both succeed.
+    Raises InsufficientStock when no row matched.
+    """
+    product_id = _product_pk(product)
+    # Units reserved for pending checkouts are not for sale
+    updated = Product.objects.filter(
+        pk=product_id, stock_qty__gte=F('reserved_qty') + quantity
+    ).update(stock_qty=F('stock_qty') - quantity, updated_at=timezone.now())
+    if not updated:
+        raise InsufficientStock(product, quantity)
+    _changed({product_id: -quantity})
+
+
+def _per_product(quantities, column):
+    """CASE expression subtracting quantities[pk] from `column` row by row."""
+    return Case(
+        *[When(pk=product_id, then=F(column) - quantity) for product_id, quantity in quantities.items()],
+        default=F(column),
+        output_field=PositiveIntegerField(),
+    )
+
+
+def remove_stock_bulk(quantities):
+    """
+    Deduct several products at once, all or nothing. `quantities` maps a
+    product pk to the number of units. The rows are locked with one
+    SELECT ... FOR UPDATE in primary-key order, checked, and decremented
+    by a single UPDATE with one CASE branch per product. Raises
+    InsufficientStock for the first product that is short, in which case
+    no row is changed.
+    """
+    if not quantities:
+        return
+    with transaction.atomic():
+        available = dict(
+            Product.objects.select_for_update()
+            .filter(pk__in=list(quantities)).order_by('pk')
+            .values_list('pk', F('stock_qty') - F('reserved_qty'))
+        )
+        for product_id in sorted(quantities):
+            if available.get(product_id, 0) < quantities[product_id]:
+                raise InsufficientStock(product_id, quantities[product_id])
+
+        Product.objects.filter(pk__in=list(quantities)).update(
+            stock_qty=_per_product(quantities, 'stock_qty'), updated_at=timezone.now(),
+        )
+        _changed({product_id: -quantity for product_id, quantity in quantities.items()})
+
+
+def add_stock_bulk(quantities, costs=None):
+    """
+    Apply several stock increments in one transaction, one UPDATE per
+    product. `quantities` maps a product pk to the number of units and the
+    optional `costs` maps a product pk to what those units cost in total.
+    Products are touched in primary-key order so two concurrent batches
+    never wait on each other's rows in opposite order.
+    """
+    costs = costs or {}
+    with transaction.atomic():
+        cost_changes = {}
+        for product_id in sorted(quantities):
+            cost_change = _increment(product_id, quantities[product_id], costs.get(product_id))
+            if cost_change is not None:
+                cost_changes[product_id] = cost_change
+        _changed(dict(quantities), cost_changes)
+
+
+def receive_delivery(supplier, lines):
+    """
+    Record a supplier delivery of many lines at once.
+
+    Each line is a dict with `product` (a Product instance),
+    `quantity_bought` and `cost_price_per_unit`. The InventoryLog rows are
+    inserted with one bulk_create and the stock increments are grouped per
+    product, all inside a single transaction. Returns the created logs in
+    line order.
+    """
+    logs = []
+    quantities = defaultdict(int)
+    costs = defaultdict(Decimal)
+    for line in lines:
+        product = line['product']
+        logs.append(InventoryLog(
+            product=product,
+            supplier=supplier,
+            quantity_bought=line['quantity_bought'],
+            cost_price_per_unit=line['cost_price_per_unit'],
+            # bulk_create skips save(), so compute the total here
+            total_cost=line['quantity_bought'] * line['cost_price_per_unit'],
+        ))
+        quantities[product.pk] += line['quantity_bought']
+        costs[product.pk] += logs[-1].total_cost
+
+    with transaction.atomic():
+        logs = InventoryLog.objects.bulk_create(logs)
+        add_stock_bulk(quantities, costs)
+    return logs
+
+
+def _take_reservations(queryset, **lock):
+    """Lock, delete and sum the reservations in `queryset` per product."""
+    rows = list(queryset.select_for_update(**lock).values_list('pk', 'product_id', 'quantity'))
+    quantities = defaultdict(int)
+    for _, product_id, quantity in rows:
+        quantities[product_id] += quantity
+    if rows:
+        StockReservation.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
+    return quantities
+
+
+def _unreserve(quantities, deduct=False):
+    if not quantities:
+        return
+    # Same lock order as remove_stock_bulk: products by primary key
+    list(Product.objects.select_for_update().filter(pk__in=list(quantities)).order_by('pk').values_list('pk'))
+    values = {'reserved_qty': _per_product(quantities, 'reserved_qty'), 'updated_at': timezone.now()}
+    if deduct:
+        values['stock_qty'] = _per_product(quantities, 'stock_qty')
+    Product.objects.filter(pk__in=list(quantities)).update(**values)
+    product_ids = list(quantities)
+    transaction.on_commit(lambda: invalidate_products(product_ids))
+
+
+def reserve_stock(quantities, reference, ttl=RESERVATION_TTL):
+    """
+    Hold units of several products for `reference`, all or nothing.
+    `quantities` maps a product pk to the number of units. Each product
+    gets one conditional UPDATE, in primary-key order:
+
+        UPDATE ... SET reserved_qty = reserved_qty + n
+        WHERE id = %s AND stock_qty >= reserved_qty + n
+
+    Raises InsufficientStock if any product cannot cover its quantity, in
+    which case nothing is held.
+    """
+    expires_at = timezone.now() + ttl
+    with transaction.atomic():
+        for product_id in sorted(quantities):
+            quantity = quantities[product_id]
+            updated = Product.objects.filter(
+                pk=product_id, stock_qty__gte=F('reserved_qty') + quantity
+            ).update(reserved_qty=F('reserved_qty') + quantity, updated_at=timezone.now())
+            if not updated:
+                raise InsufficientStock(product_id, quantity)
+        StockReservation.objects.bulk_create([
+            StockReservation(product_id=product_id, quantity=quantity, reference=reference, expires_at=expires_at)
+            for product_id, quantity in quantities.items()
+        ])
+        product_ids = list(quantities)
+        transaction.on_commit(lambda: invalidate_products(product_ids))
+
+
+def release_reservation(reference):
+    """Give back whatever is still held for `reference`."""
+    with transaction.atomic():
+        _unreserve(_take_reservations(StockReservation.objects.filter(reference=reference)))
+
+
+def commit_reservation(reference, quantities):
+    """
+    Turn the hold for `reference` into a deduction of `quantities`. Held
+    units leave stock_qty and reserved_qty together; units whose hold has
+    already expired are taken from available stock with
+    remove_stock_bulk, which raises InsufficientStock if they are gone.
+    """
+    with transaction.atomic():
+        held = _take_reservations(StockReservation.objects.filter(reference=reference))
+        _unreserve(held, deduct=True)
+        if held:
+            _changed({product_id: -quantity for product_id, quantity in held.items()})
+        remove_stock_bulk({
+            product_id: quantity - held.get(product_id, 0)
+            for product_id, quantity in quantities.items()
+            if quantity > held.get(product_id, 0)
+        })
+
+
+def release_expired_reservations(now=None, limit=500):
+    """
+    Release up to `limit` expired holds, oldest first, through the
+    expires_at index. SKIP LOCKED lets a sweeper run next to checkouts
+    that are converting their own holds. Returns the number released.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        expired = StockReservation.objects.filter(
+            pk__in=list(
+                StockReservation.objects.filter(expires_at__lte=now)
+                .order_by('expires_at').values_list('pk', flat=True)[:limit]
+            )
+        )
+        quantities = _take_reservations(expired, skip_locked=True)
+        _unreserve(quantities)
+    return sum(quantities.values())
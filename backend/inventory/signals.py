@@ -0,0 +1,137 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from .cache import bump_catalog_version, bump_product_versions, invalidate_products
+from .models import Category, Product, ProductCode
+from . import catalog_sync, images, valuation
+
+# Sent by inventory.services after stock_qty changes, with
+# deltas={product_id: units_added_or_removed} and, for stock-in,
+# costs={product_id: change_in_stock_qty_times_average_cost}.
+stock_changed = Signal()
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_catalog_on_change(sender, instance, **kwargs):
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_on_change(sender, instance, **kwargs):
+    # Read the pk now: a deleted instance has it cleared before commit
+    product_ids = [instance.pk]
+    transaction.on_commit(lambda: invalidate_products(product_ids))
+
+
+@receiver(stock_changed)
+def invalidate_catalog_on_stock_change(sender, deltas, **kwargs):
+    product_ids = list(deltas)
+    transaction.on_commit(lambda: invalidate_products(product_ids))
+
+
+@receiver(pre_save, sender=ProductCode)
+def remember_code_owner(sender, instance, **kwargs):
+    instance._previous_product_id = None
+    if not instance._state.adding:
+        instance._previous_product_id = (
+            ProductCode.objects.filter(pk=instance.pk).values_list('product_id', flat=True).first()
+        )
+
+
+@receiver([post_save, post_delete], sender=ProductCode)
+def invalidate_scans_on_code_change(sender, instance, **kwargs):
+    # A code moved to another product must also stop resolving to the old one
+    product_ids = {instance.product_id, getattr(instance, '_previous_product_id', None)} - {None}
+    # Codes ship with their product in the catalog sync
+    Product.objects.filter(pk__in=product_ids).update(updated_at=timezone.now())
+    transaction.on_commit(lambda: bump_product_versions(product_ids))
+
+
+@receiver(post_delete, sender=Product)
+def record_product_tombstone(sender, instance, **kwargs):
+    catalog_sync.record_tombstone(instance.pk)
+
+
+@receiver(stock_changed)
+def update_valuation_on_stock_change(sender, deltas, costs, **kwargs):
+    valuation.apply_stock_deltas(deltas, costs)
+
+
+def _touches_valuation(update_fields):
+    return update_fields is None or bool({'selling_price', 'category'} & set(update_fields))
+
+
+@receiver(pre_save, sender=Product)
+def remember_valuation_inputs(sender, instance, update_fields=None, **kwargs):
+    instance._valuation_before = None
+    if not instance._state.adding and _touches_valuation(update_fields):
+        instance._valuation_before = valuation.current_values(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def update_valuation_on_product_save(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        valuation.record_deltas([valuation.product_contribution({
+            'category_id': instance.category_id,
+            'stock_qty': instance.stock_qty,
+            'selling_price': Decimal(str(instance.selling_price)),
+            'average_cost': Decimal(str(instance.average_cost)),
+        })])
+        return
+
+    before = getattr(instance, '_valuation_before', None)
+    if before is None:
+        return
+    after = dict(before, category_id=instance.category_id, selling_price=Decimal(str(instance.selling_price)))
+    if after == before:
+        return
+    valuation.record_deltas([
+        valuation.product_contribution(before, sign=-1),
+        valuation.product_contribution(after),
+    ])
+
+
+@receiver(pre_save, sender=Product)
+def remember_image(sender, instance, update_fields=None, **kwargs):
+    instance._image_changed = False
+    instance._stale_variants = set()
+    if instance._state.adding:
+        instance._image_changed = bool(instance.image)
+    elif update_fields is None or 'image' in update_fields:
+        previous = Product.objects.filter(pk=instance.pk).values('image', 'image_variants').first()
+        if previous is not None and previous['image'] != (instance.image.name or ''):
+            instance._image_changed = True
+            instance._stale_variants = images.variant_files(previous['image_variants'])
+
+
+@receiver(post_save, sender=Product)
+def regenerate_image_variants(sender, instance, **kwargs):
+    if getattr(instance, '_image_changed', False):
+        Product.objects.filter(pk=instance.pk).update(image_variants={})
+        images.schedule_variants(instance, stale=instance._stale_variants)
+
+
+@receiver(pre_delete, sender=Product)
+def update_valuation_on_product_delete(sender, instance, **kwargs):
+    before = valuation.current_values(instance.pk)
+    if before is not None:
+        valuation.record_deltas([valuation.product_contribution(before, sign=-1)])
+
+
+@receiver(pre_delete, sender=Category)
+def move_valuation_to_uncategorised(sender, instance, **kwargs):
+    # The category's products are about to be SET_NULL, which happens in
+    # an UPDATE that sends no signals; move what they contribute here
+    # instead. Read from Product, since the stored row may not have this
+    # transaction's deltas yet.
+    rows = []
+    for values in Product.objects.filter(category=instance).values(
+        'category_id', 'selling_price', 'average_cost', 'stock_qty'
+    ):
+        rows.append(valuation.product_contribution(values, sign=-1))
+        rows.append(valuation.product_contribution(dict(values, category_id=None)))
+    valuation.record_deltas(rows)
@@ -1,3 +1,750 @@
-from django.test import TestCase
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core import signing
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from outbox.models import OutboxEvent
+from outbox.relay import drain
+from pos.services import create_pos_sale
+from staff.models import CustomAdmin, Supplier
+from .catalog_sync import catalog_changes
+from .images import render_variants, variant_files
+from . import services
+from .models import Category, Product, ProductCode, InventoryLog, StockValuation
+from .services import (
+    InsufficientStock, add_stock, commit_reservation, release_expired_reservations,
+    receive_delivery, remove_stock, reserve_stock,
+)
+from .reorder import record_units_sold, suggestion
+from .scan import lookup_code, scan_cache
+from .search import search_products
+from .serializers import StockInBatchSerializer
+from .valuation import compute_snapshot, to_cents
+
+
+def make_product(**kwargs):
+    defaults = {
+        'brand_name': 'Acme',
+        'product_name': 'Widget',
+        'description': 'A widget',
+        'selling_price': '10.00',
+        'stock_qty': 0,
+    }
+    defaults.update(kwargs)
+    return Product.objects.create(**defaults)
+
+
+class StockServiceTests(TestCase):
+    def test_remove_stock_refuses_to_oversell(self):
+        product = make_product(stock_qty=3)
+        with self.assertRaises(InsufficientStock):
+            remove_stock(product, 4)
+        product.refresh_from_db()
+        self.assertEqual(product.stock_qty, 3)
+
+    def test_inventory_log_adds_stock(self):
+        product = make_product(stock_qty=2)
+        supplier = Supplier.objects.create(name='Supplier')
+        InventoryLog.objects.create(
+            product=product, supplier=supplier,
+            quantity_bought=5, cost_price_per_unit=Decimal('4.00'),
+        )
+        product.refresh_from_db()
+        self.assertEqual(product.stock_qty, 7)
+
+    def test_product_save_does_not_overwrite_stock(self):
+        product = make_product(stock_qty=10)
+        stale = Product.objects.get(pk=product.pk)
+        remove_stock(product, 4)
+        stale.selling_price = Decimal('12.00')
+        stale.save()
+        product.refresh_from_db()
+        self.assertEqual(product.stock_qty, 6)
+
+    def test_api_cannot_overwrite_stock(self):
+        product = make_product(stock_qty=5)
+        self.client.force_login(CustomAdmin.objects.create_user('staff@example.com', 'Staff', 'User', '0700000000'))
+        response = self.client.patch(
+            f'/api/inventory/products/{product.pk}/', {'stock_qty': 50}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['stock_qty'], response.json()['available_qty']), (5, 5))
+        product.refresh_from_db()
+        self.assertEqual(product.stock_qty, 5)
+
+
+class DeliveryTests(TestCase):
+    def setUp(self):
+        self.supplier = Supplier.objects.create(name='Supplier')
+        self.bolt = make_product(product_name='Bolt', stock_qty=2)
+        self.nut = make_product(product_name='Nut')
+        self.client.force_login(CustomAdmin.objects.create_user('staff@example.com', 'Staff', 'User', '0700000000'))
+
+    def post_delivery(self, lines):
+        return self.client.post(
+            '/api/inventory/stock-in/bulk/', {'supplier': self.supplier.pk, 'lines': lines},
+            content_type='application/json',
+        )
+
+    def test_repeated_product_is_one_increment(self):
+        lines = [
+            {'product': self.bolt, 'quantity_bought': 3, 'cost_price_per_unit': Decimal('1.00')},
+            {'product': self.nut, 'quantity_bought': 10, 'cost_price_per_unit': Decimal('0.10')},
+            {'product': self.bolt, 'quantity_bought': 5, 'cost_price_per_unit': Decimal('2.00')},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            logs = receive_delivery(self.supplier, lines)
+
+        self.assertEqual([log.total_cost for log in logs], [Decimal('3.00'), Decimal('1.00'), Decimal('10.00')])
+        stock_updates = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE "inventory_product"')]
+        self.assertEqual(len(stock_updates), 2)
+        self.bolt.refresh_from_db()
+        self.assertEqual(self.bolt.stock_qty, 10)
+        # (2 units at 0 + 13.00) / 10
+        self.assertEqual(self.bolt.average_cost, Decimal('1.3'))
+
+    def test_endpoint_receives_every_line(self):
+        response = self.post_delivery([
+            {'product': self.bolt.pk, 'quantity_bought': 4, 'cost_price_per_unit': '1.50'},
+            {'product': self.bolt.pk, 'quantity_bought': 1, 'cost_price_per_unit': '1.50'},
+        ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['lines_received'], 2)
+        self.assertEqual([row['line'] for row in response.json()['results']], [0, 1])
+        self.bolt.refresh_from_db()
+        self.assertEqual(self.bolt.stock_qty, 7)
+
+    def test_unknown_product_rejects_the_whole_delivery(self):
+        response = self.post_delivery([
+            {'product': self.bolt.pk, 'quantity_bought': 4, 'cost_price_per_unit': '1.50'},
+            {'product': 999999, 'quantity_bought': 1, 'cost_price_per_unit': '1.50'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['lines']
+        self.assertEqual(errors[0], {})
+        self.assertIn('999999', errors[1]['product'][0])
+        self.assertFalse(InventoryLog.objects.exists())
+        self.bolt.refresh_from_db()
+        self.assertEqual(self.bolt.stock_qty, 2)
+
+    def test_line_limit(self):
+        line = {'product': self.bolt.pk, 'quantity_bought': 1, 'cost_price_per_unit': '1.00'}
+        response = self.post_delivery([line] * (StockInBatchSerializer.MAX_LINES + 1))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('at most', response.json()['lines'][0])
+        self.assertEqual(self.post_delivery([line] * StockInBatchSerializer.MAX_LINES).status_code, 201)
+
+    def test_failed_line_rolls_back_the_delivery(self):
+        lines = [
+            {'product': self.bolt, 'quantity_bought': 3, 'cost_price_per_unit': Decimal('1.00')},
+            {'product': self.nut, 'quantity_bought': 10, 'cost_price_per_unit': Decimal('0.10')},
+        ]
+        original = services._increment
+
+        def increment(product_id, quantity, cost=None):
+            if product_id == self.nut.pk:
+                raise DatabaseError('disk full')
+            original(product_id, quantity, cost)
+
+        with mock.patch('inventory.services._increment', increment), self.assertRaises(DatabaseError):
+            receive_delivery(self.supplier, lines)
+
+        self.assertFalse(InventoryLog.objects.exists())
+        self.bolt.refresh_from_db()
+        self.assertEqual(self.bolt.stock_qty, 2)
+
+
+class ReorderTests(TestCase):
+    def test_steady_sales_converge_to_daily_rate(self):
+        product = make_product(stock_qty=5)
+        start = timezone.now() - timedelta(days=59)
+        for day in range(60):
+            record_units_sold({product.pk: 2}, start + timedelta(days=day))
+
+        velocity = product.sales_velocity
+        self.assertAlmostEqual(velocity.daily_rate, 2, delta=0.2)
+        # About 2/day over 7 lead + 3 safety days
+        self.assertIn(velocity.reorder_point, (19, 20, 21))
+        self.assertEqual(velocity.units_sold, 120)
+
+        staff = CustomAdmin.objects.create_user('staff@example.com', 'Staff', 'User', '0700000000')
+        self.client.force_login(staff)
+        response = self.client.get('/api/inventory/products/low-stock/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['product'] for row in response.json()], [product.pk])
+
+    def test_reserved_units_count_against_the_reorder_point(self):
+        product = make_product(stock_qty=30)
+        start = timezone.now() - timedelta(days=59)
+        for day in range(60):
+            record_units_sold({product.pk: 2}, start + timedelta(days=day))
+        reorder_point = product.sales_velocity.reorder_point
+        self.client.force_login(CustomAdmin.objects.create_user('staff@example.com', 'Staff', 'User', '0700000000'))
+        self.assertEqual(self.client.get('/api/inventory/products/low-stock/').json(), [])
+
+        # Open checkouts hold enough that what is left to sell is below the point
+        reserve_stock({product.pk: 30 - reorder_point + 5}, 'sale:1')
+        rows = self.client.get('/api/inventory/products/low-stock/').json()
+        self.assertEqual(len(rows), 1)
+        row = rows[0]
+        self.assertEqual((row['stock_qty'], row['available_qty']), (30, reorder_point - 5))
+        self.assertAlmostEqual(row['days_of_cover'], row['available_qty'] / row['daily_rate'], delta=0.1)
+        unreserved = suggestion(product.sales_velocity, 30, timezone.now())['suggested_order_qty']
+        self.assertEqual(row['suggested_order_qty'], unreserved + 30 - row['available_qty'])
+
+
+class ReservationTests(TestCase):
+    def test_reserved_units_are_not_for_sale(self):
+        product = make_product(stock_qty=5)
+        reserve_stock({product.pk: 4}, 'sale:1')
+        with self.assertRaises(InsufficientStock):
+            remove_stock(product, 2)
+        with self.assertRaises(InsufficientStock):
+            reserve_stock({product.pk: 2}, 'sale:2')
+        product.refresh_from_db()
+        self.assertEqual((product.stock_qty, product.available_qty), (5, 1))
+
+    def test_commit_converts_hold_into_deduction(self):
+        product = make_product(stock_qty=5)
+        reserve_stock({product.pk: 3}, 'sale:1')
+        commit_reservation('sale:1', {product.pk: 3})
+        product.refresh_from_db()
+        self.assertEqual((product.stock_qty, product.reserved_qty), (2, 0))
+        self.assertFalse(product.reservations.exists())
+
+    def test_sweeper_releases_only_expired_holds(self):
+        product = make_product(stock_qty=10)
+        reserve_stock({product.pk: 3}, 'sale:1', ttl=timedelta(minutes=-1))
+        reserve_stock({product.pk: 2}, 'sale:2')
+        self.assertEqual(release_expired_reservations(), 3)
+        product.refresh_from_db()
+        self.assertEqual(product.reserved_qty, 2)
+
+        # The late payment for the swept hold still deducts from what is available
+        commit_reservation('sale:1', {product.pk: 3})
+        product.refresh_from_db()
+        self.assertEqual((product.stock_qty, product.reserved_qty), (7, 2))
+
+
+class ScanLookupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        scan_cache.clear()
+        self.product = make_product(stock_qty=8, selling_price='2.50')
+        ProductCode.objects.create(product=self.product, code='5012345678900')
+        ProductCode.objects.create(product=self.product, code='ACME-W1', kind=ProductCode.SKU)
+
+    def test_warm_scan_skips_the_database_until_the_product_changes(self):
+        staff = CustomAdmin.objects.create_user('till@example.com', 'Till', 'One', '0700000000')
+        self.client.force_login(staff)
+        response = self.client.get('/api/inventory/products/scan/ACME-W1/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['selling_price'], '2.50')
+        self.assertEqual(self.client.get('/api/inventory/products/scan/nope/').status_code, 404)
+
+        self.assertEqual(lookup_code(' 5012345678900 ')['available_qty'], 8)
+        with self.assertNumQueries(0):
+            self.assertEqual(lookup_code('5012345678900')['id'], self.product.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            remove_stock(self.product, 3)
+        self.assertEqual(lookup_code('5012345678900')['available_qty'], 5)
+
+    def test_moving_a_code_invalidates_the_old_owner(self):
+        other = make_product(product_name='Gadget', stock_qty=1)
+        self.assertEqual(lookup_code('ACME-W1')['id'], self.product.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            code = ProductCode.objects.get(code='ACME-W1')
+            code.product = other
+            code.save()
+        self.assertEqual(lookup_code('ACME-W1')['id'], other.pk)
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        self.coke = make_product(brand_name='Coca-Cola', product_name='Coke 500ml', description='Soda')
+        self.crate = make_product(brand_name='Acme', product_name='Crate', description='Holds coke bottles')
+        self.widget = make_product()
+
+    def names(self, query):
+        return [p.product_name for p in search_products(Product.objects.all(), query).order_by('-search_rank', '-id')]
+
+    def test_terms_match_word_prefixes(self):
+        self.assertEqual(self.names('wid'), ['Widget'])
+        self.assertEqual(self.names('COCA col'), ['Coke 500ml'])
+        self.assertEqual(self.names('zzz'), [])
+        self.assertEqual(self.names('  !? '), [])
+
+    def test_name_and_brand_matches_rank_above_description(self):
+        self.assertEqual(self.names('coke'), ['Coke 500ml', 'Crate'])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.widget.product_name = 'Sprocket'
+        self.widget.description = 'A sprocket'
+        self.widget.save()
+        self.assertEqual(self.names('widget'), [])
+        self.assertEqual(self.names('sprock'), ['Sprocket'])
+
+        self.coke.delete()
+        self.assertEqual(self.names('coke'), ['Crate'])
+
+    def test_quick_search_endpoint(self):
+        self.client.force_login(CustomAdmin.objects.create_user('staff@example.com', 'Staff', 'User', '0700000000'))
+
+        response = self.client.get('/api/inventory/products/quick-search/', {'q': 'coke'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.json()['results']], [self.coke.pk, self.crate.pk])
+
+        # Older clients still send ?brand=
+        response = self.client.get('/api/inventory/products/quick-search/', {'brand': 'acme'})
+        self.assertEqual(response.json()['count'], 2)
+
+        # No query lists everything, paginated
+        response = self.client.get('/api/inventory/products/quick-search/', {'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 3)
+        self.assertEqual([row['id'] for row in response.json()['results']], [self.widget.pk, self.crate.pk])
+        self.assertIsNotNone(response.json()['next'])
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Tools', slug='tools')
+        self.product = make_product(stock_qty=5, category=self.category)
+
+    def get(self, url, **headers):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.get(url, headers=headers)
+
+    def test_repeat_reads_are_served_from_cache(self):
+        first = self.get('/api/inventory/products/')
+        with self.assertNumQueries(0):
+            second = self.get('/api/inventory/products/')
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_changes_bump_the_version(self):
+        url = f'/api/inventory/products/{self.product.pk}/'
+        etags = [self.get(url)['ETag']]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.selling_price = Decimal('11.00')
+            self.product.save()
+        response = self.get(url)
+        self.assertEqual(response.json()['selling_price'], '11.00')
+        etags.append(response['ETag'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            remove_stock(self.product, 2)
+        response = self.get(url)
+        self.assertEqual(response.json()['stock_qty'], 3)
+        etags.append(response['ETag'])
+
+        self.assertEqual(len(set(etags)), 3)
+
+        before = self.get('/api/inventory/categories/').json()
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.filter(pk=self.category.pk).get().delete()
+        self.assertNotEqual(self.get('/api/inventory/categories/').json(), before)
+
+    def test_if_none_match_returns_304(self):
+        etag = self.get('/api/inventory/products/')['ETag']
+
+        for header in (etag, f'"stale", {etag}', f'W/{etag}', '*'):
+            with self.subTest(header=header), self.assertNumQueries(0):
+                response = self.get('/api/inventory/products/', if_none_match=header)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+
+        # A tag that merely contains ours is not a match
+        response = self.get('/api/inventory/products/', if_none_match=f'"x{etag[1:]}')
+        self.assertEqual(response.status_code, 200)
+
+    def test_hosts_are_cached_apart(self):
+        self.get('/api/inventory/products/', host='shop.example.com')
+        with self.assertNumQueries(0):
+            self.get('/api/inventory/products/', host='shop.example.com')
+        with CaptureQueriesContext(connection) as queries:
+            self.get('/api/inventory/products/', host='admin.example.com')
+        self.assertTrue(queries.captured_queries)
+
+
+class StockValuationTests(TestCase):
+    def stored_snapshot(self):
+        return {
+            (row.scope, row.category_id): [row.total_units, row.retail_value, row.cost_value]
+            for row in StockValuation.objects.all()
+            if row.total_units or row.retail_value or row.cost_value
+        }
+
+    def assertSnapshotMatches(self):
+        computed = {key: total for key, total in compute_snapshot().items() if any(total)}
+        self.assertEqual(self.stored_snapshot(), computed)
+
+    @contextmanager
+    def step(self):
+        """Run a change as its own committed transaction, then compare."""
+        with self.captureOnCommitCallbacks(execute=True):
+            yield
+        self.assertSnapshotMatches()
+
+    def test_snapshot_stays_equal_to_a_full_recompute(self):
+        with self.step():
+            tools = Category.objects.create(name='Tools', slug='tools')
+            toys = Category.objects.create(name='Toys', slug='toys')
+            hammer = make_product(product_name='Hammer', category=tools, selling_price='12.50')
+            kite = make_product(product_name='Kite', category=toys, selling_price='7.00')
+            loose = make_product(product_name='Loose', selling_price='3.00')
+            supplier = Supplier.objects.create(name='Supplier')
+
+        # Three for 10.00 averages 3.3333, which does not divide evenly
+        for product, quantity, cost in ((hammer, 3, '3.34'), (hammer, 4, '7.00'), (kite, 10, '2.25'), (loose, 3, '1.10')):
+            with self.step():
+                InventoryLog.objects.create(
+                    product=product, supplier=supplier, quantity_bought=quantity, cost_price_per_unit=Decimal(cost),
+                )
+        self.assertEqual(StockValuation.objects.get(scope=StockValuation.OVERALL).total_units, 20)
+
+        with self.step():
+            create_pos_sale(
+                [{'product': hammer, 'quantity': 3, 'unit_price': Decimal('12.50')},
+                 {'product': kite, 'quantity': 1, 'unit_price': Decimal('7.00')}],
+                served_by='Till 1',
+            )
+
+        with self.step():
+            hammer.refresh_from_db()
+            hammer.selling_price = Decimal('14.00')
+            hammer.save()
+
+        with self.step():
+            kite.refresh_from_db()
+            kite.category = tools
+            kite.save()
+
+        with self.step():
+            tools.delete()
+        self.assertEqual(StockValuation.objects.get(scope=StockValuation.UNCATEGORISED).total_units, 16)
+
+        with self.step():
+            loose.delete()
+
+    def test_per_sale_costs_are_not_rounded(self):
+        with self.step():
+            product = make_product(stock_qty=0, selling_price='2.00')
+            # 200 units for 201.00 averages 1.0050
+            add_stock(product, 200, unit_cost=Decimal('1.005'))
+        for _ in range(3):
+            with self.step():
+                remove_stock(product, 1)
+        overall = StockValuation.objects.get(scope=StockValuation.OVERALL)
+        self.assertEqual(overall.cost_value, Decimal('197.985'))
+        self.assertEqual(to_cents(overall.cost_value), Decimal('197.99'))
+
+    def test_deltas_are_written_after_commit(self):
+        with self.step():
+            product = make_product(stock_qty=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                remove_stock(product, 2)
+            # Nothing in the sale's transaction touches the shared rows
+            self.assertFalse([q for q in queries.captured_queries if 'inventory_stockvaluation' in q['sql']])
+            self.assertEqual(StockValuation.objects.get(scope=StockValuation.OVERALL).total_units, 5)
+        self.assertEqual(StockValuation.objects.get(scope=StockValuation.OVERALL).total_units, 3)
+
+    def test_average_cost_keeps_fractions(self):
+        product = make_product(stock_qty=2)
+        add_stock(product, 8, unit_cost=Decimal('1.625'))
+        product.refresh_from_db()
+        # (2 units at 0 + 13.00) / 10
+        self.assertEqual(product.average_cost, Decimal('1.3'))
+
+
+def png(width, height, mode='RGB'):
+    buffer = BytesIO()
+    Image.new(mode, (width, height)).save(buffer, 'PNG')
+    return ContentFile(buffer.getvalue(), name='photo.png')
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_render_variants_never_upscales(self):
+        rendered = list(render_variants(Image.new('RGBA', (800, 400))))
+        self.assertEqual(
+            [(width, key) for width, key, _ in rendered],
+            [(w, key) for w in (160, 320, 640) for key in ('webp', 'jpeg')],
+        )
+        with Image.open(BytesIO(rendered[-1][2])) as image:
+            self.assertEqual((image.format, image.size, image.mode), ('JPEG', (640, 320), 'RGB'))
+
+        small = list(render_variants(Image.new('L', (100, 50))))
+        self.assertEqual([(width, key) for width, key, _ in small], [(100, 'webp'), (100, 'jpeg')])
+
+    def test_saving_an_image_queues_variants_and_replacing_it_removes_the_old_ones(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = make_product(image=png(400, 200))
+        self.assertEqual(Product.objects.get(pk=product.pk).image_variants, {})
+
+        drain()
+        product.refresh_from_db()
+        self.assertEqual(sorted(product.image_variants), ['160', '320'])
+        old_files = variant_files(product.image_variants)
+        storage = product.image.storage
+        self.assertTrue(all(storage.exists(name) for name in old_files))
+
+        product.image = png(200, 100)
+        product.save()
+        drain()
+        product.refresh_from_db()
+        self.assertEqual(sorted(product.image_variants), ['160'])
+        self.assertTrue(all(storage.exists(name) for name in variant_files(product.image_variants)))
+        self.assertFalse(any(storage.exists(name) for name in old_files))
+
+    def test_backfill_command_fills_missing_variants(self):
+        product = make_product(image=png(300, 300))
+        OutboxEvent.objects.all().delete()  # as if saved before variants existed
+        make_product(product_name='No image')
+
+        out = StringIO()
+        call_command('generate_image_variants', stdout=out)
+        self.assertIn('Generated variants for 1 product(s), 0 failed.', out.getvalue())
+        product.refresh_from_db()
+        self.assertEqual(sorted(product.image_variants), ['160'])
+
+        out = StringIO()
+        call_command('generate_image_variants', stdout=out)
+        self.assertIn('for 0 product(s)', out.getvalue())
+        call_command('generate_image_variants', '--force', f'--product={product.pk}', stdout=out)
+        self.assertIn('for 1 product(s)', out.getvalue())
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        now = timezone.now()
+        self.products = [make_product(product_name=f'P{n}', selling_price=f'{10 - n}.00') for n in range(5)]
+        # Two share a timestamp, so only the id can order them
+        for n, product in enumerate(self.products):
+            Product.objects.filter(pk=product.pk).update(created_at=now - timedelta(minutes=min(n, 3)))
+
+    def page(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def ids(self, page):
+        return [row['id'] for row in page['results']]
+
+    def test_next_and_previous_cross_page_boundaries(self):
+        pks = list(Product.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+        self.assertEqual(pks[3:], [self.products[4].pk, self.products[3].pk])
+        first = self.page('/api/inventory/products/', page_size=2)
+        self.assertEqual(self.ids(first), pks[:2])
+        self.assertIsNone(first['previous'])
+
+        second = self.page(first['next'])
+        self.assertEqual(self.ids(second), pks[2:4])
+        third = self.page(second['next'])
+        self.assertEqual(self.ids(third), pks[4:])
+        self.assertIsNone(third['next'])
+
+        back = self.page(third['previous'])
+        self.assertEqual(self.ids(back), pks[2:4])
+        self.assertEqual(self.ids(self.page(back['next'])), pks[4:])
+        start = self.page(back['previous'])
+        self.assertEqual(self.ids(start), pks[:2])
+        self.assertIsNone(start['previous'])
+
+    def test_ordering_filter_drives_the_keyset(self):
+        first = self.page('/api/inventory/products/', ordering='selling_price', page_size=3)
+        second = self.page(first['next'])
+        prices = [row['selling_price'] for row in first['results'] + second['results']]
+        self.assertEqual(prices, ['6.00', '7.00', '8.00', '9.00', '10.00'])
+
+        # A cursor only works with the ordering it was issued for
+        response = self.client.get(first['next'].replace('ordering=selling_price', 'ordering=-stock_qty'))
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_or_tampered_cursor_is_rejected(self):
+        next_url = self.page('/api/inventory/products/', page_size=2)['next']
+        token = next_url.split('cursor=')[1].split('&')[0]
+        forged = signing.dumps({'o': ['-created_at', '-id'], 'v': ['2000-01-01T00:00:00+00:00', 1], 'r': False})
+
+        for cursor in ('garbage', token[:-2] + 'xx', forged):
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/api/inventory/products/', {'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('cursor', response.json())
+
+    def test_fields_projection(self):
+        page = self.page('/api/inventory/products/', fields='id,product_name', page_size=2)
+        self.assertEqual([set(row) for row in page['results']], [{'id', 'product_name'}] * 2)
+        # The keyset columns still drive the cursor
+        self.assertEqual(self.ids(self.page(page['next'])), [self.products[2].pk, self.products[4].pk])
+
+        response = self.client.get('/api/inventory/products/', {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(TIME_ZONE='Africa/Nairobi')
+class InventoryLogFilterTests(TestCase):
+    def setUp(self):
+        self.client.force_login(CustomAdmin.objects.create_user('staff@example.com', 'Staff', 'User', '0700000000'))
+        self.acme = Supplier.objects.create(name='Acme Supplies')
+        self.other = Supplier.objects.create(name='Other')
+        self.bolt = make_product(product_name='Bolt')
+        self.nut = make_product(product_name='Nut')
+        nairobi = timezone.get_current_timezone()
+        self.logs = {}
+        for label, when, supplier, product in (
+            ('before', datetime(2024, 3, 9, 23, 59, 59), self.acme, self.bolt),
+            ('first', datetime(2024, 3, 10, 0, 0), self.acme, self.bolt),
+            ('middle', datetime(2024, 3, 11, 12, 0), self.other, self.nut),
+            ('last', datetime(2024, 3, 12, 23, 59, 59, 999999), self.acme, self.nut),
+            ('after', datetime(2024, 3, 13, 0, 0), self.acme, self.bolt),
+        ):
+            log = InventoryLog.objects.create(
+                product=product, supplier=supplier, quantity_bought=1, cost_price_per_unit=Decimal('1.00'),
+            )
+            InventoryLog.objects.filter(pk=log.pk).update(delivery_date=timezone.make_aware(when, nairobi))
+            self.logs[label] = log.pk
+
+    def labels(self, **params):
+        response = self.client.get('/api/inventory/stock-in/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        by_pk = {pk: label for label, pk in self.logs.items()}
+        return [by_pk[row['id']] for row in response.json()['results']]
+
+    def test_date_bounds_include_the_whole_day(self):
+        self.assertEqual(
+            self.labels(date_from='2024-03-10', date_to='2024-03-12'), ['last', 'middle', 'first'],
+        )
+        self.assertEqual(self.labels(date_from='2024-03-12'), ['after', 'last'])
+        self.assertEqual(self.labels(date_to='2024-03-09'), ['before'])
+        self.assertEqual(self.labels(date_from='2024-03-11', date_to='2024-03-11'), ['middle'])
+
+        response = self.client.get('/api/inventory/stock-in/', {'date_from': 'last tuesday'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_supplier_and_product_filters(self):
+        self.assertEqual(self.labels(supplier=self.other.pk), ['middle'])
+        self.assertEqual(self.labels(product=self.nut.pk), ['last', 'middle'])
+        self.assertEqual(self.labels(supplier=self.acme.pk, product=self.bolt.pk), ['after', 'first', 'before'])
+
+    def test_cursor_pages_keep_the_filters(self):
+        first = self.client.get('/api/inventory/stock-in/', {
+            'supplier': self.acme.pk, 'date_from': '2024-03-10', 'page_size': 2,
+        }).json()
+        self.assertEqual([row['id'] for row in first['results']], [self.logs['after'], self.logs['last']])
+
+        second = self.client.get(first['next']).json()
+        self.assertEqual([row['id'] for row in second['results']], [self.logs['first']])
+        self.assertIsNone(second['next'])
+        back = self.client.get(second['previous']).json()
+        self.assertEqual(back['results'], first['results'])
+
+
+class CatalogSyncTests(TestCase):
+    def test_delta_carries_only_changes_and_deletions(self):
+        kept = make_product(product_name='Kept', stock_qty=5, selling_price='1.50')
+        sold = make_product(product_name='Sold', stock_qty=5)
+        gone = make_product(product_name='Gone', stock_qty=5)
+        make_product(product_name='Hidden', is_active=False)
+        ProductCode.objects.create(product=kept, code='111')
+
+        snapshot = catalog_changes()
+        self.assertTrue(snapshot['full'])
+        self.assertEqual(snapshot['products']['id'], [kept.pk, sold.pk, gone.pk])
+        self.assertEqual(snapshot['products']['price_cents'][0], 150)
+        self.assertEqual(snapshot['products']['codes'][0], ['111'])
+
+        since = timezone.now()
+        remove_stock(sold, 2)
+        gone_pk = gone.pk
+        gone.delete()
+
+        staff = CustomAdmin.objects.create_user('till@example.com', 'Till', 'One', '0700000000')
+        self.client.force_login(staff)
+        response = self.client.get('/api/inventory/products/sync/', {'since': since.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        delta = response.json()
+        self.assertFalse(delta['full'])
+        self.assertEqual(delta['products']['id'], [sold.pk])
+        self.assertEqual(delta['products']['available_qty'], [3])
+        self.assertEqual(delta['deleted'], [gone_pk])
+        self.assertLess(len(response.content), 400)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class StockConcurrencyTests(TransactionTestCase):
+    """
+    Real threads racing on the same rows. Needs row locks, so it only
+    runs on databases that have them.
+    """
+    THREADS = 20
+
+    def hammer(self, target):
+        barrier = threading.Barrier(self.THREADS)
+        errors = []
+
+        def run():
+            try:
+                barrier.wait()
+                target()
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
+    def test_concurrent_sales_never_oversell(self):
+        product = make_product(stock_qty=50)
+
+        errors = self.hammer(lambda: remove_stock(product.pk, 3))
+
+        # 50 units cover 16 sales of 3; the remaining 4 must be rejected.
+        self.assertEqual(len(errors), 4)
+        self.assertTrue(all(isinstance(e, InsufficientStock) for e in errors))
+        product.refresh_from_db()
+        self.assertEqual(product.stock_qty, 2)
+
+    def test_concurrent_mutations_do_not_lose_updates(self):
+        product = make_product(stock_qty=100)
+
+        def mutate():
+            for _ in range(5):
+                add_stock(product.pk, 2)
+                remove_stock(product.pk, 1)
+
+        errors = self.hammer(mutate)
+
+        self.assertEqual(errors, [])
+        product.refresh_from_db()
+        self.assertEqual(product.stock_qty, 100 + self.THREADS * 5)
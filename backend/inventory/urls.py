@@ -9,7 +9,11 @@ from .views import (
     ProductDetailAPIView,
     ProductStockValuationAPIView,
     ProductQuickSearchAPIView,
+    ProductScanAPIView,
+    ProductCatalogSyncAPIView,
+    LowStockAPIView,
     InventoryLogListCreateAPIView,
+    InventoryLogBulkCreateAPIView,
     InventoryLogDetailAPIView,
 )
 
@@ -23,8 +27,12 @@ urlpatterns = [
     path('products/<int:pk>/', ProductDetailAPIView.as_view()),
     path('products/stock-valuation/', ProductStockValuationAPIView.as_view()),
     path('products/quick-search/', ProductQuickSearchAPIView.as_view()),
+    path('products/low-stock/', LowStockAPIView.as_view()),
+    path('products/scan/<str:code>/', ProductScanAPIView.as_view()),
+    path('products/sync/', ProductCatalogSyncAPIView.as_view()),
 
     # Inventory (Stock-In)
     path('stock-in/', InventoryLogListCreateAPIView.as_view()),
+    path('stock-in/bulk/', InventoryLogBulkCreateAPIView.as_view()),
     path('stock-in/<int:pk>/', InventoryLogDetailAPIView.as_view()),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,158 @@
+"""
+Incrementally maintained stock valuation.
+
+Every change to stock, price or category is turned into a delta of
+(units, retail value, cost value) and added to the StockValuation rows of
+the affected scopes, so reading the valuation never scans Product.
+
+Deltas are worked out inside the transaction that made the change but
+written once it commits (record_deltas), so sales and stock-ins never
+queue on the shared "all" row's lock. Totals are kept exactly, at
+average_cost's four places, and only rounded to cents for display; a
+full recompute therefore matches them to the last digit.
+"""
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import Category, Product, StockValuation
+
+CENT = Decimal('0.01')
+# Totals are exact at this precision (average_cost has four places)
+PLACES = Decimal('0.0001')
+
+
+def to_cents(value):
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def scope_for(category_id):
+    if category_id is None:
+        return StockValuation.UNCATEGORISED, None
+    return f"category:{category_id}", category_id
+
+
+def apply_deltas(rows):
+    """
+    Add `rows` of (category_id, units, retail_value, cost_value) to the
+    overall row and to each category's row, one UPDATE per scope. Most
+    callers want record_deltas().
+    """
+    totals = defaultdict(lambda: [0, Decimal('0'), Decimal('0')])
+    for category_id, units, retail, cost in rows:
+        for key in ((StockValuation.OVERALL, None), scope_for(category_id)):
+            total = totals[key]
+            total[0] += units
+            total[1] += retail
+            total[2] += cost
+
+    for (scope, category_id), (units, retail, cost) in sorted(totals.items(), key=lambda item: item[0][0]):
+        if not (units or retail or cost):
+            continue
+        values = {
+            'total_units': F('total_units') + units,
+            'retail_value': F('retail_value') + retail,
+            'cost_value': F('cost_value') + cost,
+        }
+        if not StockValuation.objects.filter(scope=scope).update(**values):
+            if category_id is not None and not Category.objects.filter(pk=category_id).exists():
+                # The category was deleted (taking its row with it) and its
+                # products' value moved to "uncategorised"; only the
+                # overall row still needs this delta
+                continue
+            StockValuation.objects.get_or_create(scope=scope, defaults={'category_id': category_id})
+            StockValuation.objects.filter(scope=scope).update(**values)
+
+
+def record_deltas(rows):
+    """
+    apply_deltas() once the current transaction commits. `rows` must be
+    worked out now, from the state this transaction sees.
+    """
+    rows = list(rows)
+    if rows:
+        transaction.on_commit(lambda: apply_deltas(rows))
+
+
+def apply_stock_deltas(deltas, costs):
+    """
+    `deltas` maps product pk to units added (positive) or removed
+    (negative). `costs` holds the change in stock_qty * average_cost for
+    stock-ins that moved the average; otherwise units are valued at the
+    product's average cost.
+    """
+    products = Product.objects.filter(pk__in=deltas).order_by().values_list(
+        'pk', 'category_id', 'selling_price', 'average_cost'
+    )
+    record_deltas(
+        (
+            category_id,
+            deltas[pk],
+            deltas[pk] * price,
+            costs[pk] if costs.get(pk) is not None else deltas[pk] * average_cost,
+        )
+        for pk, category_id, price, average_cost in products
+    )
+
+
+def product_contribution(values, sign=1):
+    """The (category, units, retail, cost) row a product contributes."""
+    stock = values['stock_qty']
+    return (
+        values['category_id'],
+        sign * stock,
+        sign * stock * values['selling_price'],
+        sign * stock * values['average_cost'],
+    )
+
+
+def current_values(product_id):
+    return Product.objects.filter(pk=product_id).values(
+        'category_id', 'selling_price', 'average_cost', 'stock_qty'
+    ).first()
+
+
+def compute_snapshot():
+    """Recompute every scope from scratch, straight from Product."""
+    rows = Product.objects.values('category_id').annotate(
+        units=Sum('stock_qty'),
+        retail=Sum(F('stock_qty') * F('selling_price')),
+        cost=Sum(F('stock_qty') * F('average_cost')),
+    )
+    snapshot = defaultdict(lambda: [0, Decimal('0'), Decimal('0')])
+    for row in rows:
+        for key in ((StockValuation.OVERALL, None), scope_for(row['category_id'])):
+            total = snapshot[key]
+            total[0] += row['units'] or 0
+            # Quantizing is lossless here; it only strips SQLite's float noise
+            total[1] += Decimal(row['retail'] or 0).quantize(PLACES)
+            total[2] += Decimal(row['cost'] or 0).quantize(PLACES)
+    return snapshot
+
+
+def rebuild_snapshot():
+    """
+    Replace the snapshot with freshly computed values. Existing rows are
+    locked first so deltas applied concurrently wait for the rebuild.
+    Returns the recomputed snapshot.
+    """
+    with transaction.atomic():
+        list(StockValuation.objects.select_for_update().values_list('pk'))
+        snapshot = compute_snapshot()
+        StockValuation.objects.exclude(
+            scope__in=[scope for scope, _ in snapshot]
+        ).delete()
+        valid_categories = set(Category.objects.values_list('pk', flat=True))
+        for (scope, category_id), (units, retail, cost) in snapshot.items():
+            StockValuation.objects.update_or_create(
+                scope=scope,
+                defaults={
+                    'category_id': category_id if category_id in valid_categories else None,
+                    'total_units': units,
+                    'retail_value': retail,
+                    'cost_value': cost,
+                },
+            )
+    return snapshot
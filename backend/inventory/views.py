@@ -1,17 +1,34 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, filters
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
 from django.shortcuts import get_object_or_404
-from django.db.models import Sum, F, DecimalField
+from django.db.models import F, FloatField, Value
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.settings import api_settings
 
-from .models import Category, Product, InventoryLog
+from .models import Category, Product, InventoryLog, StockValuation, ProductSalesVelocity
 from .serializers import (
     CategorySerializer,
     ProductSerializer,
     InventoryLogSerializer,
+    StockInBatchSerializer,
+    CatalogSyncQuerySerializer,
 )
+from .services import receive_delivery
+from .pagination import InventoryLogCursorPagination, KeysetPagination
+from .filters import InventoryLogFilter
+from .reorder import suggestion
+from .valuation import to_cents
+from .cache import cache_catalog_response
+from .search import FullTextSearchFilter, search_products
+from .scan import lookup_code
+from .catalog_sync import catalog_changes
+from .renderers import with_msgpack
+from .fast_serializers import inventory_log_rows, product_rows
 from rest_framework.permissions import AllowAny, IsAuthenticated
 
 class CategoryListCreateAPIView(APIView):
@@ -19,6 +36,7 @@ class CategoryListCreateAPIView(APIView):
         if self.request.method == "GET":
             return [AllowAny()]
         return [IsAuthenticated()]
+    @cache_catalog_response
     def get(self, request):
         categories = Category.objects.all()
         serializer = CategorySerializer(categories, many=True)
@@ -68,22 +86,46 @@ class ProductListCreateAPIView(APIView):
         return [IsAuthenticated()]
     filter_backends = [
         DjangoFilterBackend,
-        filters.SearchFilter,
+        FullTextSearchFilter,
         filters.OrderingFilter,
     ]
     filterset_fields = ['category', 'is_active', 'brand_name']
-    search_fields = ['brand_name', 'product_name']
+    search_fields = ['brand_name', 'product_name', 'description']
     ordering_fields = ['selling_price', 'created_at', 'stock_qty']
-
+    # The default ('-created_at', '-id') matches Product.Meta.ordering
+    pagination_class = KeysetPagination
+
+    def get_requested_fields(self, request):
+        """
+        Parses ?fields=id,product_name,selling_price into a list, or None
+        when the caller wants the full representation.
+        """
+        raw = request.query_params.get('fields')
+        if not raw:
+            return None
+        fields = [name.strip() for name in raw.split(',') if name.strip()]
+        unknown = set(fields) - set(ProductSerializer.Meta.fields)
+        if unknown:
+            raise ValidationError({'fields': f"Unknown fields: {', '.join(sorted(unknown))}"})
+        return fields
+
+    @cache_catalog_response
     def get(self, request):
+        fields = self.get_requested_fields(request)
         queryset = Product.objects.all()
 
         # Manually apply filters APIView does NOT auto-run them
         for backend in self.filter_backends:
             queryset = backend().filter_queryset(request, queryset, self)
 
-        serializer = ProductSerializer(queryset, many=True)
-        return Response(serializer.data)
+        # Rows are built from .values() with the category joined in SQL;
+        # see inventory/fast_serializers.py
+        paginator = self.pagination_class()
+        keyset = [f.lstrip('-') for f in paginator.get_ordering(request, queryset, self)]
+        rows = product_rows(fields, extra_columns=keyset)
+
+        page = paginator.paginate_queryset(rows.values(queryset), request, view=self)
+        return paginator.get_paginated_response(rows.render(page))
 
     def post(self, request):
         serializer = ProductSerializer(data=request.data)
@@ -97,6 +139,7 @@ class ProductDetailAPIView(APIView):
         if self.request.method == "GET":
             return [AllowAny()]
         return [IsAuthenticated()]
+    @cache_catalog_response
     def get(self, request, pk):
         product = get_object_or_404(Product, pk=pk)
         serializer = ProductSerializer(product)
@@ -123,46 +166,153 @@ class ProductDetailAPIView(APIView):
 
 
 class ProductStockValuationAPIView(APIView):
+    """
+    Reads the incrementally maintained StockValuation rows; nothing here
+    aggregates over Product. Run `manage.py rebuild_stock_valuation` to
+    recompute them from scratch.
+    """
     def get(self, request):
-        stats = Product.objects.aggregate(
-            total_stock_items=Sum('stock_qty'),
-            potential_revenue=Sum(
-                F('stock_qty') * F('selling_price'),
-                output_field=DecimalField()
-            )
-        )
+        overall = None
+        by_category = []
+        for row in StockValuation.objects.select_related('category').order_by('scope'):
+            if row.scope == StockValuation.OVERALL:
+                overall = row
+                continue
+            by_category.append({
+                "category": row.category_id,
+                "category_name": row.category.name if row.category else "Uncategorised",
+                "total_items": row.total_units,
+                "potential_revenue": to_cents(row.retail_value),
+                "cost_value": to_cents(row.cost_value),
+            })
 
         return Response({
-            "total_items_in_warehouse": stats['total_stock_items'] or 0,
-            "total_potential_revenue": stats['potential_revenue'] or 0.00,
+            "total_items_in_warehouse": overall.total_units if overall else 0,
+            "total_potential_revenue": to_cents(overall.retail_value) if overall else 0.00,
+            "total_cost_value": to_cents(overall.cost_value) if overall else 0.00,
+            "by_category": by_category,
             "message": "This represents the total retail value of your current inventory."
         })
 
 
-class ProductQuickSearchAPIView(APIView):
+class LowStockAPIView(APIView):
+    """
+    Active products whose sellable stock (on hand minus reserved by open
+    checkouts) is at or below their reorder point, least days of cover
+    first. Reads only the precomputed ProductSalesVelocity rows.
+    """
     def get(self, request):
-        brand = request.query_params.get('brand')
-        queryset = Product.objects.all()
+        now = timezone.now()
+        velocities = (
+            ProductSalesVelocity.objects
+            .annotate(available_qty=F('product__stock_qty') - F('product__reserved_qty'))
+            .filter(
+                reorder_point__gt=0,
+                product__is_active=True,
+                available_qty__lte=F('reorder_point'),
+            )
+            .select_related('product')
+            .only(
+                'daily_rate', 'rate_as_of', 'lead_time_days', 'safety_days', 'reorder_point',
+                'product__id', 'product__brand_name', 'product__product_name', 'product__stock_qty',
+                'product__reserved_qty',
+            )
+        )
+
+        results = []
+        for velocity in velocities:
+            product = velocity.product
+            results.append({
+                "product": product.pk,
+                "brand_name": product.brand_name,
+                "product_name": product.product_name,
+                "stock_qty": product.stock_qty,
+                "available_qty": velocity.available_qty,
+                **suggestion(velocity, velocity.available_qty, now),
+            })
+        results.sort(key=lambda row: (row['days_of_cover'] is None, row['days_of_cover'] or 0))
+        return Response(results)
+
+
+class ProductSearchPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
 
-        if brand:
-            queryset = queryset.filter(brand_name__icontains=brand)
 
+class ProductQuickSearchAPIView(APIView):
+    """
+    Ranked full-text search over product name, brand and description.
+    `?q=` is the query; `?brand=` is still accepted for older clients.
+    Without either, every product is listed, newest first.
+    """
+    def get(self, request):
+        query = request.query_params.get('q') or request.query_params.get('brand')
+        if query:
+            queryset = search_products(Product.objects.all(), query).order_by('-search_rank', '-id')
+        else:
+            queryset = Product.objects.annotate(
+                search_rank=Value(0.0, output_field=FloatField())
+            ).order_by('-id')
         data = queryset.values(
             'id',
             'brand_name',
             'product_name',
             'description',
             'selling_price',
+            'search_rank',
         )
 
-        return Response(data)
+        paginator = ProductSearchPagination()
+        page = paginator.paginate_queryset(data, request, view=self)
+        return paginator.get_paginated_response(page)
+
+
+class ProductScanAPIView(APIView):
+    """
+    Till lookup by barcode or SKU: the price and sellable stock of the
+    product carrying `code`. Served from the in-process scan cache.
+    """
+    def get(self, request, code):
+        record = lookup_code(code)
+        if record is None:
+            return Response({"error": "No product has this code."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(record)
+
+
+class ProductCatalogSyncAPIView(APIView):
+    """
+    Compact, columnar catalog for POS terminals. Pass the `watermark`
+    from the previous reply as `?since=` to get only what changed; send
+    `Accept: application/x-msgpack` for MessagePack instead of JSON.
+    """
+    renderer_classes = with_msgpack(api_settings.DEFAULT_RENDERER_CLASSES)
+
+    def get(self, request):
+        query = CatalogSyncQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return Response(catalog_changes(query.validated_data.get('since')))
 
 
 class InventoryLogListCreateAPIView(APIView):
+    """
+    Stock-in history, newest first. Filter with ?date_from=, ?date_to=,
+    ?supplier= and ?product=; pages are keyset-paginated on
+    (delivery_date, id) with product and supplier names joined in.
+    """
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = InventoryLogFilter
+    pagination_class = InventoryLogCursorPagination
+
     def get(self, request):
-        logs = InventoryLog.objects.all().order_by('-delivery_date')
-        serializer = InventoryLogSerializer(logs, many=True)
-        return Response(serializer.data)
+        queryset = InventoryLog.objects.all()
+        for backend in self.filter_backends:
+            queryset = backend().filter_queryset(request, queryset, self)
+
+        paginator = self.pagination_class()
+        rows = inventory_log_rows(extra_columns=['delivery_date', 'id'])
+        page = paginator.paginate_queryset(rows.values(queryset), request, view=self)
+        return paginator.get_paginated_response(rows.render(page))
 
     def post(self, request):
         serializer = InventoryLogSerializer(data=request.data)
@@ -171,6 +321,28 @@ class InventoryLogListCreateAPIView(APIView):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+class InventoryLogBulkCreateAPIView(APIView):
+    """
+    Receives a whole supplier delivery in one request.
+    """
+    def post(self, request):
+        serializer = StockInBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        logs = receive_delivery(
+            serializer.validated_data['supplier'],
+            serializer.validated_data['lines'],
+        )
+
+        results = InventoryLogSerializer(logs, many=True).data
+        return Response({
+            "supplier": serializer.validated_data['supplier'].pk,
+            "lines_received": len(logs),
+            "results": [
+                {"line": index, **row} for index, row in enumerate(results)
+            ],
+        }, status=status.HTTP_201_CREATED)
+
+
 class InventoryLogDetailAPIView(APIView):
     def get(self, request, pk):
         log = get_object_or_404(InventoryLog, pk=pk)
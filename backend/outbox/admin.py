@@ -0,0 +1,13 @@
+from django.contrib import admin
+from .models import OutboxEvent
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'topic', 'aggregate_type', 'aggregate_id', 'created_at', 'attempts', 'processed_at')
+    list_filter = ('topic', 'aggregate_type')
+    search_fields = ('aggregate_id',)
+    readonly_fields = (
+        'topic', 'aggregate_type', 'aggregate_id', 'payload', 'created_at',
+        'attempts', 'last_error', 'processed_at',
+    )
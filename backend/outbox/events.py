@@ -0,0 +1,47 @@
+from collections import defaultdict
+
+from .models import OutboxEvent
+
+_handlers = defaultdict(list)
+
+
+def publish(topic, aggregate_type, aggregate_id, payload=None):
+    """
+    Record an event for the relay. Call inside the transaction that makes
+    the change, so the event is committed or rolled back with it.
+    """
+    return OutboxEvent.objects.create(
+        topic=topic, aggregate_type=aggregate_type,
+        aggregate_id=str(aggregate_id), payload=payload or {},
+    )
+
+
+def publish_many(topic, aggregate_type, payloads):
+    """
+    publish() for a batch: `payloads` is a list of (aggregate_id, payload)
+    pairs, inserted with one bulk INSERT.
+    """
+    return OutboxEvent.objects.bulk_create([
+        OutboxEvent(
+            topic=topic, aggregate_type=aggregate_type,
+            aggregate_id=str(aggregate_id), payload=payload or {},
+        )
+        for aggregate_id, payload in payloads
+    ])
+
+
+def handler(topic):
+    """
+    Register a function to be called with each OutboxEvent for `topic`.
+
+    Delivery is at least once: a handler that talks to anything outside
+    the database must tolerate seeing the same event again.
+    """
+    def register(func):
+        _handlers[topic].append(func)
+        return func
+    return register
+
+
+def handlers_for(topic):
+    return _handlers.get(topic, ())
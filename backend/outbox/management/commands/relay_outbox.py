@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from outbox.relay import relay_batch
+
+
+class Command(BaseCommand):
+    help = "Deliver outbox events to their handlers. Runs until interrupted unless --once is given."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Events claimed per transaction (default 100).")
+        parser.add_argument('--poll', type=float, default=1.0, help="Seconds to sleep when nothing is due.")
+        parser.add_argument('--once', action='store_true', help="Relay one batch and exit.")
+
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        while True:
+            delivered, failed = relay_batch(batch_size)
+            if delivered or failed:
+                self.stdout.write(f"Delivered {delivered} event(s), {failed} failed.")
+            if options['once']:
+                return
+            if delivered + failed < batch_size:
+                time.sleep(options['poll'])
@@ -0,0 +1,40 @@
+from django.db import models
+from django.db.models import Q
+
+
+class OutboxEvent(models.Model):
+    """
+    A follow-up to a committed state change, e.g. "sale 12 completed".
+
+    Rows are written by outbox.events.publish() in the same transaction as
+    the change they describe, so an event exists if and only if the change
+    committed. The `relay_outbox` command delivers them to the registered
+    handlers (see outbox/relay.py).
+    """
+    topic = models.CharField(max_length=100)
+    # Events for one aggregate (e.g. one sale) are delivered in id order
+    aggregate_type = models.CharField(max_length=50)
+    aggregate_id = models.CharField(max_length=64)
+    payload = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            # The relay's claim query only ever looks at undelivered rows
+            models.Index(
+                fields=['available_at', 'id'], name='outbox_pending_idx',
+                condition=Q(processed_at__isnull=True),
+            ),
+            models.Index(
+                fields=['aggregate_type', 'aggregate_id', 'id'], name='outbox_aggregate_pending_idx',
+                condition=Q(processed_at__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} {self.aggregate_type}:{self.aggregate_id}"
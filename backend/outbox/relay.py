@@ -0,0 +1,90 @@
+"""
+Delivers OutboxEvent rows to their handlers.
+
+Each batch is claimed with SELECT ... FOR UPDATE SKIP LOCKED, so several
+`relay_outbox` processes can run side by side. Only the oldest
+undelivered event of each aggregate is claimable; a later event for the
+same sale waits until the one before it has been delivered, which keeps
+per-aggregate ordering even across relays and retries.
+
+Every event is handled in its own savepoint together with marking it
+processed, so the database work of a handler commits exactly once. A
+handler that raises rolls back, and the event is retried with
+exponential backoff, holding back later events of its aggregate.
+"""
+import logging
+import random
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .events import handlers_for
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_BASE = 2  # seconds; doubled after every failed attempt
+BACKOFF_MAX = 300
+
+
+def backoff(attempts):
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+def deliverable(now):
+    earlier = OutboxEvent.objects.filter(
+        aggregate_type=OuterRef('aggregate_type'),
+        aggregate_id=OuterRef('aggregate_id'),
+        processed_at__isnull=True,
+        id__lt=OuterRef('id'),
+    )
+    return (
+        OutboxEvent.objects
+        .filter(processed_at__isnull=True, available_at__lte=now)
+        .filter(~Exists(earlier))
+        .order_by('id')
+    )
+
+
+def deliver(event):
+    for func in handlers_for(event.topic):
+        func(event)
+
+
+def relay_batch(batch_size=100, now=None):
+    """
+    Deliver up to `batch_size` due events. Returns (delivered, failed).
+    """
+    now = now or timezone.now()
+    delivered = failed = 0
+    with transaction.atomic():
+        events = list(deliverable(now).select_for_update(skip_locked=True)[:batch_size])
+        for event in events:
+            try:
+                with transaction.atomic():
+                    deliver(event)
+                    OutboxEvent.objects.filter(pk=event.pk).update(
+                        processed_at=timezone.now(), attempts=event.attempts + 1, last_error='',
+                    )
+                delivered += 1
+            except Exception as exc:
+                logger.exception("Outbox event %s (%s) failed", event.pk, event.topic)
+                OutboxEvent.objects.filter(pk=event.pk).update(
+                    attempts=event.attempts + 1, last_error=repr(exc),
+                    available_at=timezone.now() + backoff(event.attempts + 1),
+                )
+                failed += 1
+    return delivered, failed
+
+
+def drain(batch_size=100):
+    """Relay batches until nothing is due. Returns the events delivered."""
+    total = 0
+    while True:
+        delivered, failed = relay_batch(batch_size)
+        total += delivered
+        if not delivered:
+            return total
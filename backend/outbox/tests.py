@@ -0,0 +1,50 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from . import events
+from .events import publish
+from .models import OutboxEvent
+from .relay import drain, relay_batch
+
+
+class OutboxRelayTests(TestCase):
+    def test_event_is_rolled_back_with_its_transaction(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                publish('sale.completed', 'sale', 1)
+                raise RuntimeError
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_failed_event_holds_back_its_aggregate_until_retried(self):
+        seen = []
+        broken = {'on': True}
+
+        def record(event):
+            if broken['on'] and event.payload['step'] == 1:
+                raise ValueError('downstream is down')
+            seen.append((event.aggregate_id, event.payload['step']))
+
+        with mock.patch.dict(events._handlers, {'test.step': [record]}):
+            publish('test.step', 'sale', 1, {'step': 1})
+            publish('test.step', 'sale', 1, {'step': 2})
+            publish('test.step', 'sale', 2, {'step': 2})
+
+            self.assertEqual(relay_batch(), (1, 1))
+            self.assertEqual(seen, [('2', 2)])
+            first = OutboxEvent.objects.get(aggregate_id='1', payload__step=1)
+            self.assertEqual(first.attempts, 1)
+            self.assertIn('downstream is down', first.last_error)
+
+            # Nothing is due until the backoff passes
+            self.assertEqual(relay_batch(), (0, 0))
+
+            broken['on'] = False
+            OutboxEvent.objects.update(available_at=timezone.now() - timedelta(seconds=1))
+            self.assertEqual(drain(), 2)
+
+        self.assertEqual(seen, [('2', 2), ('1', 1), ('1', 2)])
+        self.assertFalse(OutboxEvent.objects.filter(processed_at__isnull=True).exists())
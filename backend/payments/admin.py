@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Payment
+from .models import Payment, PaymentCallback, ReconciliationRun, StkPushJob
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
@@ -19,6 +19,7 @@ class PaymentAdmin(admin.ModelAdmin):
     # Allow searching by Stripe ID or the Client's email through the Sale relationship
     search_fields = (
         'stripe_payment_intent_id', 
+        'checkout_request_id',
         'sale__id', 
         'sale__client__email',
         'sale__transaction_id'
@@ -43,7 +44,7 @@ class PaymentAdmin(admin.ModelAdmin):
     def colored_status(self, obj):
         from django.utils.html import format_html
         colors = {
-            'succeeded': 'green',
+            'completed': 'green',
             'pending': 'orange',
             'failed': 'red',
         }
@@ -51,4 +52,21 @@ class PaymentAdmin(admin.ModelAdmin):
             '<span style="color: {}; font-weight: bold;">{}</span>',
             colors.get(obj.status, 'black'),
             obj.get_status_display()
-        )
\ No newline at end of file
+        )
+
+@admin.register(StkPushJob)
+class StkPushJobAdmin(admin.ModelAdmin):
+    list_display = ('payment', 'status', 'attempts', 'run_after', 'updated_at')
+    list_filter = ('status',)
+    readonly_fields = ('payment', 'attempts', 'locked_at', 'last_error', 'created_at', 'updated_at')
+
+@admin.register(PaymentCallback)
+class PaymentCallbackAdmin(admin.ModelAdmin):
+    list_display = ('key', 'payment', 'result_code', 'received_at')
+    search_fields = ('key',)
+    readonly_fields = ('key', 'payment', 'result_code', 'payload', 'received_at')
+
+@admin.register(ReconciliationRun)
+class ReconciliationRunAdmin(admin.ModelAdmin):
+    list_display = ('started_at', 'checked', 'completed', 'failed', 'still_pending', 'errors', 'finished_at')
+    readonly_fields = ('started_at', 'finished_at', 'checked', 'completed', 'failed', 'still_pending', 'errors')
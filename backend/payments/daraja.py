@@ -0,0 +1,194 @@
+"""
+Client for the Safaricom Daraja (M-Pesa) API.
+
+One DarajaClient is shared per process (see get_client()). It keeps a
+pooled keep-alive requests.Session, so consecutive calls reuse the same
+TLS connection, and applies explicit timeouts and bounded retries to
+every call. The OAuth token is valid for about an hour; it is kept in
+Django's cache, so all workers share one token and only refresh it
+shortly before it expires.
+"""
+import base64
+import threading
+from datetime import datetime
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from urllib3.util.retry import Retry
+
+TOKEN_CACHE_KEY = 'payments:daraja-token'
+# Refresh this many seconds before Daraja says the token expires
+TOKEN_REFRESH_MARGIN = 120
+# (connect, read) seconds
+DEFAULT_TIMEOUT = (3.05, 15)
+POOL_SIZE = 10
+
+
+class DarajaError(Exception):
+    """
+    Daraja could not be reached or rejected the request. `ambiguous` is
+    set when a POST may have reached Daraja but no answer came back (a
+    read timeout or a dropped connection), so sending it again could act
+    twice.
+    """
+
+    def __init__(self, message, status_code=None, payload=None, ambiguous=False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.payload = payload
+        self.ambiguous = ambiguous
+
+
+def never_sent(exc):
+    """True for request failures that happen before anything is sent."""
+    if isinstance(exc, requests.ConnectTimeout):
+        return True
+    reason = getattr(exc.args[0], 'reason', None) if exc.args else None
+    return isinstance(exc, requests.ConnectionError) and isinstance(reason, NewConnectionError)
+
+
+def build_session(pool_size=POOL_SIZE):
+    # Connection errors are retried for every method because nothing was
+    # sent yet. Read errors and 5xx responses are only retried for GET:
+    # repeating an STK push POST could prompt the customer twice.
+    retry = Retry(
+        total=3,
+        connect=3,
+        read=2,
+        status=2,
+        backoff_factor=0.3,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset({'GET'}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class DarajaClient:
+    def __init__(self, base_url=None, consumer_key=None, consumer_secret=None,
+                 shortcode=None, passkey=None, callback_url=None,
+                 timeout=DEFAULT_TIMEOUT, session=None):
+        self.base_url = (base_url or settings.DARAJA_BASE_URL).rstrip('/')
+        self.consumer_key = consumer_key or settings.DARAJA_CONSUMER_KEY
+        self.consumer_secret = consumer_secret or settings.DARAJA_CONSUMER_SECRET
+        self.shortcode = shortcode or settings.DARAJA_SHORTCODE
+        self.passkey = passkey if passkey is not None else settings.DARAJA_PASSKEY
+        self.callback_url = callback_url or (
+            f"{settings.HOOK_BASE_URL}/api/payments/daraja-webhook/{settings.DARAJA_WEBHOOK_TOKEN}/"
+        )
+        self.timeout = timeout
+        self.session = session or build_session()
+        self._token_lock = threading.Lock()
+
+    def _request(self, method, path, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        try:
+            return self.session.request(method, f"{self.base_url}{path}", **kwargs)
+        except requests.RequestException as exc:
+            raise DarajaError(
+                f"Daraja request failed: {exc}", ambiguous=method != 'GET' and not never_sent(exc),
+            ) from exc
+
+    def access_token(self, force_refresh=False):
+        """Return a valid OAuth token, fetching one only when the cached one is gone."""
+        if not force_refresh:
+            token = cache.get(TOKEN_CACHE_KEY)
+            if token:
+                return token
+
+        # Threads of this process wait for one fetch instead of all fetching
+        with self._token_lock:
+            if not force_refresh:
+                token = cache.get(TOKEN_CACHE_KEY)
+                if token:
+                    return token
+            response = self._request(
+                'GET', '/oauth/v1/generate',
+                params={'grant_type': 'client_credentials'},
+                auth=(self.consumer_key, self.consumer_secret),
+            )
+            if response.status_code != 200:
+                raise DarajaError('Failed to get Daraja access token', response.status_code, response.text)
+            data = response.json()
+            token = data['access_token']
+            expires_in = int(data.get('expires_in', 3599))
+            cache.set(TOKEN_CACHE_KEY, token, max(expires_in - TOKEN_REFRESH_MARGIN, 1))
+            return token
+
+    def password(self, timestamp):
+        raw = f"{self.shortcode}{self.passkey}{timestamp}"
+        return base64.b64encode(raw.encode()).decode('utf-8')
+
+    def _post(self, path, payload):
+        response = None
+        # A token revoked before its expiry gets one refresh and retry
+        for force_refresh in (False, True):
+            headers = {'Authorization': f"Bearer {self.access_token(force_refresh)}"}
+            response = self._request('POST', path, json=payload, headers=headers)
+            if response.status_code != 401:
+                break
+        if response.status_code != 200:
+            raise DarajaError(f"Daraja API error: {response.text}", response.status_code, response.text)
+        try:
+            return response.json()
+        except ValueError as exc:
+            # Daraja acted on the request, we just cannot read what it said
+            raise DarajaError(
+                f"Unreadable Daraja reply: {response.text[:200]}", payload=response.text, ambiguous=True,
+            ) from exc
+
+    def stk_push(self, phone_number, amount, account_reference, description):
+        """
+        Ask Daraja to prompt `phone_number` for `amount`. Returns Daraja's
+        JSON response, which holds the CheckoutRequestID and
+        MerchantRequestID.
+        """
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        return self._post('/mpesa/stkpush/v1/processrequest', {
+            "BusinessShortCode": self.shortcode,
+            "Password": self.password(timestamp),
+            "Timestamp": timestamp,
+            "TransactionType": "CustomerPayBillOnline",
+            "Amount": int(amount),
+            "PartyA": phone_number,
+            "PartyB": self.shortcode,
+            "PhoneNumber": phone_number,
+            "CallBackURL": self.callback_url,
+            "AccountReference": account_reference,
+            "TransactionDesc": description,
+        })
+
+    def stk_query(self, checkout_request_id):
+        """
+        Ask Daraja for the outcome of an earlier STK push. While the
+        customer has not answered yet Daraja replies with an error, which
+        surfaces here as DarajaError.
+        """
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        return self._post('/mpesa/stkpushquery/v1/query', {
+            "BusinessShortCode": self.shortcode,
+            "Password": self.password(timestamp),
+            "Timestamp": timestamp,
+            "CheckoutRequestID": checkout_request_id,
+        })
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide DarajaClient, created on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = DarajaClient()
+    return _client
@@ -0,0 +1,136 @@
+"""
+A minimal local stand-in for the Daraja API, for tests and offline
+development (`python manage.py daraja_stub`).
+
+It answers the OAuth, STK push and STK query endpoints with Daraja-shaped JSON and
+records every request it receives, so tests can assert how many round
+trips a code path made.
+"""
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+
+class DarajaStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _record(self, body=None):
+        path = urlsplit(self.path).path
+        with self.server.lock:
+            self.server.requests.append((self.command, path, body))
+        return path
+
+    def do_GET(self):
+        path = self._record()
+        if path == '/oauth/v1/generate':
+            self.server.tokens_issued += 1
+            return self._reply(200, {
+                'access_token': f"stub-token-{self.server.tokens_issued}",
+                'expires_in': str(self.server.token_ttl),
+            })
+        self._reply(404, {'errorMessage': 'Not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        path = self._record(body)
+
+        if not self.headers.get('Authorization', '').startswith('Bearer stub-token-'):
+            return self._reply(401, {'errorMessage': 'Invalid Access Token'})
+
+        handler = self.server.routes.get(path)
+        if handler is None:
+            return self._reply(404, {'errorMessage': 'Not found'})
+        status, reply = handler(self.server, body)
+        # Lets tests make a request land but its answer time out
+        time.sleep(self.server.delay)
+        try:
+            self._reply(status, reply)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up waiting
+
+
+def stk_push(server, body):
+    merchant_request_id = f"stub-merchant-{uuid.uuid4().hex[:12]}"
+    checkout_request_id = f"ws_CO_stub_{uuid.uuid4().hex[:16]}"
+    with server.lock:
+        server.pushes[checkout_request_id] = body
+    return 200, {
+        'MerchantRequestID': merchant_request_id,
+        'CheckoutRequestID': checkout_request_id,
+        'ResponseCode': '0',
+        'ResponseDescription': 'Success. Request accepted for processing',
+        'CustomerMessage': 'Success. Request accepted for processing',
+    }
+
+
+def stk_query(server, body):
+    checkout_request_id = body.get('CheckoutRequestID')
+    with server.lock:
+        known = checkout_request_id in server.pushes
+        result_code = server.results.get(checkout_request_id)
+    if not known and result_code is None:
+        return 400, {'errorCode': '400.002.02', 'errorMessage': 'Bad Request - Invalid CheckoutRequestID'}
+    if result_code is None:
+        # What Daraja says while the customer has not answered the prompt
+        return 500, {'errorCode': '500.001.1001', 'errorMessage': 'The transaction is being processed'}
+    return 200, {
+        'ResponseCode': '0',
+        'ResponseDescription': 'The service request has been accepted successsfully',
+        'MerchantRequestID': f"stub-merchant-{checkout_request_id}",
+        'CheckoutRequestID': checkout_request_id,
+        'ResultCode': str(result_code),
+        'ResultDesc': 'The service request is processed successfully.' if result_code == 0 else 'Request cancelled by user',
+    }
+
+
+class DarajaStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, token_ttl=3599, verbose=False):
+        super().__init__((host, port), DarajaStubHandler)
+        self.token_ttl = token_ttl
+        self.delay = 0
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.requests = []
+        self.pushes = {}
+        # CheckoutRequestID -> ResultCode reported by the STK query endpoint
+        self.results = {}
+        self.tokens_issued = 0
+        self.routes = {
+            '/mpesa/stkpush/v1/processrequest': stk_push,
+            '/mpesa/stkpushquery/v1/query': stk_query,
+        }
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve on a background thread; returns self for chaining."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def calls(self, path):
+        return [entry for entry in self.requests if entry[1] == path]
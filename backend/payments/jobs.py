@@ -0,0 +1,162 @@
+"""
+DB-backed queue for STK pushes.
+
+Checkout commits a Sale, a pending Payment and a StkPushJob in one
+transaction and returns straight away. The `process_stk_jobs` worker
+claims due jobs with SELECT ... FOR UPDATE SKIP LOCKED, so several
+workers can run side by side without taking the same job, and sends the
+pushes to Daraja. A push that never left (refused connection, connect
+timeout) or that Daraja turned away for now (5xx, 429) is retried with
+exponential backoff. A push that may have reached Daraja without an
+answer (read timeout, an unreadable reply, a worker that died mid-push
+and lost its lease) is never resent: it is parked as UNCERTAIN for
+`reconcile_payments`. Anything else fails the payment and cancels the
+sale.
+"""
+import logging
+import random
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from inventory.services import release_reservation
+from outbox.events import publish
+from sales.models import Sale
+from sales.services import reservation_reference
+from .daraja import DarajaError, get_client
+from .models import Payment, StkPushJob
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 2  # seconds; doubled after every failed attempt
+BACKOFF_MAX = 60
+# A job RUNNING for longer than this belongs to a worker that died. It
+# may have died after Daraja took the push, so it is never sent again.
+LEASE = timedelta(minutes=5)
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_stk_push(payment):
+    """Queue the STK push for `payment`. Call inside the checkout transaction."""
+    return StkPushJob.objects.create(payment=payment, run_after=timezone.now())
+
+
+def expire_leases(now=None):
+    """
+    Park RUNNING jobs whose worker's lease ran out as UNCERTAIN: the
+    worker may have died after the push reached Daraja, so resending it
+    could prompt (and charge) the customer twice. Reconciliation settles
+    them. Returns the number of jobs parked.
+    """
+    now = now or timezone.now()
+    return StkPushJob.objects.filter(status=StkPushJob.RUNNING, locked_at__lt=now - LEASE).update(
+        status=StkPushJob.UNCERTAIN, locked_at=None,
+        last_error="Worker lease expired; the push may have been sent",
+    )
+
+
+def claim_jobs(limit, now=None):
+    """Mark up to `limit` due jobs RUNNING for this worker and return them."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        expire_leases(now)
+        jobs = list(
+            StkPushJob.objects.select_for_update(skip_locked=True)
+            .filter(status=StkPushJob.QUEUED, run_after__lte=now)
+            .order_by('run_after')[:limit]
+        )
+        StkPushJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=StkPushJob.RUNNING, locked_at=now, attempts=F('attempts') + 1,
+        )
+    for job in jobs:
+        job.status = StkPushJob.RUNNING
+        job.locked_at = now
+        job.attempts += 1
+    return jobs
+
+
+def backoff(attempts):
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    # Jitter so retries from one burst do not all land together
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+def is_retryable(exc):
+    """Safe to send again: the push never left, or Daraja refused it for now."""
+    if exc.status_code is None:
+        return not exc.ambiguous
+    return exc.status_code >= 500 or exc.status_code == 429
+
+
+def fail_push(job_id, payment, error):
+    """Give up on a push: fail the payment, cancel the sale, free its stock."""
+    with transaction.atomic():
+        StkPushJob.objects.filter(pk=job_id).update(status=StkPushJob.FAILED, locked_at=None, last_error=error)
+        Payment.objects.filter(pk=payment.pk, status='pending').update(status='failed')
+        if Sale.objects.filter(pk=payment.sale_id, status='pending').update(status='cancelled'):
+            publish('sale.cancelled', 'sale', payment.sale_id, {'reason': 'stk_push_failed'})
+        release_reservation(reservation_reference(payment.sale_id))
+
+
+def park_uncertain(job_id, error):
+    StkPushJob.objects.filter(pk=job_id).update(
+        status=StkPushJob.UNCERTAIN, locked_at=None, last_error=error,
+    )
+    return StkPushJob.UNCERTAIN
+
+
+def process_job(job, client=None):
+    """
+    Send one claimed job's STK push and record the outcome.
+
+    An error other than DarajaError raised before Daraja is reached (bad
+    payment data, client set-up) fails the job, so it is not retried
+    forever. Once Daraja has taken the push the job is never failed:
+    trouble recording the reply parks it as UNCERTAIN instead, since the
+    customer's prompt is live.
+    """
+    payment = Payment.objects.get(pk=job.payment_id)
+    try:
+        reply = (client or get_client()).stk_push(
+            phone_number=payment.phone_number,
+            amount=payment.amount,
+            account_reference=f"SALE_{payment.sale_id}",
+            description=f"Payment for Sale #{payment.sale_id}",
+        )
+    except DarajaError as exc:
+        if exc.ambiguous:
+            # The customer may already have the prompt; sending it again
+            # could charge them twice. Reconciliation settles it.
+            return park_uncertain(job.pk, str(exc))
+        if is_retryable(exc) and job.attempts < MAX_ATTEMPTS:
+            StkPushJob.objects.filter(pk=job.pk).update(
+                status=StkPushJob.QUEUED, locked_at=None, last_error=str(exc),
+                run_after=timezone.now() + backoff(job.attempts),
+            )
+            return StkPushJob.QUEUED
+        fail_push(job.pk, payment, str(exc))
+        return StkPushJob.FAILED
+    except Exception as exc:
+        # Raised before anything was sent: DarajaClient turns every
+        # failure after the POST into a DarajaError
+        logger.exception("STK job %s crashed", job.pk)
+        fail_push(job.pk, payment, repr(exc))
+        return StkPushJob.FAILED
+
+    try:
+        checkout_request_id = reply.get('CheckoutRequestID')
+        if not checkout_request_id:
+            return park_uncertain(job.pk, f"Daraja accepted the push without a CheckoutRequestID: {reply}")
+        with transaction.atomic():
+            Payment.objects.filter(pk=payment.pk).update(
+                checkout_request_id=checkout_request_id,
+                merchant_request_id=reply.get('MerchantRequestID'),
+                transaction_id=checkout_request_id,
+            )
+            StkPushJob.objects.filter(pk=job.pk).update(status=StkPushJob.DONE, last_error='')
+    except Exception as exc:
+        logger.exception("STK job %s: could not record Daraja's reply", job.pk)
+        return park_uncertain(job.pk, repr(exc))
+    return StkPushJob.DONE
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from payments.daraja_stub import DarajaStubServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local Daraja stand-in. Point DARAJA_BASE_URL at it to exercise "
+        "checkout without the Safaricom sandbox."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8010)
+        parser.add_argument('--token-ttl', type=int, default=3599, help="Seconds issued tokens stay valid.")
+
+    def handle(self, *args, **options):
+        server = DarajaStubServer(options['host'], options['port'], options['token_ttl'], verbose=True)
+        self.stdout.write(self.style.SUCCESS(f"Daraja stub listening on {server.base_url}"))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,39 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from payments.jobs import claim_jobs, process_job
+
+
+class Command(BaseCommand):
+    help = "Send queued STK pushes to Daraja. Runs until interrupted unless --once is given."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help="Pushes in flight at once (default 4).")
+        parser.add_argument('--poll', type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Process the due jobs once and exit.")
+
+    def handle(self, *args, **options):
+        concurrency = max(options['concurrency'], 1)
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='stk') as pool:
+            while True:
+                jobs = claim_jobs(concurrency)
+                if jobs:
+                    outcomes = list(pool.map(self.run, jobs))
+                    self.stdout.write(", ".join(f"job {job.pk}: {outcome}" for job, outcome in zip(jobs, outcomes)))
+                if options['once']:
+                    return
+                if not jobs:
+                    time.sleep(options['poll'])
+
+    def run(self, job):
+        try:
+            return process_job(job)
+        except Exception as exc:
+            self.stderr.write(f"STK job {job.pk} crashed: {exc}")
+            return 'error'
+        finally:
+            # Pool threads each hold their own DB connection
+            connection.close()
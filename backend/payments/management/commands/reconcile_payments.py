@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from payments.reconcile import DEFAULT_BATCH_SIZE, DEFAULT_RATE, reconcile
+
+
+class Command(BaseCommand):
+    help = "Ask Daraja for the outcome of pending payments whose callback never arrived."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=10, help="Minutes a payment must be pending (default 10).")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help="Max STK queries per second.")
+        parser.add_argument('--limit', type=int, help="Stop after this many payments.")
+
+    def handle(self, *args, **options):
+        run = reconcile(
+            older_than=timedelta(minutes=options['older_than']),
+            batch_size=options['batch_size'],
+            rate=options['rate'],
+            limit=options['limit'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {run.checked} payment(s): {run.completed} completed, {run.failed} failed, "
+            f"{run.still_pending} still pending, {run.errors} error(s)."
+        ))
@@ -1,19 +1,108 @@
+import uuid
+
 from django.db import models
 from sales.models import Sale
 
 class Payment(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
-        ('succeeded', 'Succeeded'),
+        ('completed', 'Completed'),
         ('failed', 'Failed'),
     ]
 
     sale = models.OneToOneField(Sale, on_delete=models.CASCADE, related_name='payment')
-    stripe_payment_intent_id = models.CharField(max_length=255, unique=True)
+    # Public handle for the checkout status endpoint; sequential ids are guessable
+    reference = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    stripe_payment_intent_id = models.CharField(max_length=255, unique=True, blank=True, null=True)
     amount = models.DecimalField(max_digits=15, decimal_places=2)
     currency = models.CharField(max_length=10, default='usd')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # M-Pesa (Daraja STK push); filled in once the push has been accepted
+    phone_number = models.CharField(max_length=15, blank=True)
+    checkout_request_id = models.CharField(max_length=100, unique=True, blank=True, null=True)
+    merchant_request_id = models.CharField(max_length=100, blank=True, null=True)
+    transaction_id = models.CharField(max_length=100, blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # Reconciliation scans old pending payments
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Payment {self.checkout_request_id or self.stripe_payment_intent_id or self.reference} - {self.status}"
+
+
+class PaymentCallback(models.Model):
+    """
+    One processed Daraja callback. The unique key makes a replayed or
+    concurrent duplicate of the same callback a no-op.
+    """
+    key = models.CharField(max_length=100, unique=True)
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name='callbacks')
+    result_code = models.IntegerField()
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Callback {self.key} ({self.result_code})"
+
+
+class StkPushJob(models.Model):
+    """
+    A queued STK push for one Payment. Checkout only inserts this row; the
+    `process_stk_jobs` worker sends the push to Daraja (see payments/jobs.py).
+    UNCERTAIN means the push may have reached Daraja but no answer came
+    back; it is never resent and is left to reconciliation.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    UNCERTAIN = 'uncertain'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+        (UNCERTAIN, 'Needs reconciliation'),
+    ]
+
+    payment = models.OneToOneField(Payment, on_delete=models.CASCADE, related_name='stk_job')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField()
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # The worker's claim query: due jobs in run_after order
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def __str__(self):
+        return f"STK push for payment {self.payment_id} - {self.status}"
+
+
+class ReconciliationRun(models.Model):
+    """
+    Counters from one `reconcile_payments` run, kept as a metrics history.
+    """
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    checked = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    still_pending = models.PositiveIntegerField(default=0)
+    errors = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-started_at']
+
     def __str__(self):
-        return f"Payment {self.stripe_payment_intent_id} - {self.status}"
\ No newline at end of file
+        return f"Reconciliation {self.started_at:%Y-%m-%d %H:%M} - {self.completed + self.failed}/{self.checked} resolved"
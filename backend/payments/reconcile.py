@@ -0,0 +1,131 @@
+"""
+Resolve payments whose Daraja callback never arrived.
+
+Pending payments older than a threshold are read through the
+(status, created_at) index in keyset batches, their outcome is asked of
+Daraja's STK query endpoint at a bounded rate, and any final answer is
+applied through apply_stk_callback(), exactly as if the callback had
+come in. Each run's counters are stored as a ReconciliationRun.
+
+Pushes whose reply was lost (StkPushJob.UNCERTAIN) have no
+CheckoutRequestID to query. A callback for one is matched by
+apply_stk_callback; those still unmatched once the prompt has long
+expired are failed here.
+"""
+import logging
+import time
+from datetime import timedelta
+from itertools import chain, islice
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .daraja import DarajaError, get_client
+from .jobs import fail_push
+from .models import Payment, ReconciliationRun, StkPushJob
+from .services import PROCESSED, apply_stk_callback
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_AGE = timedelta(minutes=10)
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_RATE = 5  # STK queries per second
+
+
+def stale_payments(older_than, now=None):
+    now = now or timezone.now()
+    return (
+        Payment.objects
+        .filter(status='pending', created_at__lt=now - older_than)
+        .exclude(checkout_request_id=None)
+        .order_by('created_at', 'pk')
+    )
+
+
+def lost_pushes(older_than, now=None):
+    now = now or timezone.now()
+    return (
+        Payment.objects
+        .filter(
+            status='pending', checkout_request_id=None, stk_job__status=StkPushJob.UNCERTAIN,
+            created_at__lt=now - older_than,
+        )
+        .select_related('stk_job')
+        .order_by('created_at', 'pk')
+    )
+
+
+def batches(queryset, size):
+    """Yield lists of payments, seeking past the last (created_at, pk) seen."""
+    last = None
+    while True:
+        page = queryset
+        if last is not None:
+            page = page.filter(
+                Q(created_at__gt=last.created_at) | Q(created_at=last.created_at, pk__gt=last.pk)
+            )
+        rows = list(page.only('pk', 'created_at', 'checkout_request_id')[:size])
+        if not rows:
+            return
+        yield rows
+        last = rows[-1]
+
+
+def as_callback(reply):
+    """Shape an STK query reply like the stkCallback body the webhook gets."""
+    return {
+        'MerchantRequestID': reply.get('MerchantRequestID'),
+        'CheckoutRequestID': reply.get('CheckoutRequestID'),
+        'ResultCode': int(reply['ResultCode']),
+        'ResultDesc': reply.get('ResultDesc'),
+        'Source': 'stk-query',
+    }
+
+
+def reconcile(older_than=DEFAULT_AGE, batch_size=DEFAULT_BATCH_SIZE, rate=DEFAULT_RATE,
+              limit=None, client=None, sleep=time.sleep):
+    """Run one reconciliation pass and return its ReconciliationRun."""
+    client = client or get_client()
+    run = ReconciliationRun.objects.create()
+    interval = 1 / rate if rate else 0
+    next_call = time.monotonic()
+
+    for payment in lost_pushes(older_than)[:limit]:
+        run.checked += 1
+        run.failed += 1
+        fail_push(payment.stk_job.pk, payment, "No callback arrived for a push whose reply was lost")
+
+    payments = chain.from_iterable(batches(stale_payments(older_than), batch_size))
+    for payment in islice(payments, limit):
+        # Space the queries out so a backlog cannot trip Daraja's rate limits
+        wait = next_call - time.monotonic()
+        if wait > 0:
+            sleep(wait)
+        next_call = max(next_call, time.monotonic()) + interval
+
+        run.checked += 1
+        try:
+            reply = client.stk_query(payment.checkout_request_id)
+        except DarajaError as exc:
+            # Daraja answers with an error while the prompt is still open
+            if exc.status_code == 500:
+                run.still_pending += 1
+            else:
+                run.errors += 1
+                logger.warning("STK query for payment %s failed: %s", payment.pk, exc)
+            continue
+
+        if 'ResultCode' not in reply or apply_stk_callback(as_callback(reply)) != PROCESSED:
+            run.still_pending += 1
+        elif int(reply['ResultCode']) == 0:
+            run.completed += 1
+        else:
+            run.failed += 1
+
+    run.finished_at = timezone.now()
+    run.save()
+    logger.info(
+        "Reconciled %s payment(s): %s completed, %s failed, %s still pending, %s errors",
+        run.checked, run.completed, run.failed, run.still_pending, run.errors,
+    )
+    return run
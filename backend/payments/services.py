@@ -0,0 +1,125 @@
+import logging
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+
+from inventory.reorder import quantities_from_lines
+from inventory.services import InsufficientStock, commit_reservation, release_reservation
+from sales.models import Sale, SaleItem
+from sales.services import reservation_reference
+from outbox.events import publish
+from .models import Payment, PaymentCallback, StkPushJob
+
+logger = logging.getLogger(__name__)
+
+PROCESSED = 'processed'
+DUPLICATE = 'duplicate'
+UNKNOWN = 'unknown'
+
+
+def callback_metadata(stk_callback):
+    """Flatten Daraja's CallbackMetadata item list into a dict."""
+    items = (stk_callback.get('CallbackMetadata') or {}).get('Item') or []
+    return {item.get('Name'): item.get('Value') for item in items}
+
+
+def adopt_uncertain_push(stk_callback):
+    """
+    Find the payment for a callback whose push reply was lost in transit
+    (StkPushJob.UNCERTAIN, so no CheckoutRequestID was stored), matching
+    on phone number and amount, and record the CheckoutRequestID on it.
+    Only a single match is adopted. Returns the locked payment or None.
+    """
+    metadata = callback_metadata(stk_callback)
+    phone_number, amount = metadata.get('PhoneNumber'), metadata.get('Amount')
+    if phone_number is None or amount is None:
+        return None
+    candidates = list(
+        Payment.objects.select_for_update()
+        .filter(
+            status='pending', checkout_request_id=None, stk_job__status=StkPushJob.UNCERTAIN,
+            phone_number=str(phone_number), amount=Decimal(str(amount)),
+        )[:2]
+    )
+    if len(candidates) != 1:
+        return None
+    payment = candidates[0]
+    payment.checkout_request_id = stk_callback['CheckoutRequestID']
+    payment.merchant_request_id = stk_callback.get('MerchantRequestID')
+    payment.transaction_id = payment.checkout_request_id
+    payment.save(update_fields=['checkout_request_id', 'merchant_request_id', 'transaction_id'])
+    StkPushJob.objects.filter(payment=payment).update(status=StkPushJob.DONE, last_error='')
+    return payment
+
+
+def apply_stk_callback(stk_callback):
+    """
+    Apply one Daraja stkCallback body in a single transaction.
+
+    The payment row is locked first, so duplicate callbacks arriving
+    together queue behind each other; the PaymentCallback key then makes
+    every copy after the first a no-op. On success the stock reserved at
+    checkout is turned into a deduction for the whole cart at once
+    (commit_reservation); on failure the reservation is released. Either
+    way an outbox event is recorded for the follow-up work.
+    Returns PROCESSED, DUPLICATE or UNKNOWN.
+    """
+    checkout_request_id = stk_callback.get('CheckoutRequestID')
+    result_code = stk_callback.get('ResultCode')
+    if not checkout_request_id or result_code is None:
+        return UNKNOWN
+
+    with transaction.atomic():
+        payment = (
+            Payment.objects.select_for_update()
+            .filter(checkout_request_id=checkout_request_id).first()
+        )
+        if payment is None:
+            payment = adopt_uncertain_push(stk_callback)
+        if payment is None:
+            return UNKNOWN
+
+        try:
+            with transaction.atomic():
+                PaymentCallback.objects.create(
+                    key=checkout_request_id, payment=payment,
+                    result_code=int(result_code), payload=stk_callback,
+                )
+        except IntegrityError:
+            return DUPLICATE
+        if payment.status != 'pending':
+            return DUPLICATE
+
+        if int(result_code) != 0:
+            payment.status = 'failed'
+            payment.save(update_fields=['status'])
+            Sale.objects.filter(pk=payment.sale_id, status='pending').update(status='cancelled')
+            release_reservation(reservation_reference(payment.sale_id))
+            publish('sale.cancelled', 'sale', payment.sale_id, {'reason': 'payment_failed'})
+            return PROCESSED
+
+        payment.status = 'completed'
+        payment.transaction_id = callback_metadata(stk_callback).get('MpesaReceiptNumber') or payment.transaction_id
+        payment.save(update_fields=['status', 'transaction_id'])
+
+        quantities = quantities_from_lines(
+            SaleItem.objects.filter(sale_id=payment.sale_id).values_list('product_id', 'quantity')
+        )
+        try:
+            with transaction.atomic():
+                # Converts the checkout's hold; re-checks stock if it expired
+                commit_reservation(reservation_reference(payment.sale_id), quantities)
+                Sale.objects.filter(pk=payment.sale_id).update(status='completed')
+                publish('sale.completed', 'sale', payment.sale_id, {
+                    'channel': 'online',
+                    'quantities': {str(pk): units for pk, units in quantities.items()},
+                })
+        except InsufficientStock as exc:
+            # The customer has paid; keep the payment and leave the sale
+            # pending so staff can backorder or refund it.
+            logger.warning(
+                "Sale %s is paid but product %s has fewer than %s units left",
+                payment.sale_id, exc.product, exc.quantity,
+            )
+            return PROCESSED
+    return PROCESSED
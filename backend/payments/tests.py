@@ -1,3 +1,395 @@
-from django.test import TestCase
+import threading
+from unittest import mock
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.urls import reverse
+from django.utils import timezone
+
+from inventory.models import Product
+from sales.services import create_sale
+from staff.models import Client
+from .daraja import DarajaClient, DarajaError, TOKEN_CACHE_KEY
+from .daraja_stub import DarajaStubServer
+from .jobs import LEASE, claim_jobs, process_job
+from .models import Payment, PaymentCallback, StkPushJob
+from .reconcile import reconcile
+from .services import PROCESSED, apply_stk_callback
+
+
+class DarajaClientTests(SimpleTestCase):
+    def setUp(self):
+        cache.delete(TOKEN_CACHE_KEY)
+        self.stub = DarajaStubServer().start()
+        self.addCleanup(self.stub.stop)
+
+    def make_client(self, **kwargs):
+        return DarajaClient(
+            base_url=self.stub.base_url, consumer_key='key', consumer_secret='secret',
+            shortcode='174379', passkey='passkey', callback_url='http://testserver/hook/', **kwargs,
+        )
+
+    def push(self, client):
+        return client.stk_push('254700000000', 10, 'SALE_1', 'Payment for Sale #1')
+
+    def test_token_is_fetched_once_and_shared(self):
+        reply = self.push(self.make_client())
+        self.assertTrue(reply['CheckoutRequestID'])
+        # A second client (another worker) reuses the cached token
+        self.push(self.make_client())
+
+        self.assertEqual(len(self.stub.calls('/oauth/v1/generate')), 1)
+        self.assertEqual(len(self.stub.calls('/mpesa/stkpush/v1/processrequest')), 2)
+
+    def test_revoked_token_is_refreshed_once(self):
+        cache.set(TOKEN_CACHE_KEY, 'revoked')
+        self.push(self.make_client())
+        self.assertEqual(len(self.stub.calls('/oauth/v1/generate')), 1)
+        self.assertEqual(cache.get(TOKEN_CACHE_KEY), 'stub-token-1')
+
+    def test_unreachable_api_raises_daraja_error(self):
+        client = self.make_client(timeout=(0.2, 0.2))
+        self.stub.stop()
+        with self.assertRaises(DarajaError) as raised:
+            self.push(client)
+        # Nothing left the machine, so sending again is safe
+        self.assertFalse(raised.exception.ambiguous)
+
+    def test_lost_reply_is_ambiguous(self):
+        client = self.make_client(timeout=(1, 0.2))
+        client.access_token()
+        self.stub.delay = 0.5
+        with self.assertRaises(DarajaError) as raised:
+            self.push(client)
+        self.assertTrue(raised.exception.ambiguous)
+        self.assertEqual(len(self.stub.pushes), 1)
+
+
+class StkPushQueueTests(TestCase):
+    def setUp(self):
+        cache.delete(TOKEN_CACHE_KEY)
+        self.stub = DarajaStubServer().start()
+        self.addCleanup(self.stub.stop)
+        self.daraja = DarajaClient(
+            base_url=self.stub.base_url, consumer_key='key', consumer_secret='secret',
+            shortcode='174379', passkey='passkey', callback_url='http://testserver/hook/',
+        )
+        Client.objects.create(pk=1, first_name='Walk', last_name='In')
+        self.product = Product.objects.create(
+            brand_name='Acme', product_name='Widget', description='A widget',
+            selling_price=Decimal('250.00'), stock_qty=10,
+        )
+
+    def checkout(self, **line):
+        return self.client.post('/api/payments/create-payment/', {
+            'shipping_address': 'Nairobi',
+            'phone_number': '254700000000',
+            'items': [{'product': self.product.pk, 'quantity': 2, **line}],
+        }, content_type='application/json')
+
+    def test_checkout_queues_push_without_calling_daraja(self):
+        response = self.checkout()
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.stub.requests, [])
+        payment = Payment.objects.get(reference=response.json()['payment_reference'])
+        self.assertEqual(payment.amount, Decimal('500.00'))
+        self.assertEqual(payment.stk_job.status, StkPushJob.QUEUED)
+
+        status_response = self.client.get(response.json()['status_url'])
+        self.assertEqual(status_response.json()['dispatch'], StkPushJob.QUEUED)
+        self.assertEqual(status_response['Retry-After'], '2')
+
+    def test_checkout_charges_the_catalogue_price(self):
+        response = self.checkout(price_at_sale='0.01')
+
+        self.assertEqual(response.status_code, 202)
+        payment = Payment.objects.get(reference=response.json()['payment_reference'])
+        self.assertEqual(payment.amount, Decimal('500.00'))
+        self.assertEqual(payment.sale.items.get().price_at_sale, Decimal('250.00'))
+
+    def test_worker_sends_push_and_records_checkout_id(self):
+        self.checkout()
+        jobs = claim_jobs(4)
+        self.assertEqual(len(jobs), 1)
+        # A second worker finds nothing to claim
+        self.assertEqual(claim_jobs(4), [])
+
+        self.assertEqual(process_job(jobs[0], self.daraja), StkPushJob.DONE)
+        payment = Payment.objects.get()
+        self.assertIn(payment.checkout_request_id, self.stub.pushes)
+        self.assertEqual(self.stub.pushes[payment.checkout_request_id]['Amount'], 500)
+
+    def test_unreachable_daraja_is_retried_with_backoff(self):
+        self.checkout()
+        self.stub.stop()
+        job = claim_jobs(1)[0]
+        self.daraja.timeout = (0.2, 0.2)
+
+        self.assertEqual(process_job(job, self.daraja), StkPushJob.QUEUED)
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertEqual(job.payment.status, 'pending')
+
+    def lose_reply(self):
+        """Process the queued push with Daraja taking it but the reply timing out."""
+        self.checkout()
+        self.daraja.access_token()
+        self.daraja.timeout = (1, 0.2)
+        self.stub.delay = 0.5
+        job = claim_jobs(1)[0]
+        self.assertEqual(process_job(job, self.daraja), StkPushJob.UNCERTAIN)
+        self.stub.delay = 0
+        return Payment.objects.get()
+
+    def test_lost_reply_is_parked_not_resent(self):
+        payment = self.lose_reply()
+
+        self.assertEqual(len(self.stub.pushes), 1)
+        self.assertEqual(payment.stk_job.status, StkPushJob.UNCERTAIN)
+        self.assertEqual((payment.status, payment.checkout_request_id), ('pending', None))
+        self.assertEqual(claim_jobs(4), [])
+
+    def test_callback_for_lost_reply_settles_the_payment(self):
+        payment = self.lose_reply()
+        checkout_request_id = next(iter(self.stub.pushes))
+        callback = stk_callback(checkout_request_id)['Body']['stkCallback']
+        callback['CallbackMetadata']['Item'].append({'Name': 'PhoneNumber', 'Value': 254700000000})
+
+        self.assertEqual(apply_stk_callback(callback), PROCESSED)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'completed')
+        self.assertEqual(payment.checkout_request_id, checkout_request_id)
+        self.assertEqual(payment.stk_job.status, StkPushJob.DONE)
+
+    def test_unmatched_lost_reply_is_failed_by_reconciliation(self):
+        payment = self.lose_reply()
+
+        run = reconcile(older_than=timedelta(0), rate=0, client=self.daraja)
+        self.assertEqual((run.checked, run.failed), (1, 1))
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'failed')
+        self.assertEqual(payment.sale.status, 'cancelled')
+        self.assertEqual(payment.stk_job.status, StkPushJob.FAILED)
+
+    def test_expired_lease_is_parked_not_resent(self):
+        self.checkout()
+        job = claim_jobs(1)[0]
+        # The worker's push reaches Daraja, then the worker dies
+        self.daraja.stk_push('254700000000', 500, f'SALE_{job.payment.sale_id}', 'test')
+
+        self.assertEqual(claim_jobs(4, now=timezone.now() + LEASE + timedelta(seconds=1)), [])
+        self.assertEqual(len(self.stub.pushes), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_at), (StkPushJob.UNCERTAIN, None))
+        self.assertEqual(job.payment.status, 'pending')
+
+    def test_push_accepted_but_not_recorded_is_never_failed(self):
+        self.checkout()
+        job = claim_jobs(1)[0]
+
+        with mock.patch.object(Payment.objects, 'filter', side_effect=DatabaseError('connection lost')), \
+                self.assertLogs('payments.jobs', 'ERROR'):
+            self.assertEqual(process_job(job, self.daraja), StkPushJob.UNCERTAIN)
+        job.refresh_from_db()
+        self.assertEqual(job.status, StkPushJob.UNCERTAIN)
+        self.assertEqual((job.payment.status, job.payment.sale.status), ('pending', 'pending'))
+
+        class NoCheckoutIdClient:
+            def stk_push(self, **kwargs):
+                return {'ResponseCode': '0'}
+
+        self.checkout()
+        job = claim_jobs(1)[0]
+        self.assertEqual(process_job(job, NoCheckoutIdClient()), StkPushJob.UNCERTAIN)
+
+    def test_unexpected_error_fails_the_job(self):
+        self.checkout()
+        job = claim_jobs(1)[0]
+
+        class BrokenClient:
+            def stk_push(self, **kwargs):
+                raise ValueError('bad phone number')
+
+        with self.assertLogs('payments.jobs', 'ERROR'):
+            self.assertEqual(process_job(job, BrokenClient()), StkPushJob.FAILED)
+        job.refresh_from_db()
+        self.assertEqual(job.status, StkPushJob.FAILED)
+        self.assertIn('bad phone number', job.last_error)
+        self.assertEqual(job.payment.sale.status, 'cancelled')
+
+
+def stk_callback(checkout_request_id, result_code=0, receipt='QKL1234567'):
+    return {'Body': {'stkCallback': {
+        'MerchantRequestID': 'stub-merchant',
+        'CheckoutRequestID': checkout_request_id,
+        'ResultCode': result_code,
+        'ResultDesc': 'The service request is processed successfully.',
+        'CallbackMetadata': {'Item': [
+            {'Name': 'Amount', 'Value': 500},
+            {'Name': 'MpesaReceiptNumber', 'Value': receipt},
+        ]},
+    }}}
+
+
+class WebhookFixtures:
+    """Three products and four paid-for sales, each with a pushed payment."""
+
+    def setUp(self):
+        client = Client.objects.create(first_name='Walk', last_name='In')
+        self.products = [
+            Product.objects.create(
+                brand_name='Acme', product_name=f'Widget {n}', description='A widget',
+                selling_price=Decimal('100.00'), stock_qty=50,
+            )
+            for n in range(3)
+        ]
+        self.payments = []
+        for n in range(4):
+            sale = create_sale(
+                [{'product': product, 'quantity': 2} for product in self.products],
+                client=client, shipping_address='Nairobi',
+            )
+            self.payments.append(Payment.objects.create(
+                sale=sale, amount=sale.total_amount, currency='KES',
+                phone_number='254700000000', checkout_request_id=f'ws_CO_{n}',
+            ))
+
+    def post_callback(self, body, client=None, token=None):
+        url = reverse('daraja-webhook', args=[token or settings.DARAJA_WEBHOOK_TOKEN])
+        return (client or self.client).post(url, body, content_type='application/json')
+
+
+class DarajaWebhookTests(WebhookFixtures, TestCase):
+    def test_failed_callback_cancels_sale_without_touching_stock(self):
+        self.post_callback(stk_callback('ws_CO_0', result_code=1032))
+        payment = Payment.objects.select_related('sale').get(pk=self.payments[0].pk)
+        self.assertEqual((payment.status, payment.sale.status), ('failed', 'cancelled'))
+        self.assertEqual(Product.objects.filter(stock_qty=50).count(), 3)
+
+    def test_callback_without_the_secret_token_is_rejected(self):
+        response = self.post_callback(stk_callback('ws_CO_0'), token='guessed')
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(PaymentCallback.objects.exists())
+        self.assertEqual(Payment.objects.get(pk=self.payments[0].pk).status, 'pending')
+
+    @override_settings(DARAJA_WEBHOOK_TOKEN='')
+    def test_every_callback_is_rejected_without_a_configured_token(self):
+        with self.assertLogs('payments.views', 'ERROR'):
+            response = self.post_callback(stk_callback('ws_CO_0'), token='anything')
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(PaymentCallback.objects.exists())
+
+    def test_callback_url_carries_the_token(self):
+        self.assertTrue(DarajaClient().callback_url.endswith(
+            reverse('daraja-webhook', args=[settings.DARAJA_WEBHOOK_TOKEN])
+        ))
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class DarajaWebhookLoadTests(WebhookFixtures, TransactionTestCase):
+    """
+    Replays duplicate and concurrent callbacks against the webhook. Needs
+    row locks, so it only runs on databases that have them.
+    """
+    THREADS = 8
+
+    def post_concurrently(self, bodies):
+        barrier = threading.Barrier(len(bodies))
+        responses, errors = [], []
+
+        def run(body):
+            try:
+                barrier.wait()
+                responses.append(self.post_callback(body, client=self.client_class()).status_code)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(body,)) for body in bodies]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            # A failure in a worker thread would otherwise only show up as
+            # a missing response
+            raise errors[0]
+        return responses
+
+    def test_duplicate_and_concurrent_callbacks_deduct_once(self):
+        # Every payment's callback delivered twice, all at the same time
+        bodies = [stk_callback(p.checkout_request_id) for p in self.payments] * 2
+        responses = self.post_concurrently(bodies)
+
+        self.assertEqual(responses, [200] * len(bodies))
+        self.assertEqual(PaymentCallback.objects.count(), len(self.payments))
+        for product in self.products:
+            product.refresh_from_db()
+            self.assertEqual(product.stock_qty, 50 - 2 * len(self.payments))
+        for payment in Payment.objects.select_related('sale'):
+            self.assertEqual(payment.status, 'completed')
+            self.assertEqual(payment.transaction_id, 'QKL1234567')
+            self.assertEqual(payment.sale.status, 'completed')
+
+        # A late replay changes nothing
+        self.post_callback(stk_callback('ws_CO_0'))
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].stock_qty, 50 - 2 * len(self.payments))
+
+
+class ReconciliationTests(TestCase):
+    def setUp(self):
+        cache.delete(TOKEN_CACHE_KEY)
+        self.stub = DarajaStubServer().start()
+        self.addCleanup(self.stub.stop)
+        self.daraja = DarajaClient(
+            base_url=self.stub.base_url, consumer_key='key', consumer_secret='secret',
+            shortcode='174379', passkey='passkey', callback_url='http://testserver/hook/',
+        )
+        client = Client.objects.create(first_name='Walk', last_name='In')
+        self.product = Product.objects.create(
+            brand_name='Acme', product_name='Widget', description='A widget',
+            selling_price=Decimal('100.00'), stock_qty=10,
+        )
+        self.payments = {}
+        for name in ('paid', 'cancelled', 'open', 'fresh'):
+            sale = create_sale([{'product': self.product, 'quantity': 1}], client=client, shipping_address='Nairobi')
+            checkout_request_id = self.daraja.stk_push('254700000000', 100, f'SALE_{sale.pk}', 'test')['CheckoutRequestID']
+            self.payments[name] = Payment.objects.create(
+                sale=sale, amount=sale.total_amount, currency='KES', checkout_request_id=checkout_request_id,
+            )
+        self.stub.results[self.payments['paid'].checkout_request_id] = 0
+        self.stub.results[self.payments['cancelled'].checkout_request_id] = 1032
+        self.stub.results[self.payments['fresh'].checkout_request_id] = 0
+        Payment.objects.exclude(pk=self.payments['fresh'].pk).update(created_at=timezone.now() - timedelta(hours=1))
+
+    def test_stale_payments_are_resolved_through_the_webhook_path(self):
+        run = reconcile(batch_size=2, rate=0, client=self.daraja)
+
+        self.assertEqual(
+            (run.checked, run.completed, run.failed, run.still_pending, run.errors), (3, 1, 1, 1, 0)
+        )
+        statuses = dict(Payment.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[self.payments['paid'].pk], 'completed')
+        self.assertEqual(statuses[self.payments['cancelled'].pk], 'failed')
+        self.assertEqual(statuses[self.payments['open'].pk], 'pending')
+        # Younger than the threshold, so not queried yet
+        self.assertEqual(statuses[self.payments['fresh'].pk], 'pending')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_qty, 9)
+
+    def test_queries_are_rate_limited(self):
+        pauses = []
+        reconcile(rate=2, client=self.daraja, sleep=pauses.append)
+        # Three queries at 2/s: the first goes at once, the next two wait
+        self.assertEqual(len(pauses), 2)
+        self.assertLessEqual(max(pauses), 1.0)
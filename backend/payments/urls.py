@@ -1,10 +1,13 @@
 from django.urls import path
-from .views import CreatePaymentView, DarajaWebhookView
+from .views import CreatePaymentView, DarajaWebhookView, PaymentStatusView
 
 urlpatterns = [
     # Initiate an MPESA payment
     path('create-payment/', CreatePaymentView.as_view(), name='create-payment'),
 
-    # Daraja STK Push webhook callback
-    path('daraja-webhook/', DarajaWebhookView.as_view(), name='daraja-webhook'),
+    # Poll the outcome of a queued payment
+    path('<uuid:reference>/status/', PaymentStatusView.as_view(), name='payment-status'),
+
+    # Daraja STK Push webhook callback, behind the secret in the CallBackURL
+    path('daraja-webhook/<str:token>/', DarajaWebhookView.as_view(), name='daraja-webhook'),
 ]
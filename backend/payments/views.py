@@ -1,12 +1,23 @@
-import requests
-from django.conf import settings
+import hmac
+import logging
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny
+from django.conf import settings
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from .jobs import enqueue_stk_push
 from .models import Payment
-from sales.models import Sale, SaleItem
-from inventory.models import Product
+from .services import apply_stk_callback
+from sales.serializers import SaleLineSerializer
+from sales.services import create_sale, reservation_reference
+from inventory.reorder import quantities_from_lines
+from inventory.services import InsufficientStock, reserve_stock
+
+logger = logging.getLogger(__name__)
 
 class CreatePaymentView(APIView):
     permission_classes=[AllowAny]
@@ -29,136 +40,93 @@ class CreatePaymentView(APIView):
                 return Response({'error': 'phone_number is required'}, 
                               status=status.HTTP_400_BAD_REQUEST)
             
-            # Create sale with default client (ID 1)
-            sale = Sale.objects.create(
-                client_id=1,  # Default client
-                shipping_address=shipping_address,
-                status='pending',
-                total_amount=0
-            )
-            
-            # Create sale items and calculate total
-            total_amount = 0
-            for item in items_data:
-                sale_item = SaleItem.objects.create(
-                    sale=sale,
-                    product_id=item.get('product'),
-                    quantity=item.get('quantity'),
-                    price_at_sale=item.get('price_at_sale')
-                )
-                total_amount += sale_item.line_total
-            
-            # Update sale total
-            sale.total_amount = total_amount
-            sale.save()
-
-            # --- Daraja API integration (your existing code) ---
-            # Get Daraja access token
-            auth_response = requests.get(
-                f"{settings.DARAJA_BASE_URL}/oauth/v1/generate?grant_type=client_credentials",
-                auth=(settings.DARAJA_CONSUMER_KEY, settings.DARAJA_CONSUMER_SECRET)
-            )
-            if auth_response.status_code != 200:
-                return Response({'error': 'Failed to get Daraja access token'}, status=500)
-
-            access_token = auth_response.json().get('access_token')
-
-            # Generate password and timestamp
-            import base64, datetime
-            timestamp = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
-            raw_password = f"{settings.DARAJA_SHORTCODE}{settings.DARAJA_PASSKEY}{timestamp}"
-            stk_password = base64.b64encode(raw_password.encode()).decode('utf-8')
-
-            # Prepare STK Push payload
-            stk_payload = {
-                "BusinessShortCode": settings.DARAJA_SHORTCODE,
-                "Password": stk_password,
-                "Timestamp": timestamp,
-                "TransactionType": "CustomerPayBillOnline",
-                "Amount": int(sale.total_amount),
-                "PartyA": phone_number,
-                "PartyB": settings.DARAJA_SHORTCODE,
-                "PhoneNumber": phone_number,
-                "CallBackURL": f"{settings.HOOK_BASE_URL}/api/payments/daraja-webhook/",
-                "AccountReference": f"SALE_{sale.id}",
-                "TransactionDesc": f"Payment for Sale #{sale.id}"
-            }
-
-            headers = {
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": "application/json"
-            }
-
-            # Call Daraja STK Push API
-            response = requests.post(
-                f"{settings.DARAJA_BASE_URL}/mpesa/stkpush/v1/processrequest",
-                json=stk_payload,
-                headers=headers
-            )
-
-            if response.status_code != 200:
-                return Response({'error': f'Daraja API error: {response.text}'},
+            lines = SaleLineSerializer(data=items_data, many=True)
+            if not lines.is_valid():
+                return Response({'items': lines.errors},
                               status=status.HTTP_400_BAD_REQUEST)
 
-            daraja_data = response.json()
-            checkout_request_id = daraja_data.get('CheckoutRequestID')
-            merchant_request_id = daraja_data.get('MerchantRequestID')
-
-            # Save Payment record
-            payment = Payment.objects.create(
-                sale=sale,
-                amount=sale.total_amount,
-                currency='KES',
-                status='pending',
-                transaction_id=checkout_request_id,
-                merchant_request_id=merchant_request_id,
-                checkout_request_id=checkout_request_id
-            )
+            # Sale, payment and queued STK push commit together; the
+            # process_stk_jobs worker talks to Daraja, not this request
+            with transaction.atomic():
+                sale = create_sale(
+                    lines.validated_data,
+                    client_id=1,  # Default client
+                    shipping_address=shipping_address,
+                    status='pending',
+                )
+                payment = Payment.objects.create(
+                    sale=sale,
+                    amount=sale.total_amount,
+                    currency='KES',
+                    status='pending',
+                    phone_number=phone_number,
+                )
+                # Hold the stock until the payment resolves or the hold expires
+                reserve_stock(
+                    quantities_from_lines(
+                        (line['product'].pk, line['quantity']) for line in lines.validated_data
+                    ),
+                    reservation_reference(sale.pk),
+                )
+                enqueue_stk_push(payment)
 
             return Response({
-                'message': 'STK Push initiated. Check your phone.',
+                'message': 'Payment queued. You will receive an M-Pesa prompt shortly.',
                 'sale_id': sale.id,
-                'transaction_id': payment.transaction_id,
-                'status': payment.status
-            }, status=status.HTTP_201_CREATED)
-
+                'payment_reference': payment.reference,
+                'status': payment.status,
+                'status_url': reverse('payment-status', args=[payment.reference]),
+            }, status=status.HTTP_202_ACCEPTED)
+
+        except InsufficientStock as e:
+            return Response({'error': 'Not enough stock', 'product': e.product},
+                          status=status.HTTP_409_CONFLICT)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
-            
+
+
+class PaymentStatusView(APIView):
+    """
+    Polled by the checkout page after a 202 from CreatePaymentView.
+    """
+    permission_classes = [AllowAny]
+    POLL_INTERVAL = 2  # seconds, sent back as Retry-After while pending
+
+    def get(self, request, reference):
+        payment = get_object_or_404(
+            Payment.objects.select_related('stk_job'), reference=reference
+        )
+        job = getattr(payment, 'stk_job', None)
+        response = Response({
+            'payment_reference': payment.reference,
+            'sale_id': payment.sale_id,
+            'status': payment.status,
+            'dispatch': job.status if job else None,
+            'prompt_sent': bool(payment.checkout_request_id),
+        })
+        if payment.status == 'pending':
+            response['Retry-After'] = str(self.POLL_INTERVAL)
+        return response
 
 
 class DarajaWebhookView(APIView):
-    def post(self, request, *args, **kwargs):
-        data = request.data
-        checkout_request_id = data.get('Body', {}).get('stkCallback', {}).get('CheckoutRequestID')
-        result_code = data.get('Body', {}).get('stkCallback', {}).get('ResultCode')
-        
-        try:
-            payment = Payment.objects.get(checkout_request_id=checkout_request_id)
-            
-            # Prevent duplicate processing
-            if payment.status in ['completed', 'failed']:
-                return Response({'message': 'Payment already processed'}, 
-                              status=status.HTTP_200_OK)
-            
-            sale = payment.sale
+    # Called by Safaricom, which sends no credentials; the only proof a
+    # callback is genuine is the secret token we put in the CallBackURL
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request, token, *args, **kwargs):
+        expected = settings.DARAJA_WEBHOOK_TOKEN
+        if not expected:
+            logger.error("DARAJA_WEBHOOK_TOKEN is not set; rejecting Daraja callback")
+            return Response({'error': 'Invalid callback token'}, status=status.HTTP_403_FORBIDDEN)
+        if not hmac.compare_digest(token.encode(), expected.encode()):
+            return Response({'error': 'Invalid callback token'}, status=status.HTTP_403_FORBIDDEN)
 
-            if result_code == 0:
-                payment.status = 'completed'
-                sale.status = 'completed'
-                sale.save()
-                
-                # Deduct inventory with flag
-                for item in sale.items.all():
-                    item.save(deduct_inventory=True)  # This will deduct inventory
-            else:
-                payment.status = 'failed'
-                # Keep sale as 'pending' or mark as 'cancelled'
-                sale.status = 'cancelled'
-                sale.save()
+        data = request.data
+        stk_callback = data.get('Body', {}).get('stkCallback', {})
 
-            payment.save()
-        except Payment.DoesNotExist:
-            pass  # Optionally log this
+        # Locks the payment, dedupes the callback and deducts stock in one transaction
+        apply_stk_callback(stk_callback)
 
         return Response({'message': 'Webhook received'}, status=status.HTTP_200_OK)
\ No newline at end of file
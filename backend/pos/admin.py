@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import POSSale, POSItem
+from .models import POSSale, POSItem, Shift, ShiftTotal
 
 class POSItemInline(admin.TabularInline):
     model = POSItem
@@ -18,7 +18,7 @@ class POSSaleAdmin(admin.ModelAdmin):
     inlines = [POSItemInline]
     
     # Make financials read-only to prevent accidental tampering with historical receipts
-    readonly_fields = ('timestamp', 'total_amount')
+    readonly_fields = ('timestamp', 'total_amount', 'client_uuid', 'shift')
     
     def get_client(self, obj):
         if obj.client:
@@ -29,4 +29,19 @@ class POSSaleAdmin(admin.ModelAdmin):
 @admin.register(POSItem)
 class POSItemAdmin(admin.ModelAdmin):
     list_display = ('pos_sale', 'product', 'quantity', 'unit_price', 'line_total')
-    readonly_fields = ('line_total',)
\ No newline at end of file
+    readonly_fields = ('line_total',)
+
+
+class ShiftTotalInline(admin.TabularInline):
+    model = ShiftTotal
+    extra = 0
+    can_delete = False
+    # Kept up to date by pos/shifts.py as sales are recorded
+    readonly_fields = ('payment_method', 'orders', 'amount')
+
+@admin.register(Shift)
+class ShiftAdmin(admin.ModelAdmin):
+    list_display = ('id', 'served_by', 'opened_at', 'closed_at', 'expected_cash', 'counted_cash', 'variance')
+    list_filter = ('served_by',)
+    inlines = [ShiftTotalInline]
+    readonly_fields = ('opened_at', 'closed_at', 'counted_cash', 'expected_cash', 'variance')
@@ -0,0 +1,50 @@
+"""
+Fast read path for the POS sale list; see inventory/fast_serializers.py.
+"""
+from collections import defaultdict
+
+from inventory.fast_serializers import FastRows, money, money_15, timestamp
+from .models import POSItem
+from .serializers import POSItemSerializer, POSSaleSerializer
+
+POS_ITEM_FIELDS = {
+    'product': (('product_id',), lambda r: r['product_id']),
+    'product_name': (('product__product_name',), lambda r: r['product__product_name']),
+    'quantity': (('quantity',), lambda r: r['quantity']),
+    'unit_price': (('unit_price',), lambda r: money(r['unit_price'])),
+    'line_total': (('line_total',), lambda r: money(r['line_total'])),
+}
+
+POS_SALE_FIELDS = {
+    'id': (('id',), lambda r: r['id']),
+    'client': (('client_id',), lambda r: r['client_id']),
+    'timestamp': (('timestamp',), lambda r: timestamp(r['timestamp'])),
+    'total_amount': (('total_amount',), lambda r: money_15(r['total_amount'])),
+    'payment_method': (('payment_method',), lambda r: r['payment_method']),
+    'served_by': (('served_by',), lambda r: r['served_by']),
+    # Filled in by pos_sale_rows() from one query over all items of the page
+    'items': ((), lambda r: r['items']),
+}
+
+
+def pos_sale_rows():
+    return FastRows(POS_SALE_FIELDS, POSSaleSerializer.Meta.fields)
+
+
+def render_pos_sales(sales):
+    """
+    Render a page of `.values()` sale rows, loading the items of every
+    sale on the page with a single query.
+    """
+    sales = list(sales)
+    items = FastRows(POS_ITEM_FIELDS, POSItemSerializer.Meta.fields, extra_columns=['pos_sale_id'])
+    item_rows = items.values(
+        POSItem.objects.filter(pos_sale_id__in=[sale['id'] for sale in sales]).order_by('pos_sale_id', 'pk')
+    )
+
+    by_sale = defaultdict(list)
+    for row in item_rows:
+        by_sale[row['pos_sale_id']].append(row)
+    for sale in sales:
+        sale['items'] = items.render(by_sale[sale['id']])
+    return pos_sale_rows().render(sales)
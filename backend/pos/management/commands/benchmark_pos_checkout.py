@@ -0,0 +1,79 @@
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from inventory.models import Product
+from pos.models import POSItem, POSSale
+from pos.services import create_pos_sale
+
+
+class Command(BaseCommand):
+    help = (
+        "Time POS checkout against basket size, comparing the old per-item "
+        "path with pos.services.create_pos_sale. Runs in a transaction that "
+        "is rolled back, so nothing is left behind."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', default='1,5,20,50,200',
+            help="Comma-separated basket sizes in lines (default 1,5,20,50,200).",
+        )
+        parser.add_argument('--repeat', type=int, default=20, help="Checkouts per size and path; the median is reported.")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        repeat = max(options['repeat'], 1)
+        with transaction.atomic():
+            products = Product.objects.bulk_create(
+                Product(
+                    brand_name='Bench', product_name=f"Checkout product {i}",
+                    description="Benchmark product", selling_price=Decimal('9.99'),
+                    stock_qty=10 ** 6,
+                )
+                for i in range(max(sizes))
+            )
+            self.stdout.write(f"{'lines':>6}  {'path':<8}{'median ms':>11}{'queries':>10}")
+            for size in sizes:
+                lines = [
+                    {'product': product, 'quantity': 2, 'unit_price': Decimal('9.99')}
+                    for product in products[:size]
+                ]
+                for label, checkout in (('per-item', self.per_item), ('bulk', self.bulk)):
+                    ms, queries = self.measure(checkout, lines, repeat)
+                    self.stdout.write(f"{size:>6}  {label:<8}{ms:>11.2f}{queries:>10}")
+            transaction.set_rollback(True)
+
+    def measure(self, checkout, lines, repeat):
+        timings, queries = [], 0
+        for _ in range(repeat):
+            executed = []
+
+            def count(execute, sql, params, many, context):
+                executed.append(sql)
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(count):
+                start = time.perf_counter()
+                with transaction.atomic():
+                    checkout(lines)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries = len(executed)
+        return statistics.median(timings), queries
+
+    # What POSSaleSerializer.create did before create_pos_sale: one
+    # POSItem.save() per line, each deducting its own stock, then the
+    # header saved again for the total.
+    def per_item(self, lines):
+        pos_sale = POSSale.objects.create(served_by='bench')
+        total = 0
+        for line in lines:
+            total += POSItem.objects.create(pos_sale=pos_sale, **line).line_total
+        pos_sale.total_amount = total
+        pos_sale.save()
+
+    def bulk(self, lines):
+        create_pos_sale(lines, served_by='bench')
@@ -1,8 +1,40 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 from inventory.models import Product
+from inventory.services import remove_stock
 from staff.models import Client
 
+class Shift(models.Model):
+    """
+    One cashier's session at a till, from opening float to counted cash.
+    Running totals per payment method live in ShiftTotal and are kept up
+    to date as sales are recorded (see pos/shifts.py).
+    """
+    served_by = models.CharField(max_length=100, help_text="Name or ID of the cashier")
+    opened_at = models.DateTimeField(auto_now_add=True)
+    closed_at = models.DateTimeField(null=True, blank=True)
+    opening_float = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Filled in at close: cash counted in the drawer, what the sales say
+    # should be there (float + cash takings) and the difference
+    counted_cash = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+    expected_cash = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+    variance = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['served_by'], condition=Q(closed_at__isnull=True), name='one_open_shift_per_cashier',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['opened_at']),
+        ]
+
+    def __str__(self):
+        return f"Shift {self.id} - {self.served_by} ({'open' if self.closed_at is None else 'closed'})"
+
 class POSSale(models.Model):
     """
     Represents a walk-in transaction at a physical location.
@@ -15,13 +47,28 @@ class POSSale(models.Model):
 
     # Client is optional for POS (could be a walk-in guest)
     client = models.ForeignKey(Client, on_delete=models.SET_NULL, null=True, blank=True, related_name='pos_sales')
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set by the terminal for sales uploaded through the offline sync
+    timestamp = models.DateTimeField(default=timezone.now)
     total_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0.00)
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHODS, default='cash')
     
     # Track which staff member handled the sale
     served_by = models.CharField(max_length=100, help_text="Name or ID of the cashier")
 
+    # Generated by the terminal for offline sales; uploads are deduplicated on it
+    client_uuid = models.UUIDField(unique=True, null=True, blank=True, editable=False)
+
+    # The cashier's shift that was open when the sale was recorded, if any
+    shift = models.ForeignKey(Shift, on_delete=models.PROTECT, null=True, blank=True, related_name='sales')
+
+    class Meta:
+        indexes = [
+            # Keyset scans of the order feed, newest first
+            models.Index(fields=['timestamp', 'id']),
+            # Z-report's sweep for sales made outside any shift
+            models.Index(fields=['served_by', 'timestamp']),
+        ]
+
     def __str__(self):
         return f"POS Sale {self.id} - {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
 
@@ -40,9 +87,25 @@ class POSItem(models.Model):
         
         # Deduct stock immediately upon physical sale
         if not self.pk:
-            if self.product.stock_qty < self.quantity:
-                raise ValueError(f"Out of stock: {self.product.product_name}")
-            self.product.stock_qty -= self.quantity
-            self.product.save()
-            
-        super().save(*args, **kwargs)
\ No newline at end of file
+            with transaction.atomic():
+                remove_stock(self.product_id, self.quantity)
+                super().save(*args, **kwargs)
+            return
+
+        super().save(*args, **kwargs)
+
+
+class ShiftTotal(models.Model):
+    """Orders and takings of one shift for one payment method."""
+    shift = models.ForeignKey(Shift, on_delete=models.CASCADE, related_name='totals')
+    payment_method = models.CharField(max_length=20, choices=POSSale.PAYMENT_METHODS)
+    orders = models.PositiveIntegerField(default=0)
+    amount = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['shift', 'payment_method'], name='one_total_per_shift_method'),
+        ]
+
+    def __str__(self):
+        return f"Shift {self.shift_id} {self.payment_method}: {self.amount}"
@@ -1,5 +1,13 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
 from rest_framework import serializers
-from .models import POSSale, POSItem
+from inventory.models import Product
+from inventory.services import InsufficientStock
+from staff.models import Client
+from .models import POSSale, POSItem, Shift, ShiftTotal
+from .services import create_pos_sale
 
 class POSItemSerializer(serializers.ModelSerializer):
     product_name = serializers.ReadOnlyField(source='product.product_name')
@@ -18,13 +26,110 @@ class POSSaleSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-        pos_sale = POSSale.objects.create(**validated_data)
-        
-        total = 0
-        for item in items_data:
-            created_item = POSItem.objects.create(pos_sale=pos_sale, **item)
-            total += created_item.line_total
-        
-        pos_sale.total_amount = total
-        pos_sale.save()
-        return pos_sale
\ No newline at end of file
+        try:
+            return create_pos_sale(items_data, **validated_data)
+        except InsufficientStock as exc:
+            raise serializers.ValidationError(
+                {'items': [f"Not enough stock for product {exc.product} ({exc.quantity} requested)."]}
+            )
+
+
+class POSSyncItemSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+    unit_price = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0'))
+
+
+class POSSyncSaleSerializer(serializers.Serializer):
+    """One sale recorded by a terminal, possibly while it was offline."""
+    # Terminal clocks drift; anything further ahead than this is a bad clock
+    MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+    client_uuid = serializers.UUIDField()
+    sold_at = serializers.DateTimeField()
+    client = serializers.IntegerField(required=False, allow_null=True)
+    payment_method = serializers.ChoiceField(choices=POSSale.PAYMENT_METHODS)
+    served_by = serializers.CharField(max_length=100)
+    items = POSSyncItemSerializer(many=True, allow_empty=False, max_length=200)
+
+    def validate_sold_at(self, value):
+        if value > timezone.now() + self.MAX_CLOCK_SKEW:
+            raise serializers.ValidationError("Sale time is in the future; check the terminal clock.")
+        return value
+
+
+class POSSyncBatchSerializer(serializers.Serializer):
+    """An upload of queued sales; see pos.sync.sync_sales."""
+    MAX_SALES = 500
+
+    sales = POSSyncSaleSerializer(many=True, allow_empty=False, max_length=MAX_SALES)
+
+    def validate_sales(self, sales):
+        # Check every product and client of the batch with one query each
+        products = set(Product.objects.filter(
+            pk__in={item['product'] for sale in sales for item in sale['items']}
+        ).order_by().values_list('pk', flat=True))
+        clients = set(Client.objects.filter(
+            pk__in={sale['client'] for sale in sales if sale.get('client')}
+        ).values_list('pk', flat=True))
+
+        errors = []
+        for sale in sales:
+            error = {}
+            missing = sorted({item['product'] for item in sale['items']} - products)
+            if missing:
+                error['items'] = [f"Invalid product pk(s): {', '.join(map(str, missing))}."]
+            if sale.get('client') and sale['client'] not in clients:
+                error['client'] = [f"Invalid pk \"{sale['client']}\" - object does not exist."]
+            errors.append(error)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return sales
+
+
+class ShiftTotalSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ShiftTotal
+        fields = ['payment_method', 'orders', 'amount']
+
+
+class ShiftSerializer(serializers.ModelSerializer):
+    totals = ShiftTotalSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Shift
+        fields = [
+            'id', 'served_by', 'opened_at', 'closed_at', 'opening_float',
+            'counted_cash', 'expected_cash', 'variance', 'totals',
+        ]
+        read_only_fields = ['opened_at', 'closed_at', 'counted_cash', 'expected_cash', 'variance']
+        # An already-open shift is reported by open_shift as a 409 instead
+        extra_kwargs = {'served_by': {'validators': []}}
+
+
+class ShiftCloseSerializer(serializers.Serializer):
+    counted_cash = serializers.DecimalField(max_digits=15, decimal_places=2, min_value=Decimal('0'))
+
+
+class ZReportQuerySerializer(serializers.Serializer):
+    date = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        attrs.setdefault('date', timezone.localdate())
+        return attrs
+
+
+class ZReportRowSerializer(serializers.Serializer):
+    served_by = serializers.CharField(required=False)
+    payment_method = serializers.CharField()
+    orders = serializers.IntegerField()
+    amount = serializers.DecimalField(max_digits=15, decimal_places=2)
+
+
+class ZReportSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    shifts = ShiftSerializer(many=True)
+    rows = ZReportRowSerializer(many=True)
+    by_payment_method = ZReportRowSerializer(many=True)
+    orders = serializers.IntegerField()
+    amount = serializers.DecimalField(max_digits=15, decimal_places=2)
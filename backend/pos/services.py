@@ -0,0 +1,52 @@
+from django.db import transaction
+
+from inventory.reorder import quantities_from_lines
+from inventory.services import remove_stock_bulk
+from outbox.events import publish
+from .models import POSItem, POSSale
+from .shifts import add_to_totals, current_shift
+
+
+def create_pos_sale(lines, **fields):
+    """
+    Check out a till basket: the POS counterpart of
+    sales.services.create_sale.
+
+    Each line is a dict with `product` (a Product instance), `quantity`
+    and `unit_price`. The whole basket's stock is checked and deducted by
+    remove_stock_bulk, which locks every product with one SELECT ... FOR
+    UPDATE in primary-key order, so two tills selling overlapping baskets
+    queue instead of deadlocking. The header is then inserted once with
+    its total and the items with one bulk_create, and added to the
+    cashier's open shift, if any. Raises InsufficientStock (and records
+    nothing) if any line is short.
+    """
+    items = [
+        POSItem(
+            product=line['product'],
+            quantity=line['quantity'],
+            unit_price=line['unit_price'],
+            # bulk_create skips POSItem.save(), which would also deduct
+            # stock line by line
+            line_total=line['quantity'] * line['unit_price'],
+        )
+        for line in lines
+    ]
+    quantities = quantities_from_lines((item.product_id, item.quantity) for item in items)
+
+    with transaction.atomic():
+        remove_stock_bulk(quantities)
+        shift = current_shift(fields.get('served_by'))
+        pos_sale = POSSale.objects.create(
+            total_amount=sum(item.line_total for item in items), shift=shift, **fields
+        )
+        if shift is not None:
+            add_to_totals(shift, [pos_sale])
+        for item in items:
+            item.pos_sale = pos_sale
+        POSItem.objects.bulk_create(items)
+        publish('sale.completed', 'pos_sale', pos_sale.pk, {
+            'channel': 'pos',
+            'quantities': {str(pk): units for pk, units in quantities.items()},
+        })
+    return pos_sale
@@ -0,0 +1,117 @@
+"""
+Till shifts and their running totals.
+
+A ShiftTotal row per payment method is created when the shift opens, and
+every recorded POS sale adds to its row with one UPDATE in the sale's own
+transaction. Closing a shift therefore reads a handful of rows, however
+many sales it had, and compares the cash total with the counted drawer.
+The shift row is locked both by sales and by close, so a sale is either
+in the closed totals or not on the shift at all.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .models import POSSale, Shift, ShiftTotal
+
+CASH = 'cash'
+
+
+class ShiftConflict(Exception):
+    """The cashier already has an open shift, or the shift is closed."""
+
+
+def open_shift(served_by, opening_float=Decimal('0.00')):
+    try:
+        with transaction.atomic():
+            shift = Shift.objects.create(served_by=served_by, opening_float=opening_float)
+            ShiftTotal.objects.bulk_create([
+                ShiftTotal(shift=shift, payment_method=method) for method, _ in POSSale.PAYMENT_METHODS
+            ])
+    except IntegrityError:
+        raise ShiftConflict(f"{served_by} already has an open shift.")
+    return shift
+
+
+def current_shift(served_by):
+    """The cashier's open shift, locked for this transaction, or None."""
+    return Shift.objects.select_for_update().filter(served_by=served_by, closed_at__isnull=True).first()
+
+
+def add_to_totals(shift, pos_sales):
+    """Add recorded sales to `shift`'s totals. Call in the sales' transaction."""
+    per_method = defaultdict(lambda: [0, Decimal('0.00')])
+    for pos_sale in pos_sales:
+        per_method[pos_sale.payment_method][0] += 1
+        per_method[pos_sale.payment_method][1] += pos_sale.total_amount
+    for method, (orders, amount) in per_method.items():
+        ShiftTotal.objects.filter(shift=shift, payment_method=method).update(
+            orders=F('orders') + orders, amount=F('amount') + amount,
+        )
+
+
+def close_shift(shift_id, counted_cash):
+    with transaction.atomic():
+        shift = Shift.objects.select_for_update().get(pk=shift_id)
+        if shift.closed_at is not None:
+            raise ShiftConflict(f"Shift {shift.pk} is already closed.")
+        cash = ShiftTotal.objects.filter(shift=shift, payment_method=CASH).values_list('amount', flat=True).first()
+        shift.closed_at = timezone.now()
+        shift.counted_cash = counted_cash
+        shift.expected_cash = shift.opening_float + (cash or 0)
+        shift.variance = counted_cash - shift.expected_cash
+        shift.save(update_fields=['closed_at', 'counted_cash', 'expected_cash', 'variance'])
+    return shift
+
+
+def z_report(day):
+    """
+    End-of-day figures for `day` (local time): the shifts opened that day
+    with their totals, plus any POS sales made that day outside a shift,
+    summed per cashier and payment method.
+    """
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = start + timedelta(days=1)
+    shifts = list(
+        Shift.objects.filter(opened_at__gte=start, opened_at__lt=end)
+        .order_by('opened_at').prefetch_related('totals')
+    )
+    rows = defaultdict(lambda: {'orders': 0, 'amount': Decimal('0.00')})
+    for shift in shifts:
+        for total in shift.totals.all():
+            if total.orders:
+                row = rows[(shift.served_by, total.payment_method)]
+                row['orders'] += total.orders
+                row['amount'] += total.amount
+    outside = (
+        POSSale.objects.filter(timestamp__gte=start, timestamp__lt=end, shift__isnull=True)
+        .values('served_by', 'payment_method')
+        .annotate(orders=Count('id'), amount=Sum('total_amount'))
+        .order_by()
+    )
+    for sale in outside:
+        row = rows[(sale['served_by'], sale['payment_method'])]
+        row['orders'] += sale['orders']
+        row['amount'] += sale['amount']
+
+    by_method = defaultdict(lambda: {'orders': 0, 'amount': Decimal('0.00')})
+    for (_, method), row in rows.items():
+        by_method[method]['orders'] += row['orders']
+        by_method[method]['amount'] += row['amount']
+    return {
+        'date': day,
+        'shifts': shifts,
+        'rows': [
+            {'served_by': served_by, 'payment_method': method, **row}
+            for (served_by, method), row in sorted(rows.items())
+        ],
+        'by_payment_method': [
+            {'payment_method': method, **row} for method, row in sorted(by_method.items())
+        ],
+        'orders': sum(row['orders'] for row in by_method.values()),
+        'amount': sum((row['amount'] for row in by_method.values()), Decimal('0.00')),
+    }
@@ -0,0 +1,152 @@
+"""
+Batch upload of sales that POS terminals queued while offline.
+
+Each sale carries a `client_uuid` generated on the terminal, stored in a
+unique column, so replaying an upload (after a timeout, say) never
+records a sale twice: sales already on the server come back as
+DUPLICATE. A replay of a batch that went through costs one indexed
+lookup and no locks.
+
+New sales are written in one transaction. The products of the whole
+batch are locked once, sales are allocated stock in the order they were
+made, and a sale whose lines no longer fit in the available stock is
+returned as CONFLICT with the shortfall instead of failing the batch.
+The rest are inserted with bulk INSERTs and the stock of each product is
+decremented once for the batch.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from inventory.models import Product
+from inventory.reorder import quantities_from_lines
+from inventory.services import remove_stock_bulk
+from outbox.events import publish_many
+from .models import POSItem, POSSale
+from .shifts import add_to_totals, current_shift
+
+CREATED = 'created'
+DUPLICATE = 'duplicate'
+CONFLICT = 'conflict'
+
+
+def _known(uuids):
+    return dict(POSSale.objects.filter(client_uuid__in=uuids).values_list('client_uuid', 'pk'))
+
+
+def _shortfall(quantities, available):
+    return [
+        {'product': product_id, 'requested': units, 'available': available.get(product_id, 0)}
+        for product_id, units in sorted(quantities.items())
+        if available.get(product_id, 0) < units
+    ]
+
+
+def sync_sales(sales):
+    """
+    Record a batch of validated POSSyncSaleSerializer dicts. Returns one
+    result per input sale, in input order: `client_uuid`, `status` and,
+    for CREATED and DUPLICATE, the server `id`; for CONFLICT, `conflicts`.
+    """
+    uuids = [sale['client_uuid'] for sale in sales]
+    existing = _known(uuids)
+    new = {}
+    for sale in sales:
+        if sale['client_uuid'] not in existing:
+            new.setdefault(sale['client_uuid'], sale)
+
+    conflicts = {}
+    created = set()
+    if new:
+        with transaction.atomic():
+            demand = quantities_from_lines(
+                (item['product'], item['quantity'])
+                for sale in new.values() for item in sale['items']
+            )
+            available = dict(
+                Product.objects.select_for_update()
+                .filter(pk__in=list(demand)).order_by('pk')
+                .values_list('pk', F('stock_qty') - F('reserved_qty'))
+            )
+            # A concurrent upload of the same batch waits on the product
+            # locks above; by now it has committed, so look again.
+            existing.update(_known(list(new)))
+
+            accepted = []
+            taken = {}
+            for sale in sorted(new.values(), key=lambda sale: sale['sold_at']):
+                if sale['client_uuid'] in existing:
+                    continue
+                quantities = quantities_from_lines((item['product'], item['quantity']) for item in sale['items'])
+                short = _shortfall(quantities, available)
+                if short:
+                    conflicts[sale['client_uuid']] = short
+                    continue
+                for product_id, units in quantities.items():
+                    available[product_id] -= units
+                    taken[product_id] = taken.get(product_id, 0) + units
+                accepted.append((sale, quantities))
+
+            if accepted:
+                pos_sales = _create(accepted)
+                remove_stock_bulk(taken)
+                existing.update({pos_sale.client_uuid: pos_sale.pk for pos_sale in pos_sales})
+                created = {pos_sale.client_uuid for pos_sale in pos_sales}
+
+    results = []
+    reported = set()
+    for sale in sales:
+        uuid = sale['client_uuid']
+        if uuid in conflicts:
+            results.append({'client_uuid': uuid, 'status': CONFLICT, 'conflicts': conflicts[uuid]})
+            continue
+        status = CREATED if uuid in created and uuid not in reported else DUPLICATE
+        reported.add(uuid)
+        results.append({'client_uuid': uuid, 'status': status, 'id': existing[uuid]})
+    return results
+
+
+def _create(accepted):
+    # A queued sale joins its cashier's open shift only if it was made
+    # during it; older ones are reported by the Z-report as outside a shift.
+    shifts = {
+        served_by: current_shift(served_by)
+        for served_by in sorted({sale['served_by'] for sale, _ in accepted})
+    }
+
+    def shift_for(sale):
+        shift = shifts[sale['served_by']]
+        return shift if shift is not None and sale['sold_at'] >= shift.opened_at else None
+
+    pos_sales = POSSale.objects.bulk_create([
+        POSSale(
+            client_uuid=sale['client_uuid'],
+            timestamp=sale['sold_at'],
+            shift=shift_for(sale),
+            client_id=sale.get('client'),
+            payment_method=sale['payment_method'],
+            served_by=sale['served_by'],
+            total_amount=sum(item['quantity'] * item['unit_price'] for item in sale['items']),
+        )
+        for sale, _ in accepted
+    ])
+    # bulk_create skips POSItem.save(), which would deduct stock line by
+    # line; sync_sales deducts the batch's stock in one statement instead.
+    POSItem.objects.bulk_create([
+        POSItem(
+            pos_sale=pos_sale, product_id=item['product'], quantity=item['quantity'],
+            unit_price=item['unit_price'], line_total=item['quantity'] * item['unit_price'],
+        )
+        for pos_sale, (sale, _) in zip(pos_sales, accepted)
+        for item in sale['items']
+    ])
+    for shift in shifts.values():
+        if shift is not None:
+            add_to_totals(shift, [pos_sale for pos_sale in pos_sales if pos_sale.shift_id == shift.pk])
+    publish_many('sale.completed', 'pos_sale', [
+        (pos_sale.pk, {
+            'channel': 'pos',
+            'quantities': {str(pk): units for pk, units in quantities.items()},
+        })
+        for pos_sale, (_, quantities) in zip(pos_sales, accepted)
+    ])
+    return pos_sales
@@ -1,3 +1,161 @@
+import uuid
+from datetime import timedelta
+
 from django.test import TestCase
+from django.utils import timezone
+
+from inventory.models import Product
+from outbox.models import OutboxEvent
+from staff.models import CustomAdmin
+from .models import POSSale, Shift
+
+CHECKOUT_URL = '/api/pos/pos-transactions/'
+SYNC_URL = CHECKOUT_URL + 'sync/'
+
+
+class POSCheckoutTests(TestCase):
+    def setUp(self):
+        self.products = [
+            Product.objects.create(
+                brand_name='Acme', product_name=f"Item {i}", description='An item',
+                selling_price='10.00', stock_qty=4,
+            )
+            for i in range(3)
+        ]
+        self.client.force_login(CustomAdmin.objects.create_user('till@example.com', 'Till', 'One', '0700000000'))
+
+    def checkout(self, quantities):
+        return self.client.post(CHECKOUT_URL, {
+            'payment_method': 'cash', 'served_by': 'till 1',
+            'items': [
+                {'product': product.pk, 'quantity': quantity, 'unit_price': '10.00'}
+                for product, quantity in zip(self.products, quantities)
+            ],
+        }, content_type='application/json')
+
+    def test_basket_is_recorded_in_one_pass(self):
+        response = self.checkout([1, 2, 3])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['total_amount'], '60.00')
+        self.assertEqual(len(response.json()['items']), 3)
+        self.assertEqual(
+            list(Product.objects.filter(pk__in=[p.pk for p in self.products]).order_by('pk').values_list('stock_qty', flat=True)),
+            [3, 2, 1],
+        )
+
+    def test_short_line_rejects_the_whole_basket(self):
+        response = self.checkout([1, 5, 1])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(POSSale.objects.exists())
+        self.assertEqual(
+            set(Product.objects.values_list('stock_qty', flat=True)), {4},
+        )
+
+
+
+class POSSyncTests(TestCase):
+    def setUp(self):
+        self.widget = Product.objects.create(
+            brand_name='Acme', product_name='Widget', description='A widget',
+            selling_price='10.00', stock_qty=5,
+        )
+        self.gadget = Product.objects.create(
+            brand_name='Acme', product_name='Gadget', description='A gadget',
+            selling_price='20.00', stock_qty=10,
+        )
+        self.client.force_login(CustomAdmin.objects.create_user('till@example.com', 'Till', 'One', '0700000000'))
+
+    def sale(self, minutes_ago, *lines):
+        return {
+            'client_uuid': str(uuid.uuid4()),
+            'sold_at': (timezone.now() - timedelta(minutes=minutes_ago)).isoformat(),
+            'payment_method': 'cash',
+            'served_by': 'till 1',
+            'items': [{'product': p.pk, 'quantity': q, 'unit_price': '10.00'} for p, q in lines],
+        }
+
+    def test_batch_records_sales_and_replay_is_a_no_op(self):
+        first = self.sale(30, (self.widget, 3), (self.gadget, 1))
+        # Made later, and there are only 2 widgets left by then
+        late = self.sale(10, (self.widget, 3))
+        second = self.sale(20, (self.widget, 2))
+        batch = {'sales': [first, late, second]}
+
+        response = self.client.post(SYNC_URL, batch, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([r['status'] for r in results], ['created', 'conflict', 'created'])
+        self.assertEqual(results[1]['conflicts'], [{'product': self.widget.pk, 'requested': 3, 'available': 0}])
+
+        self.widget.refresh_from_db()
+        self.gadget.refresh_from_db()
+        self.assertEqual((self.widget.stock_qty, self.gadget.stock_qty), (0, 9))
+        sale = POSSale.objects.get(pk=results[0]['id'])
+        self.assertEqual(sale.total_amount, 40)
+        self.assertEqual(sale.timestamp.isoformat()[:19], first['sold_at'][:19])
+        self.assertEqual(OutboxEvent.objects.filter(topic='sale.completed').count(), 2)
+
+        # Replaying the accepted sales only looks up their UUIDs
+        replay = {'sales': [first, second]}
+        with self.assertNumQueries(2 + 2):  # session + user, then products and UUIDs
+            response = self.client.post(SYNC_URL, replay, content_type='application/json')
+        self.assertEqual(
+            [(r['status'], r['id']) for r in response.json()['results']],
+            [('duplicate', results[0]['id']), ('duplicate', results[2]['id'])],
+        )
+        self.assertEqual(POSSale.objects.count(), 2)
+
+    def test_future_sale_time_is_rejected(self):
+        sale = self.sale(-60, (self.widget, 1))
+        response = self.client.post(SYNC_URL, {'sales': [sale]}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(POSSale.objects.exists())
+
+
+class ShiftTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(
+            brand_name='Acme', product_name='Widget', description='A widget',
+            selling_price='10.00', stock_qty=50,
+        )
+        self.client.force_login(CustomAdmin.objects.create_user('till@example.com', 'Till', 'One', '0700000000'))
+
+    def sell(self, served_by, method, quantity):
+        response = self.client.post(CHECKOUT_URL, {
+            'payment_method': method, 'served_by': served_by,
+            'items': [{'product': self.product.pk, 'quantity': quantity, 'unit_price': '10.00'}],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_close_reads_running_totals_and_reports_variance(self):
+        response = self.client.post('/api/pos/shifts/', {'served_by': 'alice', 'opening_float': '100.00'})
+        self.assertEqual(response.status_code, 201)
+        shift_id = response.json()['id']
+        self.assertEqual(self.client.post('/api/pos/shifts/', {'served_by': 'alice'}).status_code, 409)
+
+        self.sell('alice', 'cash', 2)
+        self.sell('alice', 'cash', 1)
+        self.sell('alice', 'card', 4)
+        self.sell('bob', 'cash', 5)  # no shift open for bob
+
+        # session + user; savepoint, locked shift, cash total, update, release;
+        # then the shift and its totals for the response
+        with self.assertNumQueries(2 + 5 + 2):
+            response = self.client.post(f'/api/pos/shifts/{shift_id}/close/', {'counted_cash': '125.00'})
+        self.assertEqual(response.status_code, 200)
+        shift = response.json()
+        self.assertEqual((shift['expected_cash'], shift['variance']), ('130.00', '-5.00'))
+        totals = {row['payment_method']: (row['orders'], row['amount']) for row in shift['totals']}
+        self.assertEqual(totals['cash'], (2, '30.00'))
+        self.assertEqual(totals['card'], (1, '40.00'))
+
+        # Sales after close are no longer on the shift
+        self.sell('alice', 'cash', 1)
+        self.assertEqual(Shift.objects.get(pk=shift_id).sales.count(), 3)
 
-# Create your tests here.
+        report = self.client.get('/api/pos/z-report/').json()
+        self.assertEqual(
+            [(r['served_by'], r['payment_method'], r['orders'], r['amount']) for r in report['rows']],
+            [('alice', 'card', 1, '40.00'), ('alice', 'cash', 3, '40.00'), ('bob', 'cash', 1, '50.00')],
+        )
+        self.assertEqual((report['orders'], report['amount']), (5, '130.00'))
@@ -1,10 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import POSSaleViewSet
+from .views import POSSaleViewSet, ShiftViewSet, ZReportAPIView
 
 router = DefaultRouter()
 router.register(r'pos-transactions', POSSaleViewSet)
+router.register(r'shifts', ShiftViewSet)
 
 urlpatterns = [
+    path('z-report/', ZReportAPIView.as_view()),
     path('', include(router.urls)),
 ]
\ No newline at end of file
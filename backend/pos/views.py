@@ -1,7 +1,16 @@
-from rest_framework import viewsets, status
+from django.http import Http404
+from rest_framework import mixins, viewsets, status
+from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import POSSale
-from .serializers import POSSaleSerializer
+from rest_framework.views import APIView
+from .models import POSSale, Shift
+from .serializers import (
+    POSSaleSerializer, POSSyncBatchSerializer, ShiftCloseSerializer, ShiftSerializer,
+    ZReportQuerySerializer, ZReportSerializer,
+)
+from .shifts import ShiftConflict, close_shift, open_shift, z_report
+from .sync import sync_sales
+from .fast_serializers import pos_sale_rows, render_pos_sales
 
 class POSSaleViewSet(viewsets.ModelViewSet):
     """
@@ -10,9 +19,67 @@ class POSSaleViewSet(viewsets.ModelViewSet):
     queryset = POSSale.objects.all().order_by('-timestamp')
     serializer_class = POSSaleSerializer
 
+    def list(self, request, *args, **kwargs):
+        # Same output as POSSaleSerializer, built from .values() rows with
+        # product names joined in SQL (see pos/fast_serializers.py)
+        queryset = pos_sale_rows().values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(render_pos_sales(page))
+        return Response(render_pos_sales(queryset))
+
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['post'], serializer_class=POSSyncBatchSerializer)
+    def sync(self, request):
+        """
+        Upload sales a terminal queued offline, as {"sales": [...]}. Safe to
+        replay: returns one outcome per sale (created, duplicate or conflict).
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({'results': sync_sales(serializer.validated_data['sales'])})
+
+
+class ShiftViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, mixins.CreateModelMixin, viewsets.GenericViewSet):
+    """
+    Till shifts. POST opens one for `served_by`; POST {id}/close/ with the
+    counted cash closes it and records the variance.
+    """
+    queryset = Shift.objects.prefetch_related('totals').order_by('-opened_at')
+    serializer_class = ShiftSerializer
+    lookup_value_regex = r'\d+'
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            shift = open_shift(**serializer.validated_data)
+        except ShiftConflict as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response(self.get_serializer(self.get_queryset().get(pk=shift.pk)).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'], serializer_class=ShiftCloseSerializer)
+    def close(self, request, pk=None):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            shift = close_shift(pk, serializer.validated_data['counted_cash'])
+        except Shift.DoesNotExist:
+            raise Http404
+        except ShiftConflict as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response(ShiftSerializer(self.get_queryset().get(pk=shift.pk)).data)
+
+
+class ZReportAPIView(APIView):
+    """End-of-day POS totals per cashier and payment method; `?date=YYYY-MM-DD`, default today."""
+    def get(self, request):
+        query = ZReportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return Response(ZReportSerializer(z_report(query.validated_data['date'])).data)
@@ -0,0 +1,17 @@
+from django.contrib import admin
+from .models import ProductSalesRollup, SalesRollup
+
+
+@admin.register(SalesRollup)
+class SalesRollupAdmin(admin.ModelAdmin):
+    list_display = ('grain', 'bucket', 'channel', 'payment_method', 'orders', 'revenue')
+    list_filter = ('grain', 'channel', 'payment_method')
+    # Maintained incrementally; use `manage.py rebuild_sales_rollups` to fix drift
+    readonly_fields = ('grain', 'bucket', 'channel', 'payment_method', 'orders', 'revenue')
+
+
+@admin.register(ProductSalesRollup)
+class ProductSalesRollupAdmin(admin.ModelAdmin):
+    list_display = ('day', 'product', 'category', 'channel', 'payment_method', 'units', 'revenue')
+    list_filter = ('channel', 'payment_method')
+    readonly_fields = ('day', 'product', 'category', 'channel', 'payment_method', 'units', 'revenue')
@@ -0,0 +1,167 @@
+"""
+One chronological feed over online Sales and POS sales.
+
+Each channel is read as the same set of columns (order_id, channel,
+placed_at, order_status, amount, method, customer) and the two are
+combined with UNION ALL, newest first. Pages are seeked, never offset:
+the keyset cursor (placed_at, channel, order_id) is turned into a WHERE
+clause on each side, so both tables are read through their
+(time, id) indexes and only one page of rows is fetched per request.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import connection
+from django.db.models import CharField, F, Q, Value
+from django.db.models.functions import Concat
+from django.utils import timezone
+from rest_framework import serializers
+
+from inventory.fast_serializers import money_15, timestamp
+from inventory.pagination import KeysetPagination
+from pos.models import POSSale
+from sales.models import Sale
+from .models import CHANNEL_CHOICES
+from .rollups import ONLINE, ONLINE_PAYMENT_METHOD, POS
+
+# POS sales are paid at the till, so they are complete once recorded
+POS_STATUS = 'completed'
+
+
+def _text(value):
+    return Value(value, output_field=CharField())
+
+
+def _customer(prefix):
+    return Concat(f'{prefix}first_name', _text(' '), f'{prefix}last_name', output_field=CharField())
+
+
+class OrderFeed:
+    def __init__(self, channel=None, status=None, date_from=None, date_to=None):
+        self.channel = channel
+        self.status = status
+        self.date_from = date_from
+        self.date_to = date_to
+
+    def sides(self):
+        """(channel, queryset) for every channel the filters leave in."""
+        sides = []
+        if self.channel in (None, ONLINE):
+            queryset = Sale.objects.values(
+                order_id=F('id'), channel=_text(ONLINE), placed_at=F('sale_date'),
+                order_status=F('status'), amount=F('total_amount'),
+                method=_text(ONLINE_PAYMENT_METHOD), customer=_customer('client__'),
+            )
+            if self.status:
+                queryset = queryset.filter(status=self.status)
+            sides.append((ONLINE, queryset))
+        if self.channel in (None, POS) and self.status in (None, POS_STATUS):
+            queryset = POSSale.objects.values(
+                order_id=F('id'), channel=_text(POS), placed_at=F('timestamp'),
+                order_status=_text(POS_STATUS), amount=F('total_amount'),
+                method=F('payment_method'), customer=_customer('client__'),
+            )
+            sides.append((POS, queryset))
+
+        bounded = []
+        for channel, queryset in sides:
+            if self.date_from:
+                queryset = queryset.filter(placed_at__gte=_start_of_day(self.date_from))
+            if self.date_to:
+                queryset = queryset.filter(placed_at__lt=_start_of_day(self.date_to + timedelta(days=1)))
+            bounded.append((channel, queryset))
+        return bounded
+
+    @staticmethod
+    def seek(channel, descending, cursor):
+        """
+        The rows of one side that come after `cursor` in feed order. The
+        channel is constant per side, so its part of the comparison is
+        decided here in Python.
+        """
+        placed_at, cursor_channel, order_id = cursor
+        after = 'lt' if descending else 'gt'
+        condition = Q(**{f'placed_at__{after}': placed_at})
+        if channel == cursor_channel:
+            condition |= Q(placed_at=placed_at, **{f'order_id__{after}': order_id})
+        elif (channel < cursor_channel) == descending:
+            condition |= Q(placed_at=placed_at)
+        return condition
+
+    def page(self, ordering, cursor, limit):
+        descending = ordering[0].startswith('-')
+        parts = []
+        for channel, queryset in self.sides():
+            if cursor:
+                queryset = queryset.filter(self.seek(channel, descending, cursor))
+            parts.append(queryset.order_by(*ordering))
+        if not parts:
+            return []
+        if len(parts) == 1:
+            return list(parts[0][:limit])
+        if connection.features.supports_slicing_ordering_in_compound:
+            # Let each side stop after one page before the rows are merged
+            parts = [part[:limit] for part in parts]
+        else:
+            parts = [part.order_by() for part in parts]
+        return list(parts[0].union(*parts[1:], all=True).order_by(*ordering)[:limit])
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class OrderFeedPagination(KeysetPagination):
+    ordering = ('-placed_at', '-channel', '-order_id')
+
+    def get_ordering(self, request, queryset, view):
+        return tuple(self.ordering)
+
+    def paginate_queryset(self, feed, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, feed, view)
+
+        cursor = self.decode_cursor(request)
+        self.reverse = bool(cursor and cursor['reverse'])
+        ordering = self._invert(self.ordering) if self.reverse else self.ordering
+
+        rows = feed.page(ordering, self.parse_cursor(cursor) if cursor else None, self.page_size + 1)
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+
+        self.has_next = True if self.reverse else has_more
+        self.has_previous = has_more if self.reverse else cursor is not None
+        self.page = rows
+        return rows
+
+    def parse_cursor(self, cursor):
+        placed_at, channel, order_id = cursor['values']
+        try:
+            return (
+                serializers.DateTimeField().to_internal_value(placed_at),
+                str(channel),
+                int(order_id),
+            )
+        except (serializers.ValidationError, TypeError, ValueError):
+            self.invalid_cursor()
+
+
+class OrderFeedQuerySerializer(serializers.Serializer):
+    channel = serializers.ChoiceField(choices=CHANNEL_CHOICES, required=False)
+    status = serializers.ChoiceField(choices=Sale.STATUS_CHOICES, required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+
+def render_order(row):
+    return {
+        "channel": row['channel'],
+        "order_id": row['order_id'],
+        "placed_at": timestamp(row['placed_at']),
+        "status": row['order_status'],
+        "total_amount": money_15(row['amount']),
+        "payment_method": row['method'],
+        "customer_name": (row['customer'] or '').strip() or None,
+    }
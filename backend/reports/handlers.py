@@ -0,0 +1,9 @@
+from outbox.events import handler
+from . import rollups
+
+
+@handler('sale.completed')
+def roll_up_completed_sale(event):
+    # Runs in the relay's transaction, so the increment and the event's
+    # processed mark commit together. `rebuild_sales_rollups` repairs drift.
+    rollups.record_sale(event.payload['channel'], int(event.aggregate_id))
@@ -0,0 +1,23 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reports.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the sales rollup tables from Sale and POSSale history."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Only rebuild from this day on (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError("--since must be a date in YYYY-MM-DD form.")
+        rows = rebuild(since)
+        scope = f"since {since}" if since else "for all history"
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt sales rollups {scope}: {rows} row(s)."))
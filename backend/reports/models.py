@@ -0,0 +1,66 @@
+from django.db import models
+from inventory.models import Category, Product
+
+CHANNEL_CHOICES = [
+    ('online', 'Online'),
+    ('pos', 'Point of Sale'),
+]
+
+
+class SalesRollup(models.Model):
+    """
+    Orders and revenue per time bucket, channel and payment method.
+    Maintained by reports/rollups.py; the report endpoints read only this
+    table and ProductSalesRollup.
+    """
+    HOUR = 'hour'
+    DAY = 'day'
+    GRAIN_CHOICES = [
+        (HOUR, 'Hour'),
+        (DAY, 'Day'),
+    ]
+
+    grain = models.CharField(max_length=4, choices=GRAIN_CHOICES)
+    # Start of the hour / day in the project time zone
+    bucket = models.DateTimeField()
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    payment_method = models.CharField(max_length=20)
+    orders = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['grain', 'bucket', 'channel', 'payment_method'], name='reports_salesrollup_key'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.grain} {self.bucket:%Y-%m-%d %H:00} {self.channel}/{self.payment_method}: {self.revenue}"
+
+
+class ProductSalesRollup(models.Model):
+    """
+    Units and revenue per day, channel, payment method and product. The
+    product's category is copied in so category reports need no join.
+    """
+    day = models.DateField()
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    payment_method = models.CharField(max_length=20)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'channel', 'payment_method', 'product'], name='reports_productsalesrollup_key'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'category']),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.product_id} {self.channel}/{self.payment_method}: {self.units}"
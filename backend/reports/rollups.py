@@ -0,0 +1,178 @@
+"""
+Incremental sales rollups.
+
+When a sale completes, record_sale() adds its totals to one hourly and
+one daily SalesRollup row and to one ProductSalesRollup row per product,
+using INSERT ... ON CONFLICT DO UPDATE SET x = x + EXCLUDED.x so
+concurrent sales add up instead of overwriting each other. rebuild()
+recomputes everything from the sale tables, for backfills and drift.
+"""
+from datetime import datetime, time
+
+from django.db import connection, transaction
+from django.db.models import CharField, Count, F, Sum, Value
+from django.db.models.functions import TruncDate, TruncDay, TruncHour
+from django.utils import timezone
+
+from pos.models import POSItem, POSSale
+from sales.models import Sale, SaleItem
+from .models import ProductSalesRollup, SalesRollup
+
+ONLINE = 'online'
+POS = 'pos'
+# Online orders are paid through Daraja STK push only
+ONLINE_PAYMENT_METHOD = 'mpesa'
+
+
+def hour_bucket(moment):
+    return timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+
+
+def day_bucket(moment):
+    return timezone.localtime(moment).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _increment(model, key_fields, sum_fields, rows, keep_fields=()):
+    """
+    Upsert `rows` (dicts) into `model`, adding `sum_fields` onto existing
+    rows that match `key_fields`. `keep_fields` are written on insert only.
+    """
+    if not rows:
+        return
+    opts = model._meta
+    qn = connection.ops.quote_name
+    fields = [opts.get_field(name) for name in (*key_fields, *keep_fields, *sum_fields)]
+    table = qn(opts.db_table)
+    columns = ', '.join(qn(field.column) for field in fields)
+    placeholders = ', '.join(['(' + ', '.join(['%s'] * len(fields)) + ')'] * len(rows))
+    conflict = ', '.join(qn(opts.get_field(name).column) for name in key_fields)
+    updates = ', '.join(
+        f"{qn(opts.get_field(name).column)} = {table}.{qn(opts.get_field(name).column)} + EXCLUDED.{qn(opts.get_field(name).column)}"
+        for name in sum_fields
+    )
+    params = [
+        field.get_db_prep_save(row[field.name], connection)
+        for row in rows for field in fields
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({columns}) VALUES {placeholders} "
+            f"ON CONFLICT ({conflict}) DO UPDATE SET {updates}",
+            params,
+        )
+
+
+def apply(channel, payment_method, moment, revenue, lines):
+    """
+    Add one completed sale. `lines` are dicts with product_id,
+    category_id, units and revenue (one per product).
+    """
+    day = day_bucket(moment)
+    totals = [
+        {'grain': grain, 'bucket': bucket, 'channel': channel, 'payment_method': payment_method,
+         'orders': 1, 'revenue': revenue}
+        for grain, bucket in ((SalesRollup.HOUR, hour_bucket(moment)), (SalesRollup.DAY, day))
+    ]
+    products = [
+        {'day': day.date(), 'channel': channel, 'payment_method': payment_method,
+         'product': line['product_id'], 'category': line['category_id'],
+         'units': line['units'], 'revenue': line['revenue']}
+        for line in lines
+    ]
+    with transaction.atomic():
+        _increment(SalesRollup, ['grain', 'bucket', 'channel', 'payment_method'], ['orders', 'revenue'], totals)
+        _increment(
+            ProductSalesRollup, ['day', 'channel', 'payment_method', 'product'], ['units', 'revenue'],
+            products, keep_fields=['category'],
+        )
+
+
+def _lines(item_model, sale_field, sale_id):
+    return list(
+        item_model.objects.filter(**{sale_field: sale_id})
+        .values('product_id', category_id=F('product__category_id'))
+        .annotate(units=Sum('quantity'), revenue=Sum('line_total'))
+        .order_by('product_id')
+    )
+
+
+def record_sale(channel, sale_id):
+    """Roll up one completed online Sale or POSSale."""
+    if channel == ONLINE:
+        sale = Sale.objects.only('sale_date', 'total_amount').get(pk=sale_id)
+        apply(ONLINE, ONLINE_PAYMENT_METHOD, sale.sale_date, sale.total_amount,
+              _lines(SaleItem, 'sale_id', sale_id))
+    else:
+        sale = POSSale.objects.only('timestamp', 'total_amount', 'payment_method').get(pk=sale_id)
+        apply(POS, sale.payment_method, sale.timestamp, sale.total_amount,
+              _lines(POSItem, 'pos_sale_id', sale_id))
+
+
+def _sources():
+    """Per channel: completed headers and items, with their time and payment method."""
+    online_method = Value(ONLINE_PAYMENT_METHOD, output_field=CharField())
+    return [
+        (ONLINE,
+         Sale.objects.filter(status='completed'), 'sale_date', online_method,
+         SaleItem.objects.filter(sale__status='completed'), 'sale__sale_date', online_method),
+        (POS,
+         POSSale.objects.all(), 'timestamp', F('payment_method'),
+         POSItem.objects.all(), 'pos_sale__timestamp', F('pos_sale__payment_method')),
+    ]
+
+
+def rebuild(since=None):
+    """
+    Recompute the rollups from the sale tables, from the start of day
+    `since` (a date) or from the beginning. Returns the number of rows written.
+    """
+    start = timezone.make_aware(datetime.combine(since, time.min)) if since else None
+    totals = []
+    products = []
+    for channel, headers, when, method, items, item_when, item_method in _sources():
+        if start:
+            headers = headers.filter(**{f'{when}__gte': start})
+            items = items.filter(**{f'{item_when}__gte': start})
+
+        for grain, trunc in ((SalesRollup.HOUR, TruncHour), (SalesRollup.DAY, TruncDay)):
+            rows = (
+                headers.values(bucket=trunc(when), method=method)
+                .annotate(orders=Count('pk'), revenue=Sum('total_amount'))
+                .order_by()
+            )
+            totals += [
+                SalesRollup(
+                    grain=grain, bucket=row['bucket'], channel=channel, payment_method=row['method'],
+                    orders=row['orders'], revenue=row['revenue'],
+                )
+                for row in rows
+            ]
+
+        rows = (
+            items.values(
+                'product_id', day=TruncDate(item_when), method=item_method,
+                category_id=F('product__category_id'),
+            )
+            .annotate(units=Sum('quantity'), revenue=Sum('line_total'))
+            .order_by()
+        )
+        products += [
+            ProductSalesRollup(
+                day=row['day'], channel=channel, payment_method=row['method'],
+                product_id=row['product_id'], category_id=row['category_id'],
+                units=row['units'], revenue=row['revenue'],
+            )
+            for row in rows
+        ]
+
+    with transaction.atomic():
+        stale_totals = SalesRollup.objects.all()
+        stale_products = ProductSalesRollup.objects.all()
+        if start:
+            stale_totals = stale_totals.filter(bucket__gte=start)
+            stale_products = stale_products.filter(day__gte=since)
+        stale_totals.delete()
+        stale_products.delete()
+        SalesRollup.objects.bulk_create(totals, batch_size=1000)
+        ProductSalesRollup.objects.bulk_create(products, batch_size=1000)
+    return len(totals) + len(products)
@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import CHANNEL_CHOICES, SalesRollup
+
+
+class ReportQuerySerializer(serializers.Serializer):
+    """
+    Query parameters shared by the report endpoints. `date_from` and
+    `date_to` are inclusive days; the default is the last 30 days.
+    """
+    MAX_HOURLY_DAYS = 31
+
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    channel = serializers.ChoiceField(choices=CHANNEL_CHOICES, required=False)
+    payment_method = serializers.CharField(required=False, max_length=20)
+
+    def validate(self, attrs):
+        today = timezone.localdate()
+        attrs.setdefault('date_to', today)
+        attrs.setdefault('date_from', attrs['date_to'] - timedelta(days=29))
+        if attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError("date_from must not be after date_to.")
+        return attrs
+
+
+class SalesSeriesQuerySerializer(ReportQuerySerializer):
+    grain = serializers.ChoiceField(choices=SalesRollup.GRAIN_CHOICES, default=SalesRollup.DAY)
+    group_by = serializers.ChoiceField(choices=['channel', 'payment_method'], required=False)
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if attrs['grain'] == SalesRollup.HOUR and (attrs['date_to'] - attrs['date_from']).days >= self.MAX_HOURLY_DAYS:
+            raise serializers.ValidationError(
+                f"Hourly series can span at most {self.MAX_HOURLY_DAYS} days."
+            )
+        return attrs
+
+
+class TopQuerySerializer(ReportQuerySerializer):
+    limit = serializers.IntegerField(min_value=1, max_value=200, default=20)
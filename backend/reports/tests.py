@@ -0,0 +1,144 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core import signing
+from django.test import TestCase
+from django.utils import timezone
+
+from inventory.models import Category, Product
+from pos.models import POSSale
+from pos.serializers import POSSaleSerializer
+from sales.models import Sale
+from sales.services import create_sale
+from outbox.events import publish
+from outbox.relay import drain
+from staff.models import Client, CustomAdmin
+from .feed import OrderFeedPagination
+from .models import ProductSalesRollup, SalesRollup
+from .rollups import rebuild
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Tools')
+        self.product = Product.objects.create(
+            brand_name='Acme', product_name='Widget', description='A widget',
+            selling_price=Decimal('100.00'), stock_qty=100, category=category,
+        )
+        self.client_record = Client.objects.create(first_name='Jane', last_name='Doe')
+
+    def sell(self):
+        pos = POSSaleSerializer(data={
+            'payment_method': 'cash', 'served_by': 'till 1',
+            'items': [{'product': self.product.pk, 'quantity': 2, 'unit_price': '90.00'}],
+        })
+        pos.is_valid(raise_exception=True)
+        pos.save()
+
+        sale = create_sale(
+            [{'product': self.product, 'quantity': 1}],
+            client=self.client_record, shipping_address='Nairobi', status='completed',
+        )
+        publish('sale.completed', 'sale', sale.pk, {'channel': 'online', 'quantities': {str(self.product.pk): 1}})
+        drain()
+
+    def snapshot(self):
+        return (
+            sorted(SalesRollup.objects.values_list('grain', 'bucket', 'channel', 'payment_method', 'orders', 'revenue')),
+            sorted(ProductSalesRollup.objects.values_list('day', 'channel', 'payment_method', 'product', 'category', 'units', 'revenue')),
+        )
+
+    def test_incremental_rollups_match_rebuild(self):
+        self.sell()
+        self.sell()
+
+        daily = SalesRollup.objects.filter(grain=SalesRollup.DAY)
+        self.assertEqual(
+            sorted(daily.values_list('channel', 'payment_method', 'orders', 'revenue')),
+            [('online', 'mpesa', 2, Decimal('200.00')), ('pos', 'cash', 2, Decimal('360.00'))],
+        )
+        incremental = self.snapshot()
+        rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+
+        # Both channels' completions also fed the reorder velocity
+        self.assertEqual(self.product.sales_velocity.units_sold, 6)
+
+    def test_report_reads_rollups(self):
+        self.sell()
+        self.client.force_login(CustomAdmin.objects.create_user('staff@example.com', 'Staff', 'User', '0700000000'))
+
+        with self.assertNumQueries(1 + 2):  # session + user, then one rollup query
+            response = self.client.get('/api/reports/sales/', {'group_by': 'channel'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row['channel'], row['orders']) for row in response.json()['results']],
+            [('online', 1), ('pos', 1)],
+        )
+
+        response = self.client.get('/api/reports/categories/')
+        self.assertEqual(response.json()[0]['units'], 3)
+
+
+class OrderFeedTests(TestCase):
+    def setUp(self):
+        product = Product.objects.create(
+            brand_name='Acme', product_name='Widget', description='A widget',
+            selling_price=Decimal('10.00'), stock_qty=100,
+        )
+        client = Client.objects.create(first_name='Jane', last_name='Doe')
+        # Interleave the channels, with some orders sharing a timestamp
+        base = timezone.now() - timedelta(days=1)
+        for n in range(7):
+            sale = create_sale(
+                [{'product': product, 'quantity': 1}], client=client, shipping_address='Nairobi',
+                status='completed' if n % 2 else 'pending',
+            )
+            Sale.objects.filter(pk=sale.pk).update(sale_date=base + timedelta(minutes=n))
+            pos = POSSale.objects.create(total_amount=Decimal('5.00'), served_by='till 1')
+            POSSale.objects.filter(pk=pos.pk).update(timestamp=base + timedelta(minutes=n))
+        self.client.force_login(CustomAdmin.objects.create_user('staff@example.com', 'Staff', 'User', '0700000000'))
+
+    def walk(self, **params):
+        rows, url = [], '/api/reports/orders/'
+        params.setdefault('page_size', 3)
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            rows += body['results']
+            url, params = body['next'], {}
+        return rows
+
+    def test_feed_pages_through_both_channels_newest_first(self):
+        rows = self.walk()
+        self.assertEqual(len(rows), 14)
+        keys = [(row['placed_at'], row['channel'], row['order_id']) for row in rows]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+        self.assertEqual(len(set(keys)), 14)
+        # Same timestamp: ties are broken by channel, then order id
+        self.assertEqual([row['channel'] for row in rows[:2]], ['pos', 'online'])
+        self.assertEqual([row['customer_name'] for row in rows[:2]], [None, 'Jane Doe'])
+
+    def test_filters(self):
+        self.assertEqual({row['channel'] for row in self.walk(channel='pos')}, {'pos'})
+        pending = self.walk(status='pending')
+        self.assertEqual(len(pending), 4)
+        self.assertTrue(all(row['channel'] == 'online' for row in pending))
+        self.assertEqual(len(self.walk(status='completed')), 10)
+
+    def test_previous_link_returns_the_same_page(self):
+        first = self.client.get('/api/reports/orders/', {'page_size': 4}).json()
+        second = self.client.get(first['next']).json()
+        back = self.client.get(second['previous']).json()
+        self.assertEqual(back['results'], first['results'])
+
+    def test_malformed_cursor_is_a_bad_request(self):
+        signed = signing.dumps(
+            {'o': list(OrderFeedPagination.ordering), 'v': ['not-a-date', 'pos', 'x'], 'r': False},
+            salt=OrderFeedPagination.cursor_salt,
+        )
+        for cursor in ('garbage', signed):
+            response = self.client.get('/api/reports/orders/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('cursor', response.json())
@@ -0,0 +1,10 @@
+from django.urls import path
+
+from .views import CategorySalesAPIView, OrderFeedAPIView, SalesSeriesAPIView, TopProductsAPIView
+
+urlpatterns = [
+    path('sales/', SalesSeriesAPIView.as_view()),
+    path('top-products/', TopProductsAPIView.as_view()),
+    path('categories/', CategorySalesAPIView.as_view()),
+    path('orders/', OrderFeedAPIView.as_view()),
+]
@@ -0,0 +1,118 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import Sum
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .feed import OrderFeed, OrderFeedPagination, OrderFeedQuerySerializer, render_order
+from .models import ProductSalesRollup, SalesRollup
+from .serializers import SalesSeriesQuerySerializer, TopQuerySerializer
+
+
+def filter_channel(queryset, params):
+    if params.get('channel'):
+        queryset = queryset.filter(channel=params['channel'])
+    if params.get('payment_method'):
+        queryset = queryset.filter(payment_method=params['payment_method'])
+    return queryset
+
+
+class SalesSeriesAPIView(APIView):
+    """
+    Orders and revenue per hour or day, optionally split by channel or
+    payment method. Reads SalesRollup only, so a year of daily totals is
+    at most a few hundred rows whatever the sales volume.
+    """
+    def get(self, request):
+        query = SalesSeriesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        start = timezone.make_aware(datetime.combine(params['date_from'], time.min))
+        end = timezone.make_aware(datetime.combine(params['date_to'] + timedelta(days=1), time.min))
+        group = ['bucket'] + ([params['group_by']] if params.get('group_by') else [])
+        rows = (
+            filter_channel(SalesRollup.objects.filter(grain=params['grain']), params)
+            .filter(bucket__gte=start, bucket__lt=end)
+            .values(*group)
+            .annotate(orders=Sum('orders'), revenue=Sum('revenue'))
+            .order_by(*group)
+        )
+        return Response({
+            "grain": params['grain'],
+            "date_from": params['date_from'],
+            "date_to": params['date_to'],
+            "results": list(rows),
+        })
+
+
+class TopProductsAPIView(APIView):
+    """
+    Best-selling products by revenue over a date range, from ProductSalesRollup.
+    """
+    def get(self, request):
+        query = TopQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        rows = (
+            filter_channel(ProductSalesRollup.objects, params)
+            .filter(day__range=(params['date_from'], params['date_to']))
+            .values('product', 'product__brand_name', 'product__product_name')
+            .annotate(units=Sum('units'), revenue=Sum('revenue'))
+            .order_by('-revenue', 'product')[:params['limit']]
+        )
+        return Response([
+            {
+                "product": row['product'],
+                "brand_name": row['product__brand_name'],
+                "product_name": row['product__product_name'],
+                "units": row['units'],
+                "revenue": row['revenue'],
+            }
+            for row in rows
+        ])
+
+
+class CategorySalesAPIView(APIView):
+    """
+    Units and revenue per category over a date range, from ProductSalesRollup.
+    """
+    def get(self, request):
+        query = TopQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        rows = (
+            filter_channel(ProductSalesRollup.objects, params)
+            .filter(day__range=(params['date_from'], params['date_to']))
+            .values('category', 'category__name')
+            .annotate(units=Sum('units'), revenue=Sum('revenue'))
+            .order_by('-revenue')[:params['limit']]
+        )
+        return Response([
+            {
+                "category": row['category'],
+                "category_name": row['category__name'] or "Uncategorised",
+                "units": row['units'],
+                "revenue": row['revenue'],
+            }
+            for row in rows
+        ])
+
+
+class OrderFeedAPIView(APIView):
+    """
+    Online and POS orders in one newest-first list with a shared keyset
+    cursor. Filters: channel, status, date_from, date_to (inclusive days).
+    """
+    pagination_class = OrderFeedPagination
+
+    def get(self, request):
+        query = OrderFeedQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(OrderFeed(**query.validated_data), request, view=self)
+        return paginator.get_paginated_response([render_order(row) for row in page])
@@ -1,7 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
 from staff.models import Client
 from inventory.models import Product
+from inventory.services import remove_stock
 
 class Sale(models.Model):
     """
@@ -22,6 +23,13 @@ class Sale(models.Model):
     transaction_id = models.CharField(max_length=100, unique=True, blank=True, null=True)
     shipping_address = models.TextField()
 
+    class Meta:
+        indexes = [
+            # Keyset scans of the order feed, newest first
+            models.Index(fields=['sale_date', 'id']),
+            models.Index(fields=['status', 'sale_date', 'id']),
+        ]
+
     def __str__(self):
         return f"Sale {self.id} - {self.client.full_name}"
 
@@ -46,11 +54,11 @@ class SaleItem(models.Model):
             # Refresh sale status to ensure we have the latest
             self.sale.refresh_from_db()
             if self.sale.status == 'completed':
-                if self.product.stock_qty < self.quantity:
-                    raise ValueError(f"Insufficient stock for {self.product.product_name}")
-                self.product.stock_qty -= self.quantity
-                self.product.save()
-        
+                with transaction.atomic():
+                    remove_stock(self.product_id, self.quantity)
+                    super().save(*args, **kwargs)
+                return
+
         super().save(*args, **kwargs)
 
     def __str__(self):
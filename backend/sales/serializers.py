@@ -11,6 +11,21 @@ class SaleItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'product', 'product_name', 'brand_name', 'quantity', 'price_at_sale', 'line_total']
         read_only_fields = ['line_total']
 
+class SaleListSerializer(serializers.ModelSerializer):
+    """
+    Header-only row for the sales list; expects `item_count` annotated.
+    """
+    client_name = serializers.ReadOnlyField(source='client.full_name')
+    item_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Sale
+        fields = [
+            'id', 'client', 'client_name', 'sale_date',
+            'total_amount', 'status', 'transaction_id', 'item_count'
+        ]
+        read_only_fields = fields
+
 class SaleSerializer(serializers.ModelSerializer):
     items = SaleItemSerializer(many=True, read_only=True)
     client_name = serializers.ReadOnlyField(source='client.full_name')
@@ -22,4 +37,40 @@ class SaleSerializer(serializers.ModelSerializer):
             'total_amount', 'status', 'transaction_id', 
             'shipping_address', 'items'
         ]
-        read_only_fields = ['total_amount', 'sale_date']
\ No newline at end of file
+        read_only_fields = ['total_amount', 'sale_date']
+
+
+class SaleLineListSerializer(serializers.ListSerializer):
+    MAX_LINES = 500
+
+    def validate(self, lines):
+        if len(lines) > self.MAX_LINES:
+            raise serializers.ValidationError(
+                f"A sale can have at most {self.MAX_LINES} lines."
+            )
+
+        # Resolve every product in one query instead of one per line
+        products = Product.objects.in_bulk({line['product'] for line in lines})
+        errors = []
+        for line in lines:
+            product = products.get(line['product'])
+            if product is None:
+                errors.append({'product': [f"Invalid pk \"{line['product']}\" - object does not exist."]})
+            else:
+                line['product'] = product
+                errors.append({})
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return lines
+
+
+class SaleLineSerializer(serializers.Serializer):
+    """
+    One incoming cart line. Use with many=True; see sales.services.create_sale.
+    There is no price: the sale charges each product's current selling price.
+    """
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+    class Meta:
+        list_serializer_class = SaleLineListSerializer
@@ -0,0 +1,49 @@
+from decimal import Decimal
+
+from django.db import transaction
+
+from inventory.models import Product
+from .models import Sale, SaleItem
+
+
+def create_sale(lines, **fields):
+    """
+    Create a Sale together with all of its lines.
+
+    Each line is a dict with `product` (a Product instance) and
+    `quantity`. Every line is charged the product's selling price as read
+    inside the transaction, never a price supplied by the caller. Line
+    totals and the sale total are computed here, the header is inserted
+    once and the items with one bulk_create, all in a single transaction.
+    bulk_create does not send post_save, so update_sale_total does not
+    re-aggregate the sale once per line.
+    """
+    with transaction.atomic():
+        prices = dict(
+            Product.objects.filter(pk__in={line['product'].pk for line in lines})
+            .values_list('pk', 'selling_price')
+        )
+        items = []
+        total = Decimal('0.00')
+        for line in lines:
+            price = prices[line['product'].pk]
+            item = SaleItem(
+                product=line['product'],
+                quantity=line['quantity'],
+                price_at_sale=price,
+                # bulk_create skips save(), so compute the total here
+                line_total=line['quantity'] * price,
+            )
+            total += item.line_total
+            items.append(item)
+
+        sale = Sale.objects.create(total_amount=total, **fields)
+        for item in items:
+            item.sale = sale
+        SaleItem.objects.bulk_create(items)
+    return sale
+
+
+def reservation_reference(sale_id):
+    """The StockReservation reference that holds stock for a pending sale."""
+    return f"sale:{sale_id}"
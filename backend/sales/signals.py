@@ -1,16 +1,28 @@
+from decimal import Decimal
+
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.db.models import Sum
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from .models import SaleItem, Sale
 
 @receiver([post_save, post_delete], sender=SaleItem)
-def update_sale_total(sender, instance, **kwargs):
+def update_sale_total(sender, instance, raw=False, **kwargs):
     """
     Automatically recalculates the Sale total_amount whenever 
-    a SaleItem is added, updated, or removed.
+    a SaleItem is added, updated, or removed one at a time (e.g. in the
+    admin). Bulk paths go through sales.services.create_sale instead.
     """
-    sale = instance.sale
-    # Aggregate the sum of all line_totals for this sale
-    aggregate = SaleItem.objects.filter(sale=sale).aggregate(total=Sum('line_total'))
-    sale.total_amount = aggregate['total'] or 0.00
-    sale.save()
\ No newline at end of file
+    if raw:
+        return
+    # Aggregate the sum of all line_totals for this sale in the UPDATE itself
+    total = (
+        SaleItem.objects.filter(sale=OuterRef('pk'))
+        .values('sale').annotate(total=Sum('line_total')).values('total')
+    )
+    Sale.objects.filter(pk=instance.sale_id).update(
+        total_amount=Coalesce(
+            Subquery(total), Value(Decimal('0.00')),
+            output_field=DecimalField(max_digits=15, decimal_places=2),
+        )
+    )
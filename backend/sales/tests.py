@@ -1,3 +1,109 @@
+from decimal import Decimal
+
 from django.test import TestCase
 
-# Create your tests here.
+from inventory.models import Product
+from staff.models import Client, CustomAdmin
+from .models import Sale, SaleItem
+from .serializers import SaleLineSerializer
+from .services import create_sale
+
+
+class CreateSaleTests(TestCase):
+    def setUp(self):
+        self.client_record = Client.objects.create(first_name='Jane', last_name='Doe')
+        self.products = [
+            Product.objects.create(
+                brand_name='Acme', product_name=f'Widget {n}', description='A widget',
+                selling_price=Decimal('10.00') + n, stock_qty=100,
+            )
+            for n in range(20)
+        ]
+
+    def test_cart_is_validated_and_inserted_in_constant_queries(self):
+        data = [{'product': product.pk, 'quantity': 2} for product in self.products]
+        with self.assertNumQueries(1):
+            lines = SaleLineSerializer(data=data, many=True)
+            self.assertTrue(lines.is_valid(), lines.errors)
+        # prices + header insert + one bulk insert (plus savepoint/commit bookkeeping in tests)
+        with self.assertNumQueries(5):
+            sale = create_sale(lines.validated_data, client=self.client_record, shipping_address='Nairobi')
+
+        expected = sum(2 * product.selling_price for product in self.products)
+        sale.refresh_from_db()
+        self.assertEqual(sale.total_amount, expected)
+        self.assertEqual(sale.items.count(), 20)
+
+    def test_posted_price_is_ignored(self):
+        lines = SaleLineSerializer(
+            data=[{'product': self.products[0].pk, 'quantity': 2, 'price_at_sale': '0.01'}], many=True,
+        )
+        self.assertTrue(lines.is_valid(), lines.errors)
+        self.assertNotIn('price_at_sale', lines.validated_data[0])
+        Product.objects.filter(pk=self.products[0].pk).update(selling_price=Decimal('12.50'))
+        sale = create_sale(
+            lines.validated_data + [{'product': self.products[1], 'quantity': 1, 'price_at_sale': Decimal('0')}],
+            client=self.client_record, shipping_address='Nairobi',
+        )
+        self.assertEqual(sale.total_amount, Decimal('25.00') + self.products[1].selling_price)
+
+    def test_unknown_product_is_rejected(self):
+        lines = SaleLineSerializer(data=[{'product': 0, 'quantity': 1}], many=True)
+        self.assertFalse(lines.is_valid())
+
+    def test_single_line_edit_updates_total(self):
+        sale = create_sale(
+            [{'product': self.products[0], 'quantity': 1}],
+            client=self.client_record, shipping_address='Nairobi',
+        )
+        SaleItem.objects.create(sale=sale, product=self.products[1], quantity=3, price_at_sale=Decimal('5.00'))
+        self.assertEqual(Sale.objects.get(pk=sale.pk).total_amount, Decimal('25.00'))
+
+        sale.items.get(product=self.products[0]).delete()
+        self.assertEqual(Sale.objects.get(pk=sale.pk).total_amount, Decimal('15.00'))
+
+
+class SaleViewSetQueryTests(TestCase):
+    def setUp(self):
+        client = Client.objects.create(first_name='Jane', last_name='Doe')
+        products = [
+            Product.objects.create(
+                brand_name='Acme', product_name=f'Widget {n}', description='A widget',
+                selling_price=Decimal('10.00'), stock_qty=100,
+            )
+            for n in range(5)
+        ]
+        for _ in range(8):
+            self.sale = create_sale(
+                [{'product': product, 'quantity': 1} for product in products],
+                client=client, shipping_address='Nairobi',
+            )
+        staff = CustomAdmin.objects.create_user('staff@example.com', 'Staff', 'User', '0700000000')
+        self.client.force_login(staff)
+
+    # session + user for authentication, then the view's own queries
+    AUTH_QUERIES = 2
+
+    def test_list_is_headers_with_item_count(self):
+        # count + one page of headers joined to client
+        with self.assertNumQueries(self.AUTH_QUERIES + 2):
+            response = self.client.get('/api/sales/sales/')
+        row = response.json()['results'][0]
+        self.assertEqual(row['item_count'], 5)
+        self.assertEqual(row['client_name'], 'Jane Doe')
+        self.assertNotIn('items', row)
+
+    def test_detail_loads_items_and_products_in_one_query(self):
+        # sale joined to client + items joined to product
+        with self.assertNumQueries(self.AUTH_QUERIES + 2):
+            response = self.client.get(f'/api/sales/sales/{self.sale.pk}/')
+        items = response.json()['items']
+        self.assertEqual(len(items), 5)
+        self.assertEqual(items[0]['product_name'], 'Widget 0')
+
+    def test_sales_cannot_be_changed_through_the_api(self):
+        url = f'/api/sales/sales/{self.sale.pk}/'
+        response = self.client.patch(url, {'status': 'completed'}, content_type='application/json')
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(self.client.delete(url).status_code, 405)
+        self.assertEqual(Sale.objects.get(pk=self.sale.pk).status, 'pending')
@@ -0,0 +1,10 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from .views import SaleReadOnlyViewSet
+
+router = DefaultRouter()
+router.register(r'sales', SaleReadOnlyViewSet)
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
@@ -1,32 +1,36 @@
-from rest_framework import viewsets, filters, status
-from rest_framework.response import Response
+from rest_framework import viewsets, filters
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db.models import Count, Prefetch
 from .models import Sale, SaleItem
-from .serializers import SaleSerializer
+from .serializers import SaleListSerializer, SaleSerializer
 
-class SaleViewSet(viewsets.ModelViewSet):
-    queryset = Sale.objects.all().prefetch_related('items', 'client')
+class SaleQueryMixin:
+    """
+    The list returns headers with an annotated item count; every other
+    action returns the full sale with its items, loaded in one extra query.
+    """
+    queryset = Sale.objects.all()
     serializer_class = SaleSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
     
     filterset_fields = ['status', 'client']
     search_fields = ['transaction_id', 'client__first_name', 'client__last_name']
     ordering_fields = ['sale_date', 'total_amount']
+    ordering = ['-sale_date', '-id']
 
-    def create(self, request, *args, **kwargs):
-        """
-        Custom create to handle the complex logic of adding 
-        multiple SaleItems in one request from Next.js.
-        """
-        items_data = request.data.pop('items', [])
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        sale = serializer.save()
+    def get_queryset(self):
+        queryset = Sale.objects.select_related('client')
+        if self.action == 'list':
+            return queryset.annotate(item_count=Count('items'))
+        return queryset.prefetch_related(
+            Prefetch('items', queryset=SaleItem.objects.select_related('product'))
+        )
 
-        # Create the individual items
-        for item in items_data:
-            SaleItem.objects.create(sale=sale, **item)
-        
-        # Refresh to get the updated total_amount from signals
-        sale.refresh_from_db()
-        return Response(self.get_serializer(sale).data, status=status.HTTP_201_CREATED)
\ No newline at end of file
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return SaleListSerializer
+        return SaleSerializer
+
+
+class SaleReadOnlyViewSet(SaleQueryMixin, viewsets.ReadOnlyModelViewSet):
+    """Staff view of online sales; they change only through checkout and payment."""
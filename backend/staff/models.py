@@ -138,5 +138,9 @@ class Client(models.Model):
     class Meta:
         ordering = ["first_name", "last_name"]
 
+    @property
+    def full_name(self):
+        return f"{self.first_name} {self.last_name}"
+
     def __str__(self):
-        return f"{self.first_name} {self.last_name}"
\ No newline at end of file
+        return self.full_name
\ No newline at end of file